@@ -0,0 +1,34 @@
+"""user daily stats rollup
+
+Revision ID: 002
+Revises: 001
+Create Date: 2024-02-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Создание таблицы дневных агрегатов по напиткам
+    op.create_table(
+        'user_daily_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('drinks_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('total_volume', sa.Float(), server_default=sa.text('0'), nullable=False),
+        sa.Column('total_alcohol', sa.Float(), server_default=sa.text('0'), nullable=False),
+        sa.Column('total_spent', sa.Float(), server_default=sa.text('0'), nullable=False),
+        sa.Column('drinks_by_type', sa.JSON(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+    # Заполнение выполняется командой python -m app.rebuild_daily_stats
+
+def downgrade():
+    op.drop_table('user_daily_stats')
@@ -0,0 +1,32 @@
+"""keyset pagination indexes
+
+Revision ID: 003
+Revises: 002
+Create Date: 2024-02-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Индексы для постраничной выборки по (user_id, время) без OFFSET.
+    # Для drinks индекс idx_drinks_user_date создан в 001.
+    # Таблицы sober_periods и goals создаются через metadata.create_all
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'sober_periods' in tables:
+        op.create_index('idx_sober_periods_user_start', 'sober_periods', ['user_id', 'start_time'])
+    if 'goals' in tables:
+        op.create_index('idx_goals_user_start', 'goals', ['user_id', 'start_date'])
+
+def downgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'goals' in tables:
+        op.drop_index('idx_goals_user_start', table_name='goals')
+    if 'sober_periods' in tables:
+        op.drop_index('idx_sober_periods_user_start', table_name='sober_periods')
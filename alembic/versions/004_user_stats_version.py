@@ -0,0 +1,25 @@
+"""user stats version
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-03-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Версия данных пользователя для инвалидации кэша статистики
+    op.add_column(
+        'users',
+        sa.Column('stats_version', sa.Integer(), server_default=sa.text('0'), nullable=False)
+    )
+
+def downgrade():
+    op.drop_column('users', 'stats_version')
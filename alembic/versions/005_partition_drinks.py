@@ -0,0 +1,95 @@
+"""partition drinks by month
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-03-15 00:00:00.000000
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+# Сколько будущих месяцев создать сразу, дальше их создает python -m app.partitions
+MONTHS_AHEAD = 3
+
+def _add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _swap_tables(bind, new_table):
+    # Последовательность id переходит к новой таблице до удаления старой
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('drinks', 'id')")).scalar()
+    if sequence:
+        op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {new_table}.id")
+    op.execute("DROP TABLE drinks")
+    op.execute(f"ALTER TABLE {new_table} RENAME TO drinks")
+    op.execute(f"ALTER TABLE drinks RENAME CONSTRAINT {new_table}_pkey TO drinks_pkey")
+
+def upgrade():
+    # Партиционирование поддерживается только в PostgreSQL
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    # Ключ партиционирования не может быть NULL
+    op.execute("UPDATE drinks SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+
+    # Первичный ключ партиционированной таблицы обязан включать created_at,
+    # уникальность id по-прежнему обеспечивает последовательность
+    op.execute(
+        "CREATE TABLE drinks_partitioned (LIKE drinks INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE drinks_partitioned ALTER COLUMN created_at SET NOT NULL")
+    op.execute("ALTER TABLE drinks_partitioned ADD PRIMARY KEY (id, created_at)")
+    op.execute(
+        "ALTER TABLE drinks_partitioned ADD CONSTRAINT drinks_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE"
+    )
+
+    # Месячные партиции от первой записи до MONTHS_AHEAD месяцев вперед
+    # и партиция по умолчанию для записей вне созданных диапазонов
+    first = bind.execute(sa.text("SELECT min(created_at) FROM drinks")).scalar()
+    current = date.today().replace(day=1)
+    month = first.date().replace(day=1) if first else current
+    last = _add_months(current, MONTHS_AHEAD)
+    while month <= last:
+        next_month = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE drinks_y{month.year:04d}m{month.month:02d} PARTITION OF drinks_partitioned "
+            f"FOR VALUES FROM ('{month}') TO ('{next_month}')"
+        )
+        month = next_month
+    op.execute("CREATE TABLE drinks_default PARTITION OF drinks_partitioned DEFAULT")
+
+    op.execute("INSERT INTO drinks_partitioned SELECT * FROM drinks")
+    _swap_tables(bind, 'drinks_partitioned')
+
+    # Индекс создается на каждой партиции
+    op.create_index('idx_drinks_user_date', 'drinks', ['user_id', 'created_at'])
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE TABLE drinks_plain (LIKE drinks INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE drinks_plain ADD PRIMARY KEY (id)")
+    op.execute("ALTER TABLE drinks_plain ALTER COLUMN created_at DROP NOT NULL")
+    op.execute("INSERT INTO drinks_plain SELECT * FROM drinks")
+    # Вместе с родительской таблицей удаляются и все партиции
+    _swap_tables(bind, 'drinks_plain')
+    op.execute(
+        "ALTER TABLE drinks ADD CONSTRAINT drinks_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE"
+    )
+    op.create_index('idx_drinks_user_id', 'drinks', ['user_id'])
+    op.create_index('idx_drinks_created_at', 'drinks', ['created_at'])
+    op.create_index('idx_drinks_user_date', 'drinks', ['user_id', 'created_at'])
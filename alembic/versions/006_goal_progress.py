@@ -0,0 +1,42 @@
+"""goal progress
+
+Revision ID: 006
+Revises: 005
+Create Date: 2024-04-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Результаты оценки целей, заполняются командой python -m app.goals.
+    # Таблица goals создается через metadata.create_all
+    if 'goals' not in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'goal_progress',
+        sa.Column('goal_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('period_start', sa.DateTime(), nullable=True),
+        sa.Column('period_end', sa.DateTime(), nullable=True),
+        sa.Column('current_value', sa.Float(), nullable=True),
+        sa.Column('progress', sa.Float(), nullable=True),
+        sa.Column('is_achieved', sa.Boolean(), nullable=True),
+        sa.Column('stats_version', sa.Integer(), nullable=True),
+        sa.Column('evaluated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['goal_id'], ['goals.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('goal_id')
+    )
+    op.create_index('ix_goal_progress_user_id', 'goal_progress', ['user_id'])
+
+def downgrade():
+    if 'goal_progress' in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_index('ix_goal_progress_user_id', table_name='goal_progress')
+        op.drop_table('goal_progress')
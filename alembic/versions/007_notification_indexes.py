@@ -0,0 +1,29 @@
+"""notification scheduler indexes
+
+Revision ID: 007
+Revises: 006
+Create Date: 2024-04-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Планировщик напоминаний читает окно notification_time по индексу
+    # и подхватывает изменения настроек по updated_at
+    op.create_index(
+        'idx_user_settings_notification',
+        'user_settings',
+        ['notification_enabled', 'notification_time', 'user_id']
+    )
+    op.create_index('idx_user_settings_updated', 'user_settings', ['updated_at'])
+
+def downgrade():
+    op.drop_index('idx_user_settings_updated', table_name='user_settings')
+    op.drop_index('idx_user_settings_notification', table_name='user_settings')
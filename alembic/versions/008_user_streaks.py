@@ -0,0 +1,41 @@
+"""user sobriety streaks
+
+Revision ID: 008
+Revises: 007
+Create Date: 2024-05-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Состояние серий трезвости; заполнение выполняется командой python -m app.rebuild_streaks
+    op.create_table(
+        'user_streaks',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('current_start', sa.DateTime(), nullable=True),
+        sa.Column('longest_seconds', sa.Float(), server_default=sa.text('0'), nullable=True),
+        sa.Column('last_drink_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    # Таблица sober_periods создается через metadata.create_all
+    if 'sober_periods' in sa.inspect(op.get_bind()).get_table_names():
+        op.create_index(
+            'idx_sober_periods_active',
+            'sober_periods',
+            ['user_id', 'start_time'],
+            postgresql_where=sa.text('is_active'),
+            sqlite_where=sa.text('is_active')
+        )
+
+def downgrade():
+    if 'sober_periods' in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_index('idx_sober_periods_active', table_name='sober_periods')
+    op.drop_table('user_streaks')
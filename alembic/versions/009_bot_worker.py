@@ -0,0 +1,52 @@
+"""bot worker lease and job queue
+
+Revision ID: 009
+Revises: 008
+Create Date: 2024-05-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'bot_leases',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('holder', sa.String(), nullable=False),
+        sa.Column('token', sa.Integer(), server_default=sa.text('1'), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table(
+        'bot_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('dedupe_key', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('available_at', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), server_default=sa.text('0'), nullable=True),
+        sa.Column('locked_by', sa.String(), nullable=True),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('failed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('dedupe_key')
+    )
+    op.create_index(
+        'idx_bot_jobs_available',
+        'bot_jobs',
+        ['available_at'],
+        postgresql_where=sa.text('failed_at IS NULL'),
+        sqlite_where=sa.text('failed_at IS NULL')
+    )
+
+def downgrade():
+    op.drop_index('idx_bot_jobs_available', table_name='bot_jobs')
+    op.drop_table('bot_jobs')
+    op.drop_table('bot_leases')
@@ -0,0 +1,31 @@
+"""population percentile sketches
+
+Revision ID: 010
+Revises: 009
+Create Date: 2024-06-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Заполнение выполняется командой python -m app.percentiles
+    op.create_table(
+        'population_sketch_bins',
+        sa.Column('metric', sa.String(), nullable=False),
+        sa.Column('period', sa.String(), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('bin', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), server_default=sa.text('0'), nullable=True),
+        sa.PrimaryKeyConstraint('metric', 'period', 'period_start', 'shard', 'bin')
+    )
+
+def downgrade():
+    op.drop_table('population_sketch_bins')
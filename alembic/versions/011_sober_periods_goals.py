@@ -0,0 +1,80 @@
+"""sober periods and goals tables
+
+Revision ID: 011
+Revises: 010
+Create Date: 2024-06-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Раньше sober_periods и goals создавались только через metadata.create_all,
+    # и миграции 003, 006 и 008 их пропускали. На базе, созданной alembic,
+    # таблицы и их индексы создаются здесь; существующие не трогаем
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'sober_periods' not in tables:
+        op.create_table(
+            'sober_periods',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('start_time', sa.DateTime(), nullable=True),
+            sa.Column('end_time', sa.DateTime(), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_sober_periods_id', 'sober_periods', ['id'])
+        op.create_index('idx_sober_periods_user_start', 'sober_periods', ['user_id', 'start_time'])
+        op.create_index(
+            'idx_sober_periods_active',
+            'sober_periods',
+            ['user_id', 'start_time'],
+            postgresql_where=sa.text('is_active'),
+            sqlite_where=sa.text('is_active')
+        )
+    if 'goals' not in tables:
+        op.create_table(
+            'goals',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('type', sa.String(), nullable=True),
+            sa.Column('target_value', sa.Float(), nullable=True),
+            sa.Column('period', sa.String(), nullable=True),
+            sa.Column('start_date', sa.DateTime(), nullable=True),
+            sa.Column('end_date', sa.DateTime(), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_goals_id', 'goals', ['id'])
+        op.create_index('idx_goals_user_start', 'goals', ['user_id', 'start_date'])
+    # Миграция 006 пропускала goal_progress, если goals еще не было
+    if 'goal_progress' not in tables:
+        op.create_table(
+            'goal_progress',
+            sa.Column('goal_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('period_start', sa.DateTime(), nullable=True),
+            sa.Column('period_end', sa.DateTime(), nullable=True),
+            sa.Column('current_value', sa.Float(), nullable=True),
+            sa.Column('progress', sa.Float(), nullable=True),
+            sa.Column('is_achieved', sa.Boolean(), nullable=True),
+            sa.Column('stats_version', sa.Integer(), nullable=True),
+            sa.Column('evaluated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['goal_id'], ['goals.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('goal_id')
+        )
+        op.create_index('ix_goal_progress_user_id', 'goal_progress', ['user_id'])
+
+def downgrade():
+    # Таблицы могли существовать до миграции (metadata.create_all), поэтому
+    # при откате они сохраняются; удаление — вместе с откатом 003/006/008 вручную
+    pass
@@ -0,0 +1,34 @@
+"""restore drinks check constraints
+
+Revision ID: 012
+Revises: 011
+Create Date: 2024-06-20 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+# Проверки из 001; CREATE TABLE ... (LIKE drinks INCLUDING DEFAULTS) в 005 их не копировал
+CHECKS = {
+    'check_volume_positive': 'volume > 0',
+    'check_alcohol_content': 'alcohol_content >= 0 AND alcohol_content <= 100'
+}
+
+def upgrade():
+    existing = {
+        check['name'] for check in sa.inspect(op.get_bind()).get_check_constraints('drinks')
+    }
+    # На партиционированной таблице проверка создается и на всех партициях
+    for name, condition in CHECKS.items():
+        if name not in existing:
+            op.create_check_constraint(name, 'drinks', sa.text(condition))
+
+def downgrade():
+    # Проверки существовали до 005, поэтому при откате они сохраняются
+    pass
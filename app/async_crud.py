@@ -0,0 +1,154 @@
+"""Асинхронные обертки над crud.
+
+Запросы выполняются функциями из crud через AsyncSession.run_sync, поэтому логика
+запросов общая для синхронного и асинхронного кода, а ввод-вывод идет через
+асинхронный драйвер и не блокирует event loop.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import bac, crud, goals, jobs, percentiles, schemas
+from .database import AsyncSessionLocal, read_session
+
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.get_user, user_id)
+
+async def get_user_by_telegram_id(db: AsyncSession, telegram_id: int):
+    return await db.run_sync(crud.get_user_by_telegram_id, telegram_id)
+
+async def get_user_identity(db: AsyncSession, telegram_id: int):
+    # При попадании в кэш сессия не открывает соединение с базой
+    user = crud.user_cache.get(telegram_id)
+    if user is None:
+        user = await db.run_sync(crud.load_user_identity, telegram_id)
+    return user
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return await db.run_sync(crud.get_users, skip, limit)
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    return await db.run_sync(crud.create_user, user)
+
+async def get_user_settings(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.get_user_settings, user_id)
+
+async def update_user_settings(db: AsyncSession, user_id: int, settings: schemas.UserSettingsUpdate):
+    return await db.run_sync(crud.update_user_settings, user_id, settings)
+
+async def get_due_notifications(db: AsyncSession, start: time, end: time = None, after=None, limit: int = 1000):
+    return await db.run_sync(crud.get_due_notifications, start, end, after, limit)
+
+async def get_changed_notifications(db: AsyncSession, since: datetime, limit: int = 1000):
+    return await db.run_sync(crud.get_changed_notifications, since, limit)
+
+async def get_drinks(db: AsyncSession, user_id: int = None, cursor: str = None, limit: int = 100):
+    return await db.run_sync(crud.get_drinks, user_id, cursor, limit)
+
+async def get_drink_rows(db: AsyncSession, user_id: int = None, cursor: str = None, limit: int = 100):
+    return await db.run_sync(crud.get_drink_rows, user_id, cursor, limit)
+
+async def create_drink(db: AsyncSession, drink: schemas.DrinkCreate):
+    return await db.run_sync(crud.create_drink, drink)
+
+async def create_drinks_bulk(db: AsyncSession, drinks: List[schemas.DrinkImport]):
+    return await db.run_sync(crud.create_drinks_bulk, drinks)
+
+async def get_sober_periods(db: AsyncSession, user_id: int = None, cursor: str = None, limit: int = 100):
+    return await db.run_sync(crud.get_sober_periods, user_id, cursor, limit)
+
+async def get_sober_period_rows(db: AsyncSession, user_id: int = None, cursor: str = None, limit: int = 100):
+    return await db.run_sync(crud.get_sober_period_rows, user_id, cursor, limit)
+
+async def create_sober_period(db: AsyncSession, period: schemas.SoberPeriodCreate):
+    return await db.run_sync(crud.create_sober_period, period)
+
+async def get_goals(db: AsyncSession, user_id: int = None, cursor: str = None, limit: int = 100):
+    return await db.run_sync(crud.get_goals, user_id, cursor, limit)
+
+async def get_goal_rows(db: AsyncSession, user_id: int = None, cursor: str = None, limit: int = 100):
+    return await db.run_sync(crud.get_goal_rows, user_id, cursor, limit)
+
+async def create_goal(db: AsyncSession, goal: schemas.GoalCreate):
+    return await db.run_sync(crud.create_goal, goal)
+
+async def get_user_drinks(db: AsyncSession, user_id: int, cursor: str = None, limit: int = 100):
+    return await db.run_sync(crud.get_user_drinks, user_id, cursor, limit)
+
+async def get_user_sober_periods(db: AsyncSession, user_id: int, cursor: str = None, limit: int = 100):
+    return await db.run_sync(crud.get_user_sober_periods, user_id, cursor, limit)
+
+async def get_user_goals(db: AsyncSession, user_id: int, cursor: str = None, limit: int = 100):
+    return await db.run_sync(crud.get_user_goals, user_id, cursor, limit)
+
+async def get_active_sober_period(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.get_active_sober_period, user_id)
+
+async def end_sober_period(db: AsyncSession, period_id: int):
+    return await db.run_sync(crud.end_sober_period, period_id)
+
+async def get_user_statistics(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.get_user_statistics, user_id)
+
+async def get_user_daily_stats(db: AsyncSession, user_id: int, start_day: date = None, end_day: date = None):
+    return await db.run_sync(crud.get_user_daily_stats, user_id, start_day, end_day)
+
+async def get_range_stats(db: AsyncSession, user_id: int, start_date: date = None, end_date: date = None, bucket: str = "day"):
+    return await db.run_sync(crud.get_range_stats, user_id, start_date, end_date, bucket)
+
+async def evaluate_goals(db: AsyncSession, user_id: int = None):
+    return await db.run_sync(goals.evaluate_goals, user_id)
+
+async def get_goal_progress(db: AsyncSession, user_id: int, evaluate: bool = True):
+    return await db.run_sync(goals.get_goal_progress, user_id, None, evaluate)
+
+async def read_goal_progress(user_id: int):
+    # Свежий прогресс читается с реплики; устаревший пересчитывается в основной базе
+    async with read_session(user_id) as db:
+        progress = await get_goal_progress(db, user_id, evaluate=False)
+    if progress is None:
+        async with AsyncSessionLocal() as db:
+            progress = await get_goal_progress(db, user_id)
+    return progress
+
+async def get_bac_timeline(db: AsyncSession, user_id: int, start: datetime, end: datetime, step: timedelta):
+    return await db.run_sync(bac.get_bac_timeline, user_id, start, end, step)
+
+async def get_current_bac(db: AsyncSession, user_ids: List[int], now: datetime = None):
+    return await db.run_sync(bac.get_current_bac, user_ids, now)
+
+async def users_over_limit(db: AsyncSession, user_ids: List[int], now: datetime = None):
+    return await db.run_sync(bac.users_over_limit, user_ids, now)
+
+async def get_user_percentiles(db: AsyncSession, user_id: int, period: str = "weekly"):
+    return await db.run_sync(percentiles.get_user_percentiles, user_id, period)
+
+async def acquire_lease(db: AsyncSession, name: str, holder: str, ttl: timedelta):
+    return await db.run_sync(jobs.acquire_lease, name, holder, ttl)
+
+async def release_lease(db: AsyncSession, name: str, holder: str):
+    return await db.run_sync(jobs.release_lease, name, holder)
+
+async def enqueue_job(db: AsyncSession, kind: str, payload: dict, dedupe_key: str = None):
+    return await db.run_sync(jobs.enqueue_job, kind, payload, dedupe_key)
+
+async def claim_jobs(db: AsyncSession, worker: str, limit: int = 100):
+    return await db.run_sync(jobs.claim_jobs, worker, limit)
+
+async def complete_jobs(db: AsyncSession, job_ids: List[int]):
+    return await db.run_sync(jobs.complete_jobs, job_ids)
+
+async def retry_job(db: AsyncSession, job_id: int, attempts: int, error: str):
+    return await db.run_sync(jobs.retry_job, job_id, attempts, error)
+
+async def get_bot_status(db: AsyncSession, name: str):
+    def status(session):
+        lease = jobs.get_lease(session, name)
+        return {
+            "holder": lease.holder if lease else None,
+            "token": lease.token if lease else None,
+            "expires_at": lease.expires_at if lease else None,
+            "pending_jobs": jobs.pending_jobs(session)
+        }
+    return await db.run_sync(status)
@@ -0,0 +1,154 @@
+"""Оценка концентрации алкоголя в крови (формула Видмарка), в промилле.
+
+Напитки раскладываются по сетке времени, всасывание — свертка доз с
+экспоненциальным ядром (через FFT, сразу по всем напиткам и пользователям),
+выведение — постоянная скорость β. Концентрация не опускается ниже нуля:
+кривая получается отражением X(t) = A(t)/(r·m) − β·t от нуля через накопленный
+минимум, без цикла по шагам и напиткам.
+
+Вес и пол берутся из users.settings (weight_kg, sex), иначе значения по умолчанию.
+Оценка приблизительная и не заменяет алкотестер.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models
+
+ETHANOL_DENSITY = 0.789  # г/мл
+# Коэффициенты Видмарка (доля воды в массе тела)
+WIDMARK_FACTORS = {"male": 0.68, "female": 0.55}
+BAC_DEFAULT_WEIGHT = float(os.getenv("BAC_DEFAULT_WEIGHT", "70"))
+BAC_DEFAULT_SEX = os.getenv("BAC_DEFAULT_SEX", "male")
+# Константа всасывания, 1/ч (половина дозы всасывается примерно за 7 минут)
+BAC_ABSORPTION_RATE = float(os.getenv("BAC_ABSORPTION_RATE", "6.0"))
+# Скорость выведения, ‰/ч
+BAC_ELIMINATION_RATE = float(os.getenv("BAC_ELIMINATION_RATE", "0.15"))
+# Допустимая концентрация, ‰
+BAC_LIMIT = float(os.getenv("BAC_LIMIT", "0.3"))
+# Напитки раньше начала кривой на этот срок учитываются как остаток алкоголя
+BAC_LOOKBACK = timedelta(hours=int(os.getenv("BAC_LOOKBACK_HOURS", "48")))
+BAC_MAX_POINTS = int(os.getenv("BAC_MAX_POINTS", "200000"))
+
+def body_water(settings: dict):
+    """r·m в кг для пользователя"""
+    settings = settings or {}
+    weight = settings.get("weight_kg") or BAC_DEFAULT_WEIGHT
+    factor = WIDMARK_FACTORS.get(settings.get("sex"), WIDMARK_FACTORS[BAC_DEFAULT_SEX])
+    return float(weight) * factor
+
+def _absorbed(doses: np.ndarray, step_hours: float, absorption_rate: float):
+    """Всосавшийся алкоголь к каждому шагу: сумма доз минус еще не всосавшаяся часть"""
+    n = doses.shape[-1]
+    # Ядро обрезается, когда невсосавшаяся доля меньше 1e-6
+    length = min(n, int(np.ceil(np.log(1e6) / (absorption_rate * step_hours))) + 1)
+    kernel = np.exp(-absorption_rate * step_hours * np.arange(length))
+    size = 1 << int(np.ceil(np.log2(n + length - 1)))
+    pending = np.fft.irfft(np.fft.rfft(doses, size) * np.fft.rfft(kernel, size), size)[..., :n]
+    return np.cumsum(doses, axis=-1) - pending
+
+def bac_curves(
+    doses: np.ndarray,
+    water: np.ndarray,
+    step: timedelta,
+    absorption_rate: float = BAC_ABSORPTION_RATE,
+    elimination_rate: float = BAC_ELIMINATION_RATE
+):
+    """Кривые концентрации для матрицы доз (пользователи × шаги, граммы этанола)"""
+    step_hours = step.total_seconds() / 3600
+    absorbed = _absorbed(doses, step_hours, absorption_rate)
+    x = absorbed / water[:, None] - elimination_rate * step_hours * np.arange(doses.shape[-1])
+    # Отражение от нуля: выведение не идет, пока алкоголя в крови нет
+    floor = np.minimum.accumulate(np.minimum(x, 0.0), axis=-1)
+    return np.maximum(x - floor, 0.0)
+
+def _load(db: Session, user_ids: List[int], start: datetime, end: datetime, step: timedelta):
+    """Матрица доз по сетке [start - BAC_LOOKBACK, end] и r·m пользователей"""
+    # Сетка продолжается назад от start, чтобы start попал точно на шаг
+    offset = int(np.ceil(BAC_LOOKBACK / step))
+    grid_start = start - step * offset
+    n = offset + int((end - start) / step) + 1
+    index = {user_id: i for i, user_id in enumerate(user_ids)}
+
+    water = np.full(len(user_ids), body_water({}))
+    for user_id, settings in db.query(models.User.id, models.User.settings).filter(
+        models.User.id.in_(user_ids)
+    ):
+        water[index[user_id]] = body_water(settings)
+
+    rows = db.query(
+        models.Drink.user_id,
+        models.Drink.created_at,
+        models.Drink.volume * models.Drink.alcohol_content
+    ).filter(
+        models.Drink.user_id.in_(user_ids),
+        models.Drink.created_at >= grid_start,
+        models.Drink.created_at <= end
+    ).all()
+
+    doses = np.zeros((len(user_ids), n))
+    if rows:
+        users, times, pure = zip(*rows)
+        rows_index = np.fromiter((index[user_id] for user_id in users), dtype=np.int64, count=len(rows))
+        offsets = (np.array(times, dtype="datetime64[us]") - np.datetime64(grid_start, "us"))
+        steps = offsets // np.timedelta64(int(step.total_seconds() * 1e6), "us")
+        grams = np.array(pure, dtype=float) / 100 * ETHANOL_DENSITY
+        np.add.at(doses, (rows_index, steps.astype(np.int64)), np.nan_to_num(grams))
+    return doses, water, offset
+
+def get_bac_timeline(db: Session, user_id: int, start: datetime, end: datetime, step: timedelta):
+    """Кривая концентрации пользователя на сетке start, start + step, ... до end"""
+    doses, water, offset = _load(db, [user_id], start, end, step)
+    curve = bac_curves(doses, water, step)[0, offset:]
+    peak_index = int(curve.argmax())
+    return {
+        "user_id": user_id,
+        "start": start,
+        "step_minutes": step.total_seconds() / 60,
+        "limit": BAC_LIMIT,
+        "peak": float(curve[peak_index]),
+        "peak_at": start + step * peak_index,
+        "minutes_over_limit": float((curve > BAC_LIMIT).sum() * step.total_seconds() / 60),
+        "points": np.round(curve, 4).tolist()
+    }
+
+def get_current_bac(
+    db: Session,
+    user_ids: List[int],
+    now: datetime = None,
+    step: timedelta = timedelta(minutes=5),
+    horizon: timedelta = timedelta(hours=24)
+) -> Dict[int, tuple]:
+    """Текущая концентрация и момент, когда она опустится ниже BAC_LIMIT, для многих пользователей.
+
+    Возвращает user_id -> (промилле сейчас, время ниже предела или None, если уже ниже).
+    """
+    now = now or datetime.utcnow()
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    doses, water, offset = _load(db, user_ids, now, now + horizon, step)
+    # Кривые считаются только для пользователей с напитками в окне, у остальных ноль
+    drinking = np.flatnonzero(doses.any(axis=1))
+    result = {user_id: (0.0, None) for user_id in user_ids}
+    if not len(drinking):
+        return result
+    curves = bac_curves(doses[drinking], water[drinking], step)[:, offset:]
+    current = curves[:, 0]
+    below = curves < BAC_LIMIT
+    # Первый шаг ниже предела; если до горизонта не опускается — конец горизонта
+    first_below = np.where(below.any(axis=1), below.argmax(axis=1), curves.shape[1] - 1)
+    for row, i in enumerate(drinking):
+        result[user_ids[i]] = (
+            float(current[row]),
+            now + step * int(first_below[row]) if current[row] >= BAC_LIMIT else None
+        )
+    return result
+
+def users_over_limit(db: Session, user_ids: List[int], now: datetime = None):
+    """Пользователи, чья текущая оценка не ниже BAC_LIMIT"""
+    current = get_current_bac(db, user_ids, now, horizon=timedelta(0))
+    return {user_id for user_id, (bac, _) in current.items() if bac >= BAC_LIMIT}
@@ -0,0 +1,253 @@
+"""Отдельный процесс бота для развертывания с несколькими воркерами API.
+
+Запускается один или несколько процессов; роль бота получает держатель аренды
+в bot_leases (app.jobs), остальные ждут в резерве и забирают роль, если аренда
+не продлена за BOT_LEASE_SECONDS. Держатель получает обновления Telegram
+(BOT_UPDATES=polling) или берет их из очереди bot_jobs, куда их кладет webhook
+API в режиме BOT_MODE=worker (BOT_UPDATES=webhook), запускает напоминания и
+выполняет задания API. Потерявший аренду процесс сразу останавливает бота.
+
+    python -m app.bot_worker
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+from datetime import time, timedelta
+
+from telegram import Update
+
+from . import async_crud
+from .jobs import BOT_LEASE_NAME
+from .database import AsyncSessionLocal, async_engine, replicas
+from .metrics import BOT_JOBS, BOT_LEASE_HELD, instrument_engine
+from .telegram_bot import BOT_CONCURRENT_UPDATES, setup_bot, start_reminders, start_webhook, stop_reminders
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Аренда истекает, если держатель не продлил ее за это время; продление — каждую треть срока
+BOT_LEASE_SECONDS = float(os.getenv("BOT_LEASE_SECONDS", "30"))
+# Источник обновлений: polling - getUpdates, webhook - очередь bot_jobs
+BOT_UPDATES = os.getenv("BOT_UPDATES", "polling")
+# Пауза между опросами пустой очереди, в секундах
+BOT_JOBS_INTERVAL = float(os.getenv("BOT_JOBS_INTERVAL", "1"))
+BOT_JOBS_BATCH = int(os.getenv("BOT_JOBS_BATCH", "100"))
+
+def job_key(job: dict):
+    """Задания с одинаковым ключом выполняются по порядку: обновления одного чата, настройки одного пользователя"""
+    if job["kind"] == "update":
+        update = job["update"]
+        if update is not None and update.effective_chat is not None:
+            return ("chat", update.effective_chat.id)
+    elif job["kind"] == "reschedule":
+        return ("user", job["payload"]["user_id"])
+    return ("job", job["id"])
+
+class BotWorker:
+    def __init__(
+        self,
+        build_application=None,
+        session_factory=AsyncSessionLocal,
+        holder: str = None,
+        updates: str = BOT_UPDATES,
+        lease_seconds: float = BOT_LEASE_SECONDS,
+        jobs_interval: float = BOT_JOBS_INTERVAL,
+        batch_size: int = BOT_JOBS_BATCH,
+        concurrency: int = BOT_CONCURRENT_UPDATES
+    ):
+        self.build_application = build_application or (lambda: setup_bot(webhook=updates != "polling"))
+        self.session_factory = session_factory
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}"
+        self.updates = updates
+        self.lease_seconds = lease_seconds
+        self.jobs_interval = jobs_interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.application = None
+        self.token = None
+        self._closed = False
+        self._wakeup = asyncio.Event()
+
+    async def _acquire(self):
+        async with self.session_factory() as db:
+            return await async_crud.acquire_lease(
+                db, BOT_LEASE_NAME, self.holder, timedelta(seconds=self.lease_seconds)
+            )
+
+    async def _release(self):
+        async with self.session_factory() as db:
+            await async_crud.release_lease(db, BOT_LEASE_NAME, self.holder)
+
+    async def _sleep(self, seconds: float):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _start_bot(self):
+        application = self.build_application()
+        if self.updates == "polling":
+            await application.initialize()
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            await application.start()
+            await start_reminders(application)
+        else:
+            await start_webhook(application)
+        self.application = application
+
+    async def _stop_bot(self):
+        application, self.application = self.application, None
+        if application is None:
+            return
+        await stop_reminders(application)
+        if application.updater is not None and application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+
+    async def _keep_lease(self):
+        """Продление аренды; задача завершается, когда аренда потеряна"""
+        loop = asyncio.get_running_loop()
+        renewed_at = loop.time()
+        while not self._closed:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                token = await self._acquire()
+            except Exception as e:
+                logger.error(f"Error renewing bot lease: {str(e)}")
+                # Без связи с базой роль отдается до истечения аренды, а не после
+                if loop.time() - renewed_at < self.lease_seconds * 2 / 3:
+                    continue
+                token = None
+            if token != self.token:
+                logger.warning(f"Bot lease lost by {self.holder}")
+                # Будит основной цикл, чтобы бот остановился, не дожидаясь паузы опроса очереди
+                self._wakeup.set()
+                return
+            renewed_at = loop.time()
+
+    async def _handle(self, job: dict):
+        if job["kind"] == "update":
+            if job["update"] is None:
+                raise ValueError("Invalid update payload")
+            await self.application.process_update(job["update"])
+        elif job["kind"] == "reschedule":
+            scheduler = self.application.bot_data.get("reminders")
+            if scheduler is not None:
+                payload = job["payload"]
+                notification_time = payload.get("notification_time")
+                scheduler.reschedule(
+                    payload["user_id"],
+                    payload["telegram_id"],
+                    payload["enabled"],
+                    time.fromisoformat(notification_time) if notification_time else None
+                )
+        else:
+            raise ValueError(f"Unknown job kind: {job['kind']}")
+
+    async def process_jobs(self):
+        """Выполнение одной пачки заданий; возвращает число взятых заданий"""
+        async with self.session_factory() as db:
+            jobs = await async_crud.claim_jobs(db, self.holder, self.batch_size)
+        if not jobs:
+            return 0
+
+        groups = {}
+        for job in jobs:
+            job["update"] = None
+            if job["kind"] == "update":
+                try:
+                    job["update"] = Update.de_json(job["payload"], self.application.bot)
+                except Exception as e:
+                    logger.error(f"Invalid update in bot job {job['id']}: {str(e)}")
+            groups.setdefault(job_key(job), []).append(job)
+
+        done, failed = [], []
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_group(group):
+            async with semaphore:
+                for job in group:
+                    try:
+                        await self._handle(job)
+                        done.append(job["id"])
+                        BOT_JOBS.labels(job["kind"], "ok").inc()
+                    except Exception as e:
+                        logger.error(f"Error processing bot job {job['id']}: {str(e)}")
+                        failed.append((job, str(e)))
+                        BOT_JOBS.labels(job["kind"], "error").inc()
+
+        await asyncio.gather(*(run_group(group) for group in groups.values()))
+        async with self.session_factory() as db:
+            await async_crud.complete_jobs(db, done)
+            for job, error in failed:
+                await async_crud.retry_job(db, job["id"], job["attempts"], error)
+        return len(jobs)
+
+    async def run(self):
+        while not self._closed:
+            try:
+                self.token = await self._acquire()
+            except Exception as e:
+                logger.error(f"Error acquiring bot lease: {str(e)}")
+                self.token = None
+            if self.token is None:
+                await self._sleep(self.lease_seconds / 3)
+                continue
+
+            logger.info(f"Bot lease acquired by {self.holder} (token {self.token})")
+            BOT_LEASE_HELD.set(1)
+            keeper = asyncio.create_task(self._keep_lease())
+            try:
+                await self._start_bot()
+                while not self._closed and not keeper.done():
+                    try:
+                        taken = await self.process_jobs()
+                    except Exception as e:
+                        logger.error(f"Error processing bot jobs: {str(e)}")
+                        taken = 0
+                    if taken < self.batch_size:
+                        await self._sleep(self.jobs_interval)
+            except Exception as e:
+                logger.error(f"Error running bot: {str(e)}")
+            finally:
+                lost = keeper.done()
+                keeper.cancel()
+                try:
+                    await self._stop_bot()
+                except Exception as e:
+                    logger.error(f"Error stopping bot: {str(e)}")
+                BOT_LEASE_HELD.set(0)
+                if not lost:
+                    try:
+                        await self._release()
+                    except Exception as e:
+                        logger.error(f"Error releasing bot lease: {str(e)}")
+            if not self._closed:
+                # Пауза перед новой попыткой, чтобы роль успел забрать резерв
+                await self._sleep(self.lease_seconds / 3)
+
+    def stop(self):
+        self._closed = True
+        self._wakeup.set()
+
+async def main():
+    worker = BotWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+if __name__ == "__main__":
+    if os.getenv("BOT_METRICS_PORT"):
+        from prometheus_client import start_http_server
+
+        start_http_server(int(os.getenv("BOT_METRICS_PORT")))
+    instrument_engine(async_engine.sync_engine)
+    for replica_engine in replicas.engines:
+        instrument_engine(replica_engine.sync_engine)
+    asyncio.run(main())
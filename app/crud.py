@@ -1,6 +1,62 @@
+from sqlalchemy import Date, bindparam, cast, func, insert, tuple_, type_coerce, update
 from sqlalchemy.orm import Session
-from . import models, schemas
-from datetime import datetime
+from . import models, percentiles, schemas
+from .cache import TTLCache
+from .database import mark_written, upsert
+from .stats_cache import stats_cache
+from datetime import date, datetime, time, timedelta
+from typing import List
+import base64
+import os
+
+# Кэш telegram_id -> пользователь для обработчиков бота. Отсутствующие пользователи
+# не кэшируются, поэтому регистрация в другом воркере видна сразу
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "300"))
+)
+
+def encode_cursor(timestamp: datetime, row_id: int):
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _keyset_page(query, time_column, id_column, cursor: str = None, limit: int = 100, upper_bound: datetime = None):
+    # Страница читается по индексу (user_id, time_column) от позиции курсора, без OFFSET.
+    # upper_bound — граница по времени для первой страницы, у которой курсора нет
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        # Отдельная граница по времени нужна PostgreSQL для отсечения партиций,
+        # сравнение кортежей для этого не используется
+        query = query.filter(
+            time_column <= timestamp,
+            tuple_(time_column, id_column) < tuple_(timestamp, row_id)
+        )
+    elif upper_bound is not None:
+        query = query.filter(time_column < upper_bound)
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_column.key), last.id)
+    return rows, next_cursor
+
+def _page_rows(db: Session, model, schema, time_column, user_id: int = None, cursor: str = None, limit: int = 100,
+               upper_bound: datetime = None):
+    # Только колонки схемы ответа, без ORM-объектов; словари уже в виде ответа API
+    query = db.query(*[getattr(model, name) for name in schema.model_fields])
+    if user_id is not None:
+        query = query.filter(model.user_id == user_id)
+    rows, next_cursor = _keyset_page(query, time_column, model.id, cursor, limit, upper_bound)
+    return [row._asdict() for row in rows], next_cursor
 
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
@@ -11,63 +67,607 @@ def get_user_by_telegram_id(db: Session, telegram_id: int):
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
+def load_user_identity(db: Session, telegram_id: int):
+    # Снимок schemas.User не привязан к сессии, поэтому его можно кэшировать
+    db_user = get_user_by_telegram_id(db, telegram_id)
+    if not db_user:
+        return None
+    user = schemas.User.model_validate(db_user)
+    user_cache.set(telegram_id, user)
+    return user
+
+def get_user_identity(db: Session, telegram_id: int):
+    user = user_cache.get(telegram_id)
+    if user is None:
+        user = load_user_identity(db, telegram_id)
+    return user
+
+def invalidate_user_cache(telegram_id: int):
+    # Вызывается при создании и любом изменении пользователя
+    user_cache.delete(telegram_id)
+
 def create_user(db: Session, user: schemas.UserCreate):
     db_user = models.User(**user.dict())
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user_cache(db_user.telegram_id)
     return db_user
 
-def get_drinks(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Drink).offset(skip).limit(limit).all()
+def get_user_settings(db: Session, user_id: int):
+    return db.query(models.UserSettings).filter(models.UserSettings.user_id == user_id).first()
+
+def update_user_settings(db: Session, user_id: int, settings: schemas.UserSettingsUpdate):
+    db_settings = get_user_settings(db, user_id)
+    if db_settings is None:
+        db_settings = models.UserSettings(user_id=user_id)
+        db.add(db_settings)
+    for field, value in settings.model_dump().items():
+        setattr(db_settings, field, value)
+    db.commit()
+    db.refresh(db_settings)
+    return db_settings
+
+def get_due_notifications(db: Session, start: time, end: time = None, after=None, limit: int = 1000):
+    """Пользователи с напоминанием в интервале времени суток [start, end).
+
+    Выборка идет по индексу idx_user_settings_notification в порядке
+    (notification_time, user_id); after — последняя пара предыдущей страницы.
+    """
+    query = db.query(
+        models.UserSettings.user_id,
+        models.User.telegram_id,
+        models.UserSettings.notification_time
+    ).join(
+        models.User, models.User.id == models.UserSettings.user_id
+    ).filter(
+        models.UserSettings.notification_enabled == True,
+        models.UserSettings.notification_time >= start
+    )
+    if end is not None:
+        query = query.filter(models.UserSettings.notification_time < end)
+    if after is not None:
+        query = query.filter(
+            tuple_(models.UserSettings.notification_time, models.UserSettings.user_id) > tuple_(*after)
+        )
+    return query.order_by(
+        models.UserSettings.notification_time, models.UserSettings.user_id
+    ).limit(limit).all()
+
+def get_changed_notifications(db: Session, since: datetime, limit: int = 1000):
+    # Настройки, измененные после since, в порядке изменения
+    return db.query(
+        models.UserSettings.user_id,
+        models.User.telegram_id,
+        models.UserSettings.notification_enabled,
+        models.UserSettings.notification_time,
+        models.UserSettings.updated_at
+    ).join(
+        models.User, models.User.id == models.UserSettings.user_id
+    ).filter(
+        models.UserSettings.updated_at > since
+    ).order_by(models.UserSettings.updated_at).limit(limit).all()
+
+def _drinks_upper_bound(db: Session, user_id: int = None):
+    """Конец последнего дня с напитками по дневной сводке.
+
+    Первая страница drinks тоже ограничена по created_at, как и следующие,
+    поэтому PostgreSQL не читает пустые будущие партиции.
+    """
+    query = db.query(func.max(models.UserDailyStats.day))
+    if user_id is not None:
+        query = query.filter(models.UserDailyStats.user_id == user_id)
+    last_day = query.scalar()
+    return datetime.combine(last_day + timedelta(days=1), time.min) if last_day else None
+
+def get_drinks(db: Session, user_id: int = None, cursor: str = None, limit: int = 100):
+    query = db.query(models.Drink)
+    if user_id is not None:
+        query = query.filter(models.Drink.user_id == user_id)
+    upper_bound = None if cursor else _drinks_upper_bound(db, user_id)
+    return _keyset_page(query, models.Drink.created_at, models.Drink.id, cursor, limit, upper_bound)
+
+def get_drink_rows(db: Session, user_id: int = None, cursor: str = None, limit: int = 100):
+    upper_bound = None if cursor else _drinks_upper_bound(db, user_id)
+    return _page_rows(db, models.Drink, schemas.Drink, models.Drink.created_at, user_id, cursor, limit, upper_bound)
+
+def bump_stats_version(db: Session, user_ids):
+    # Выполняется в транзакции записи, коммит делает вызывающий код
+    mark_written(db, user_ids)
+    db.query(models.User).filter(models.User.id.in_(list(user_ids))).update(
+        {models.User.stats_version: func.coalesce(models.User.stats_version, 0) + 1},
+        synchronize_session=False
+    )
+
+def get_stats_version(db: Session, user_id: int):
+    return db.query(models.User.stats_version).filter(models.User.id == user_id).scalar()
 
 def create_drink(db: Session, drink: schemas.DrinkCreate):
     db_drink = models.Drink(**drink.dict())
     db.add(db_drink)
+    db.flush()
+    apply_drink_to_daily_stats(db, db_drink)
+    apply_drinks_to_streaks(db, [{"user_id": db_drink.user_id, "created_at": db_drink.created_at}])
+    percentiles.apply_drinks_to_sketches(db, [_drink_row(db_drink)])
+    bump_stats_version(db, [db_drink.user_id])
     db.commit()
     db.refresh(db_drink)
     return db_drink
 
-def get_sober_periods(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.SoberPeriod).offset(skip).limit(limit).all()
+def create_drinks_bulk(db: Session, drinks: List[schemas.DrinkImport]):
+    # Core-вставка пачками INSERT ... VALUES (insertmanyvalues) в одной транзакции, без ORM-объектов.
+    # Для напитков неизвестных пользователей возвращается None вместо id
+    user_ids = {drink.user_id for drink in drinks}
+    known_users = {
+        user_id for (user_id,) in db.query(models.User.id).filter(models.User.id.in_(user_ids))
+    } if user_ids else set()
+
+    now = datetime.utcnow()
+    rows = []
+    for drink in drinks:
+        if drink.user_id not in known_users:
+            continue
+        row = drink.model_dump()
+        row["created_at"] = row["created_at"] or now
+        rows.append(row)
+
+    ids = []
+    if rows:
+        # На SQLite упорядоченный RETURNING выполняется построчно. Писатель там один,
+        # rowid в пачке растут в порядке вставки, поэтому достаточно отсортировать id
+        sqlite = db.get_bind().dialect.name == "sqlite"
+        ids = db.execute(
+            insert(models.Drink.__table__).returning(models.Drink.id, sort_by_parameter_order=not sqlite),
+            rows
+        ).scalars().all()
+        if sqlite:
+            ids = sorted(ids)
+        apply_drinks_to_daily_stats(db, rows)
+        apply_drinks_to_streaks(db, rows)
+        percentiles.apply_drinks_to_sketches(db, rows)
+        bump_stats_version(db, {row["user_id"] for row in rows})
+    db.commit()
+
+    ids = iter(ids)
+    return [next(ids) if drink.user_id in known_users else None for drink in drinks]
+
+def get_sober_periods(db: Session, user_id: int = None, cursor: str = None, limit: int = 100):
+    query = db.query(models.SoberPeriod)
+    if user_id is not None:
+        query = query.filter(models.SoberPeriod.user_id == user_id)
+    return _keyset_page(query, models.SoberPeriod.start_time, models.SoberPeriod.id, cursor, limit)
+
+def get_sober_period_rows(db: Session, user_id: int = None, cursor: str = None, limit: int = 100):
+    return _page_rows(db, models.SoberPeriod, schemas.SoberPeriod, models.SoberPeriod.start_time, user_id, cursor, limit)
 
 def create_sober_period(db: Session, period: schemas.SoberPeriodCreate):
     db_period = models.SoberPeriod(**period.dict())
     db.add(db_period)
+    db.flush()
+    apply_sober_period_to_streak(db, db_period)
+    bump_stats_version(db, [db_period.user_id])
     db.commit()
     db.refresh(db_period)
     return db_period
 
-def get_goals(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Goal).offset(skip).limit(limit).all()
+def get_goals(db: Session, user_id: int = None, cursor: str = None, limit: int = 100):
+    query = db.query(models.Goal)
+    if user_id is not None:
+        query = query.filter(models.Goal.user_id == user_id)
+    return _keyset_page(query, models.Goal.start_date, models.Goal.id, cursor, limit)
+
+def get_goal_rows(db: Session, user_id: int = None, cursor: str = None, limit: int = 100):
+    return _page_rows(db, models.Goal, schemas.Goal, models.Goal.start_date, user_id, cursor, limit)
 
 def create_goal(db: Session, goal: schemas.GoalCreate):
     db_goal = models.Goal(**goal.dict())
     db.add(db_goal)
+    bump_stats_version(db, [db_goal.user_id])
     db.commit()
     db.refresh(db_goal)
     return db_goal
 
-def get_user_drinks(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Drink).filter(models.Drink.user_id == user_id).offset(skip).limit(limit).all()
+def get_user_drinks(db: Session, user_id: int, cursor: str = None, limit: int = 100):
+    return get_drinks(db, user_id=user_id, cursor=cursor, limit=limit)[0]
 
-def get_user_sober_periods(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.SoberPeriod).filter(models.SoberPeriod.user_id == user_id).offset(skip).limit(limit).all()
+def get_user_sober_periods(db: Session, user_id: int, cursor: str = None, limit: int = 100):
+    return get_sober_periods(db, user_id=user_id, cursor=cursor, limit=limit)[0]
 
-def get_user_goals(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Goal).filter(models.Goal.user_id == user_id).offset(skip).limit(limit).all()
+def get_user_goals(db: Session, user_id: int, cursor: str = None, limit: int = 100):
+    return get_goals(db, user_id=user_id, cursor=cursor, limit=limit)[0]
 
 def get_active_sober_period(db: Session, user_id: int):
+    # Читается по частичному индексу idx_sober_periods_active
     return db.query(models.SoberPeriod).filter(
         models.SoberPeriod.user_id == user_id,
         models.SoberPeriod.is_active == True
-    ).first()
+    ).order_by(models.SoberPeriod.start_time.desc()).first()
 
 def end_sober_period(db: Session, period_id: int):
     period = db.query(models.SoberPeriod).filter(models.SoberPeriod.id == period_id).first()
     if period:
         period.is_active = False
         period.end_time = datetime.utcnow()
+        apply_period_end_to_streak(db, period)
+        bump_stats_version(db, [period.user_id])
         db.commit()
         db.refresh(period)
-    return period 
\ No newline at end of file
+    return period
+
+def get_user_statistics(db: Session, user_id: int):
+    # Итоги состоят из чисел, схема для кэша не нужна
+    totals = stats_cache.get_or_compute(
+        user_id, get_stats_version(db, user_id), "user_statistics", (),
+        lambda: _get_user_statistics_totals(db, user_id)
+    )
+    # Серии зависят от текущего времени, поэтому считаются при каждом чтении
+    # из состояния user_streaks, без просмотра истории
+    now = datetime.utcnow()
+    streak = get_user_streak(db, user_id)
+    sober_seconds, longest_seconds = 0.0, 0.0
+    if streak:
+        longest_seconds = streak.longest_seconds or 0.0
+        if streak.current_start and now > streak.current_start:
+            sober_seconds = (now - streak.current_start).total_seconds()
+    longest_seconds = max(longest_seconds, sober_seconds)
+
+    return {
+        "total_alcohol": totals["total_alcohol"],
+        "days_with_drinks": totals["days_with_drinks"],
+        "sober_days": int(sober_seconds // 86400),
+        "best_streak_days": int(longest_seconds // 86400),
+        "last_drink_at": streak.last_drink_at if streak else None
+    }
+
+def _get_user_statistics_totals(db: Session, user_id: int):
+    # Агрегаты читаются из дневной сводки, без загрузки напитков в память
+    total_alcohol, days_with_drinks = db.query(
+        func.coalesce(func.sum(models.UserDailyStats.total_alcohol), 0.0),
+        func.count(models.UserDailyStats.day)
+    ).filter(
+        models.UserDailyStats.user_id == user_id,
+        models.UserDailyStats.drinks_count > 0
+    ).one()
+
+    return {
+        "total_alcohol": float(total_alcohol),
+        "days_with_drinks": days_with_drinks
+    }
+
+def _drink_day():
+    return type_coerce(func.date(models.Drink.created_at), Date)
+
+def _drink_row(drink: models.Drink):
+    return {
+        "user_id": drink.user_id,
+        "drink_type": drink.drink_type,
+        "volume": drink.volume,
+        "alcohol_content": drink.alcohol_content,
+        "price": drink.price,
+        "created_at": drink.created_at
+    }
+
+def apply_drink_to_daily_stats(db: Session, drink: models.Drink):
+    # Вызывается внутри транзакции создания напитка, коммит делает вызывающий код
+    return apply_drinks_to_daily_stats(db, [_drink_row(drink)])
+
+def apply_drinks_to_daily_stats(db: Session, drinks: List[dict]):
+    # Сначала сворачиваем напитки в дельты по (user_id, day), затем обновляем по строке на день
+    deltas = {}
+    for drink in drinks:
+        key = (drink["user_id"], drink["created_at"].date())
+        delta = deltas.setdefault(key, {"count": 0, "volume": 0.0, "alcohol": 0.0, "spent": 0.0, "by_type": {}})
+        delta["count"] += 1
+        delta["volume"] += drink["volume"]
+        delta["alcohol"] += drink["volume"] * drink["alcohol_content"] / 100
+        delta["spent"] += drink.get("price") or 0.0
+        delta["by_type"][drink["drink_type"]] = delta["by_type"].get(drink["drink_type"], 0) + 1
+
+    # Числовые дельты прибавляются в INSERT ... ON CONFLICT DO UPDATE: первая запись дня
+    # у двух транзакций не падает на уникальности. Строки берутся в порядке ключа,
+    # после upsert они заблокированы, и drinks_by_type дополняется без гонки
+    table = models.UserDailyStats.__table__
+    keys = sorted(deltas)
+    by_type = {}
+    for i in range(0, len(keys), 500):
+        statement = upsert(db, table).values([
+            {
+                "user_id": user_id,
+                "day": day,
+                "drinks_count": deltas[user_id, day]["count"],
+                "total_volume": deltas[user_id, day]["volume"],
+                "total_alcohol": deltas[user_id, day]["alcohol"],
+                "total_spent": deltas[user_id, day]["spent"],
+                "drinks_by_type": {}
+            }
+            for user_id, day in keys[i:i + 500]
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day],
+            set_={
+                column: table.c[column] + statement.excluded[column]
+                for column in ("drinks_count", "total_volume", "total_alcohol", "total_spent")
+            }
+        ).returning(table.c.user_id, table.c.day, table.c.drinks_by_type)
+        by_type.update({(user_id, day): current for user_id, day, current in db.execute(statement)})
+
+    merged = []
+    for key in keys:
+        drinks_by_type = dict(by_type.get(key) or {})
+        for drink_type, count in deltas[key]["by_type"].items():
+            drinks_by_type[drink_type] = drinks_by_type.get(drink_type, 0) + count
+        merged.append({"b_user_id": key[0], "b_day": key[1], "b_by_type": drinks_by_type})
+    if merged:
+        db.execute(
+            update(table).where(
+                table.c.user_id == bindparam("b_user_id"), table.c.day == bindparam("b_day")
+            ).values(drinks_by_type=bindparam("b_by_type")),
+            merged
+        )
+
+def get_user_daily_stats(db: Session, user_id: int, start_day: date = None, end_day: date = None):
+    query = db.query(models.UserDailyStats).filter(models.UserDailyStats.user_id == user_id)
+    if start_day:
+        query = query.filter(models.UserDailyStats.day >= start_day)
+    if end_day:
+        query = query.filter(models.UserDailyStats.day <= end_day)
+    return query.order_by(models.UserDailyStats.day).all()
+
+def rebuild_user_daily_stats(db: Session, user_id: int):
+    db.query(models.UserDailyStats).filter(
+        models.UserDailyStats.user_id == user_id
+    ).delete(synchronize_session=False)
+
+    day = _drink_day().label("day")
+    totals = db.query(
+        day,
+        func.count(models.Drink.id),
+        func.sum(models.Drink.volume),
+        func.sum(models.Drink.volume * models.Drink.alcohol_content / 100),
+        func.coalesce(func.sum(models.Drink.price), 0.0)
+    ).filter(models.Drink.user_id == user_id).group_by(day).all()
+
+    by_type = {}
+    type_day = _drink_day().label("day")
+    type_counts = db.query(
+        type_day,
+        models.Drink.drink_type,
+        func.count(models.Drink.id)
+    ).filter(models.Drink.user_id == user_id).group_by(type_day, models.Drink.drink_type)
+    for row_day, drink_type, count in type_counts:
+        by_type.setdefault(row_day, {})[drink_type] = count
+
+    db.add_all([
+        models.UserDailyStats(
+            user_id=user_id,
+            day=row_day,
+            drinks_count=count,
+            total_volume=volume,
+            total_alcohol=alcohol,
+            total_spent=spent,
+            drinks_by_type=by_type.get(row_day, {})
+        )
+        for row_day, count, volume, alcohol, spent in totals
+    ])
+    bump_stats_version(db, [user_id])
+    db.commit()
+    return len(totals)
+
+def rebuild_daily_stats(db: Session, user_id: int = None):
+    # Пересчет идет по одному пользователю за транзакцию, чтобы не держать всю историю в памяти
+    if user_id is not None:
+        return rebuild_user_daily_stats(db, user_id)
+    rows = 0
+    for (uid,) in db.query(models.User.id).all():
+        rows += rebuild_user_daily_stats(db, uid)
+    return rows
+
+def get_user_streak(db: Session, user_id: int):
+    return db.query(models.UserStreak).filter(models.UserStreak.user_id == user_id).first()
+
+def _lock_streak(db: Session, user_id: int):
+    # Вызывается внутри транзакции записи, коммит делает вызывающий код.
+    # Строка создается через ON CONFLICT DO NOTHING: FOR UPDATE отсутствующую строку
+    # не блокирует, и первая запись двух транзакций упала бы на уникальности
+    table = models.UserStreak.__table__
+    db.execute(upsert(db, table).values(user_id=user_id, longest_seconds=0.0).on_conflict_do_nothing(
+        index_elements=[table.c.user_id]
+    ))
+    return db.query(models.UserStreak).filter(
+        models.UserStreak.user_id == user_id
+    ).with_for_update().populate_existing().one()
+
+def _break_streak(streak: models.UserStreak, at: datetime):
+    if streak.current_start is not None and at > streak.current_start:
+        streak.longest_seconds = max(streak.longest_seconds or 0.0, (at - streak.current_start).total_seconds())
+
+def _longest_gap(db: Session, user_id: int, start: datetime, end: datetime):
+    # Самый длинный промежуток без напитков внутри [start, end], по индексу (user_id, created_at)
+    times = [start] + [at for (at,) in db.query(models.Drink.created_at).filter(
+        models.Drink.user_id == user_id,
+        models.Drink.created_at >= start,
+        models.Drink.created_at <= end
+    ).order_by(models.Drink.created_at)] + [end]
+    return max((b - a).total_seconds() for a, b in zip(times, times[1:]))
+
+def apply_drinks_to_streaks(db: Session, drinks: List[dict]):
+    # Напиток во время серии завершает ее и начинает новую с момента напитка.
+    # Напитки задним числом раньше начала серии учитываются только пересчетом
+    times = {}
+    for drink in drinks:
+        times.setdefault(drink["user_id"], []).append(drink["created_at"])
+    # Блокировки берутся в порядке user_id, чтобы параллельные пачки не ждали друг друга по кругу
+    for user_id in sorted(times):
+        streak = _lock_streak(db, user_id)
+        for at in sorted(times[user_id]):
+            if streak.current_start is not None and at >= streak.current_start:
+                _break_streak(streak, at)
+                streak.current_start = at
+        latest = max(times[user_id])
+        if streak.last_drink_at is None or latest > streak.last_drink_at:
+            streak.last_drink_at = latest
+
+def apply_sober_period_to_streak(db: Session, period: models.SoberPeriod):
+    streak = _lock_streak(db, period.user_id)
+    if period.is_active and period.end_time is None:
+        # Серия идет от начала самого раннего активного периода или от последнего напитка
+        start = period.start_time
+        if streak.last_drink_at and streak.last_drink_at > start:
+            # Промежуток от начала периода до напитка — завершенная серия
+            streak.longest_seconds = max(
+                streak.longest_seconds or 0.0, _longest_gap(db, period.user_id, start, streak.last_drink_at)
+            )
+            start = streak.last_drink_at
+        if streak.current_start is None or start < streak.current_start:
+            streak.current_start = start
+    else:
+        # Завершенный период, добавленный задним числом, может обновить рекорд
+        end = period.end_time or period.start_time
+        streak.longest_seconds = max(
+            streak.longest_seconds or 0.0, _longest_gap(db, period.user_id, period.start_time, end)
+        )
+
+def apply_period_end_to_streak(db: Session, period: models.SoberPeriod):
+    # Серия продолжается, пока остается другой активный период
+    other_active = db.query(models.SoberPeriod.id).filter(
+        models.SoberPeriod.user_id == period.user_id,
+        models.SoberPeriod.is_active == True,
+        models.SoberPeriod.id != period.id
+    ).first()
+    streak = _lock_streak(db, period.user_id)
+    if other_active is None:
+        _break_streak(streak, period.end_time)
+        streak.current_start = None
+
+def _merge_periods(periods):
+    """Объединение пересекающихся периодов; конец None — период еще активен"""
+    merged = []
+    for start, end in sorted(periods, key=lambda period: period[0]):
+        if merged and (merged[-1][1] is None or start < merged[-1][1]):
+            if merged[-1][1] is not None and (end is None or end > merged[-1][1]):
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+def rebuild_user_streak(db: Session, user_id: int):
+    # Пересекающиеся периоды (например, два активных) образуют одну серию,
+    # как и при инкрементальном обновлении
+    periods = db.query(
+        models.SoberPeriod.start_time, models.SoberPeriod.end_time, models.SoberPeriod.is_active
+    ).filter(models.SoberPeriod.user_id == user_id).all()
+    last_drink_at = db.query(func.max(models.Drink.created_at)).filter(
+        models.Drink.user_id == user_id
+    ).scalar()
+
+    longest, current_start = 0.0, None
+    intervals = [
+        (start, None if is_active and end is None else end or start)
+        for start, end, is_active in periods
+        if start is not None
+    ]
+    for start, end in _merge_periods(intervals):
+        if end is None:
+            # Текущая серия идет от начала самого раннего активного периода или от последнего напитка
+            current_start = max(start, last_drink_at) if last_drink_at else start
+            end = current_start
+        longest = max(longest, _longest_gap(db, user_id, start, end))
+
+    db.query(models.UserStreak).filter(models.UserStreak.user_id == user_id).delete(synchronize_session=False)
+    db.add(models.UserStreak(
+        user_id=user_id,
+        current_start=current_start,
+        longest_seconds=longest,
+        last_drink_at=last_drink_at
+    ))
+    bump_stats_version(db, [user_id])
+    db.commit()
+    return 1
+
+def rebuild_streaks(db: Session, user_id: int = None):
+    if user_id is not None:
+        return rebuild_user_streak(db, user_id)
+    rows = 0
+    for (uid,) in db.query(models.User.id).all():
+        rows += rebuild_user_streak(db, uid)
+    return rows
+
+def _bucket_expression(db: Session, column, bucket: str):
+    # Начало интервала (день, неделя с понедельника, месяц) считается на стороне базы
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.date_trunc(bucket, column), Date)
+    modifiers = {
+        "day": (),
+        "week": ("weekday 0", "-6 days"),
+        "month": ("start of month",)
+    }[bucket]
+    return type_coerce(func.date(column, *modifiers), Date)
+
+def get_range_stats(db: Session, user_id: int, start_date: date = None, end_date: date = None, bucket: str = "day"):
+    return stats_cache.get_or_compute(
+        user_id, get_stats_version(db, user_id), "range_stats", (start_date, end_date, bucket),
+        lambda: _compute_range_stats(db, user_id, start_date, end_date, bucket),
+        schema=schemas.RangeStats
+    )
+
+def _compute_range_stats(db: Session, user_id: int, start_date: date = None, end_date: date = None, bucket: str = "day"):
+    # Открытые границы диапазона берутся из дневной сводки, чтобы запрос
+    # к drinks всегда был ограничен по created_at и затрагивал только нужные партиции
+    if start_date is None or end_date is None:
+        first_day, last_day = db.query(
+            func.min(models.UserDailyStats.day),
+            func.max(models.UserDailyStats.day)
+        ).filter(models.UserDailyStats.user_id == user_id).one()
+        start_date = start_date or first_day
+        end_date = end_date or last_day
+    if start_date is None or end_date is None or start_date > end_date:
+        return {
+            "total_drinks": 0,
+            "total_volume": 0.0,
+            "total_alcohol": 0.0,
+            "total_spent": 0.0,
+            "drinks_by_type": {},
+            "bucket": bucket,
+            "daily_stats": []
+        }
+
+    filters = [
+        models.Drink.user_id == user_id,
+        models.Drink.created_at >= datetime.combine(start_date, time.min),
+        models.Drink.created_at < datetime.combine(end_date + timedelta(days=1), time.min)
+    ]
+
+    alcohol = models.Drink.volume * models.Drink.alcohol_content / 100
+    total_drinks, total_volume, total_alcohol, total_spent = db.query(
+        func.count(models.Drink.id),
+        func.coalesce(func.sum(models.Drink.volume), 0.0),
+        func.coalesce(func.sum(alcohol), 0.0),
+        func.coalesce(func.sum(models.Drink.price), 0.0)
+    ).filter(*filters).one()
+
+    drinks_by_type = db.query(
+        models.Drink.drink_type,
+        func.count(models.Drink.id)
+    ).filter(*filters).group_by(models.Drink.drink_type).all()
+
+    period = _bucket_expression(db, models.Drink.created_at, bucket).label("period")
+    series = db.query(
+        period,
+        func.count(models.Drink.id),
+        func.sum(models.Drink.volume),
+        func.sum(alcohol),
+        func.coalesce(func.sum(models.Drink.price), 0.0)
+    ).filter(*filters).group_by(period).order_by(period).all()
+
+    return {
+        "total_drinks": total_drinks,
+        "total_volume": float(total_volume),
+        "total_alcohol": float(total_alcohol),
+        "total_spent": float(total_spent),
+        "drinks_by_type": dict(drinks_by_type),
+        "bucket": bucket,
+        "daily_stats": [
+            {"date": day, "count": count, "volume": volume, "alcohol": alcohol_sum, "spent": spent}
+            for day, count, volume, alcohol_sum, spent in series
+        ]
+    }
@@ -1,16 +1,301 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from contextlib import asynccontextmanager
+import itertools
+import logging
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./alcocontrol.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
-)
+# Настройки пула соединений (для SQLite не применяются)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+# Реплики для чтения (через запятую). Асинхронные URL получаются так же, как для основной базы
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Сколько секунд после записи пользователя его чтения идут в основную базу
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+# На сколько секунд недоступная реплика исключается из ротации
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+# Таймаут подключения к реплике, чтобы недоступная реплика не задерживала запрос
+REPLICA_CONNECT_TIMEOUT = float(os.getenv("REPLICA_CONNECT_TIMEOUT", "2"))
+
+logger = logging.getLogger(__name__)
+
+def get_async_url(url: str):
+    """Перевод синхронного URL на асинхронный драйвер (asyncpg / aiosqlite)"""
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url.split("://", 1)[1]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", get_async_url(SQLALCHEMY_DATABASE_URL))
+
+class PoolMetricsMixin:
+    """Счетчики ожидания соединения из пула: число выдач, время ожидания, таймауты"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._metrics_lock:
+                self.checkouts += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+
+    def metrics(self):
+        with self._metrics_lock:
+            return {
+                "size": self.size(),
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": self.overflow(),
+                "max_overflow": self._max_overflow,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_avg": self.wait_time_total / self.checkouts if self.checkouts else 0.0,
+                "wait_time_max": self.wait_time_max
+            }
+
+class InstrumentedQueuePool(PoolMetricsMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(PoolMetricsMixin, AsyncAdaptedQueuePool):
+    pass
+
+def get_engine_options(url: str, is_async: bool = False, connect_timeout: float = None):
+    if url.startswith("sqlite"):
+        return {} if is_async else {"connect_args": {"check_same_thread": False}}
+
+    connect_args = {}
+    if connect_timeout and url.startswith("postgresql"):
+        connect_args["timeout" if is_async else "connect_timeout"] = connect_timeout
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        if is_async:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": connect_args
+    }
+
+def get_pool_status(db_engine):
+    pool = db_engine.pool
+    if isinstance(pool, PoolMetricsMixin):
+        return pool.metrics()
+    return {"pool": type(pool).__name__, "status": pool.status()}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **get_engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base() 
\ No newline at end of file
+# Асинхронный движок для обработчиков FastAPI и Telegram бота
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **get_engine_options(ASYNC_DATABASE_URL, is_async=True))
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+Base = declarative_base()
+
+class ReplicaRouter:
+    """Сессии для чтения: реплики по кругу, основная база при сбое реплик.
+
+    Пользователь должен видеть свои изменения несмотря на отставание реплик.
+    Записи этого процесса отмечаются при коммите (см. mark_written), и чтения
+    пользователя REPLICA_STICKY_SECONDS идут сразу в основную базу. Записи других
+    процессов видны по users.stats_version, которую crud увеличивает при каждой
+    записи данных пользователя: реплика используется, только если ее версия не
+    меньше версии в основной базе (два чтения строки по первичному ключу).
+    """
+
+    def __init__(
+        self,
+        urls,
+        primary_factory,
+        sticky_seconds: float = REPLICA_STICKY_SECONDS,
+        retry_seconds: float = REPLICA_RETRY_SECONDS,
+        clock=time.monotonic
+    ):
+        self.urls = list(urls)
+        self.engines = []
+        self.factories = []
+        for url in self.urls:
+            async_url = get_async_url(url)
+            replica_engine = create_async_engine(
+                async_url, **get_engine_options(async_url, is_async=True, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+            )
+            self.engines.append(replica_engine)
+            self.factories.append(async_sessionmaker(
+                replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+            ))
+        self.primary_factory = primary_factory
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self.clock = clock
+        self._next = itertools.count()
+        self._down_until = [0.0] * len(self.urls)
+        self._writes = {}
+        self._lock = threading.Lock()
+        self.reads = {"replica": 0, "primary": 0, "sticky": 0, "lagging": 0, "fallback": 0}
+
+    def note_write(self, user_ids):
+        if not self.engines:
+            return
+        now = self.clock()
+        with self._lock:
+            for user_id in user_ids:
+                self._writes[user_id] = now
+            if len(self._writes) > 10000:
+                self._writes = {
+                    user_id: at for user_id, at in self._writes.items() if now - at < self.sticky_seconds
+                }
+
+    def is_sticky(self, user_id):
+        if user_id is None:
+            return False
+        at = self._writes.get(user_id)
+        return at is not None and self.clock() - at < self.sticky_seconds
+
+    @staticmethod
+    async def _stats_version(db: AsyncSession, user_id: int):
+        # -1, если строки пользователя еще нет (на реплике — не доехала)
+        version = (await db.execute(
+            text("SELECT coalesce(stats_version, 0) FROM users WHERE id = :user_id"), {"user_id": user_id}
+        )).scalar()
+        return -1 if version is None else version
+
+    def mark_failed(self, index: int, error: Exception):
+        self._down_until[index] = self.clock() + self.retry_seconds
+        logger.warning(f"Replica {index} unavailable for {self.retry_seconds:g}s: {str(error)}")
+
+    def _candidates(self):
+        now = self.clock()
+        start = next(self._next)
+        order = [(start + i) % len(self.engines) for i in range(len(self.engines))]
+        return [i for i in order if self._down_until[i] <= now]
+
+    @asynccontextmanager
+    async def session(self, user_id: int = None):
+        """Сессия только для чтения; user_id включает возврат в основную базу после записи"""
+        if self.engines:
+            if self.is_sticky(user_id):
+                self.reads["sticky"] += 1
+            else:
+                version = None
+                if user_id is not None:
+                    async with self.primary_factory() as primary:
+                        version = await self._stats_version(primary, user_id)
+                for index in self._candidates():
+                    db = self.factories[index]()
+                    try:
+                        # Соединение берется сразу, чтобы недоступная реплика сменилась до запроса.
+                        # Ошибки подключения asyncpg не оборачиваются в DBAPIError
+                        await db.connection()
+                        lagging = version is not None and await self._stats_version(db, user_id) < version
+                    except Exception as e:
+                        await db.close()
+                        self.mark_failed(index, e)
+                        continue
+                    if lagging:
+                        # Реплика еще не получила запись пользователя из другого процесса
+                        await db.close()
+                        self.reads["lagging"] += 1
+                        continue
+                    self.reads["replica"] += 1
+                    try:
+                        yield db
+                    except exc.DBAPIError as e:
+                        if e.connection_invalidated:
+                            self.mark_failed(index, e)
+                        raise
+                    finally:
+                        await db.close()
+                    return
+                self.reads["fallback"] += 1
+        self.reads["primary"] += 1
+        async with self.primary_factory() as db:
+            yield db
+
+    def status(self):
+        now = self.clock()
+        return {
+            "reads": dict(self.reads),
+            "replicas": [
+                {
+                    "healthy": self._down_until[i] <= now,
+                    "pool": get_pool_status(replica_engine.sync_engine)
+                }
+                for i, replica_engine in enumerate(self.engines)
+            ]
+        }
+
+def mark_written(db: Session, user_ids):
+    """Отметить пользователей, чьи данные меняет транзакция (для записей через Core)"""
+    db.info.setdefault("written_users", set()).update(user_ids)
+
+def upsert(db: Session, table):
+    """INSERT с ON CONFLICT для диалекта сессии (PostgreSQL или SQLite).
+
+    Нужен там, где строку может впервые создать параллельная транзакция:
+    SELECT ... FOR UPDATE отсутствующую строку не блокирует.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
+
+@event.listens_for(Session, "after_flush")
+def _collect_written_users(session, flush_context):
+    # ORM-записи отмечаются автоматически по атрибуту user_id (для самих пользователей — по id)
+    users = set()
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        user_id = obj.id if getattr(obj, "__tablename__", None) == "users" else getattr(obj, "user_id", None)
+        if user_id is not None:
+            users.add(user_id)
+    if users:
+        mark_written(session, users)
+
+@event.listens_for(Session, "after_commit")
+def _note_written_users(session):
+    users = session.info.pop("written_users", None)
+    if users:
+        replicas.note_write(users)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_written_users(session):
+    session.info.pop("written_users", None)
+
+replicas = ReplicaRouter(DATABASE_REPLICA_URLS, AsyncSessionLocal)
+read_session = replicas.session
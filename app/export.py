@@ -0,0 +1,95 @@
+"""Потоковая выгрузка истории пользователя в CSV или NDJSON.
+
+Строки читаются курсором на стороне сервера (stream + yield_per) и сразу
+отдаются клиенту пачками, поэтому память не зависит от объема истории.
+Чтение идет с реплики, если она настроена (DATABASE_REPLICA_URLS).
+"""
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from . import models
+from .database import read_session
+
+# Сколько строк читается из курсора и сериализуется за один раз
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Тип записи -> колонки выгрузки и порядок
+EXPORT_SOURCES = (
+    ("drink", (
+        models.Drink.id,
+        models.Drink.drink_type,
+        models.Drink.volume,
+        models.Drink.alcohol_content,
+        models.Drink.price,
+        models.Drink.location,
+        models.Drink.mood,
+        models.Drink.comment,
+        models.Drink.created_at
+    ), (models.Drink.created_at, models.Drink.id), models.Drink.user_id),
+    ("sober_period", (
+        models.SoberPeriod.id,
+        models.SoberPeriod.start_time,
+        models.SoberPeriod.end_time,
+        models.SoberPeriod.is_active
+    ), (models.SoberPeriod.start_time, models.SoberPeriod.id), models.SoberPeriod.user_id),
+    ("goal", (
+        models.Goal.id,
+        models.Goal.type.label("goal_type"),
+        models.Goal.target_value,
+        models.Goal.period,
+        models.Goal.start_date,
+        models.Goal.end_date,
+        models.Goal.is_active
+    ), (models.Goal.start_date, models.Goal.id), models.Goal.user_id),
+)
+
+# Колонки CSV: объединение полей всех типов записей
+CSV_COLUMNS = ["record_type"] + list(dict.fromkeys(
+    column.key for _, columns, _, _ in EXPORT_SOURCES for column in columns
+))
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+async def stream_user_records(user_id: int, batch_size: int = EXPORT_BATCH_SIZE):
+    """Пачки (тип записи, строки) по всем данным пользователя"""
+    async with read_session(user_id) as db:
+        for record_type, columns, order_by, user_column in EXPORT_SOURCES:
+            result = await db.stream(
+                select(*columns).where(user_column == user_id).order_by(*order_by)
+                .execution_options(yield_per=batch_size)
+            )
+            async for rows in result.mappings().partitions():
+                yield record_type, rows
+
+async def export_csv(user_id: int):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    # Заголовок уходит сразу, до первого запроса к базе
+    writer.writeheader()
+    yield buffer.getvalue()
+    async for record_type, rows in stream_user_records(user_id):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            writer.writerow({"record_type": record_type, **{key: _value(value) for key, value in row.items()}})
+        yield buffer.getvalue()
+
+async def export_ndjson(user_id: int):
+    async for record_type, rows in stream_user_records(user_id):
+        yield "".join(
+            json.dumps({"type": record_type, **{key: _value(value) for key, value in row.items()}},
+                       ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+EXPORTERS = {"csv": export_csv, "ndjson": export_ndjson}
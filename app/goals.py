@@ -0,0 +1,250 @@
+"""Оценка прогресса целей.
+
+Прогресс всех активных целей считается несколькими запросами на множествах:
+один запрос по напиткам для лимитов, один по периодам трезвости и выборка самих
+целей. Результаты хранятся в goal_progress, откуда их читают бот и API.
+Периодический запуск: python -m app.goals, для одного пользователя --user-id.
+"""
+import argparse
+import logging
+from datetime import datetime, time, timedelta
+from typing import List
+
+from sqlalchemy import case, func, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .database import SessionLocal, engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PERIODS = ("daily", "weekly", "monthly")
+LIMIT_TYPES = ("drinks_limit", "spending_limit")
+GOAL_TYPES = ("sober_days",) + LIMIT_TYPES
+
+def period_window(period: str, now: datetime):
+    """Границы текущего календарного периода [начало, конец)"""
+    day_start = datetime.combine(now.date(), time.min)
+    if period == "daily":
+        return day_start, day_start + timedelta(days=1)
+    if period == "weekly":
+        start = day_start - timedelta(days=now.weekday())
+        return start, start + timedelta(days=7)
+    if period == "monthly":
+        start = day_start.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        return start, end
+    raise ValueError(f"Unknown goal period: {period}")
+
+def _active_goal_filters(now: datetime, user_id: int = None):
+    filters = [
+        models.Goal.is_active == True,
+        models.Goal.start_date <= now,
+        or_(models.Goal.end_date == None, models.Goal.end_date > now),
+        models.Goal.type.in_(GOAL_TYPES),
+        models.Goal.period.in_(PERIODS)
+    ]
+    if user_id is not None:
+        filters.append(models.Goal.user_id == user_id)
+    return filters
+
+def _goal_window(windows, period: str, start_date: datetime, end_date: datetime):
+    # Период цели ограничен датами ее начала и окончания
+    period_start, period_end = windows[period]
+    return max(period_start, start_date), min(period_end, end_date or period_end)
+
+def _limit_totals(db: Session, filters, windows):
+    # Границы окна зависят от периода цели; постоянные границы по created_at
+    # позволяют PostgreSQL отсечь лишние партиции drinks
+    window_start = case(
+        {period: bounds[0] for period, bounds in windows.items()}, value=models.Goal.period
+    )
+    window_end = case(
+        {period: bounds[1] for period, bounds in windows.items()}, value=models.Goal.period
+    )
+    rows = db.query(
+        models.Goal.id,
+        func.count(models.Drink.id),
+        func.coalesce(func.sum(models.Drink.price), 0.0)
+    ).join(
+        models.Drink, models.Drink.user_id == models.Goal.user_id
+    ).filter(
+        *filters,
+        models.Goal.type.in_(LIMIT_TYPES),
+        models.Drink.created_at >= min(start for start, _ in windows.values()),
+        models.Drink.created_at < max(end for _, end in windows.values()),
+        models.Drink.created_at >= window_start,
+        models.Drink.created_at < window_end,
+        models.Drink.created_at >= models.Goal.start_date,
+        or_(models.Goal.end_date == None, models.Drink.created_at < models.Goal.end_date)
+    ).group_by(models.Goal.id).all()
+    return {goal_id: (count, float(spent)) for goal_id, count, spent in rows}
+
+def _sober_seconds(db: Session, filters, goals, windows, now: datetime):
+    # Периоды трезвости, пересекающиеся с самым ранним из окон
+    rows = db.query(
+        models.Goal.id,
+        models.SoberPeriod.start_time,
+        models.SoberPeriod.end_time
+    ).join(
+        models.SoberPeriod, models.SoberPeriod.user_id == models.Goal.user_id
+    ).filter(
+        *filters,
+        models.Goal.type == "sober_days",
+        models.SoberPeriod.start_time < now,
+        or_(
+            models.SoberPeriod.end_time == None,
+            models.SoberPeriod.end_time > min(start for start, _ in windows.values())
+        )
+    ).all()
+
+    intervals = {}
+    for goal_id, start_time, end_time in rows:
+        goal = goals[goal_id]
+        window_start, window_end = _goal_window(windows, goal.period, goal.start_date, goal.end_date)
+        start, end = max(start_time, window_start), min(end_time or now, window_end, now)
+        if end > start:
+            intervals.setdefault(goal_id, []).append((start, end))
+
+    # Периоды одного пользователя могут пересекаться (например, два активных),
+    # поэтому время считается по их объединению
+    seconds = {}
+    for goal_id, goal_intervals in intervals.items():
+        total, covered_until = timedelta(0), None
+        for start, end in sorted(goal_intervals):
+            if covered_until is not None:
+                start = max(start, covered_until)
+            if end > start:
+                total += end - start
+                covered_until = end
+        seconds[goal_id] = total.total_seconds()
+    return seconds
+
+def evaluate_goals(db: Session, user_id: int = None, now: datetime = None):
+    """Пересчет goal_progress для всех активных целей или целей одного пользователя"""
+    now = now or datetime.utcnow()
+    windows = {period: period_window(period, now) for period in PERIODS}
+    filters = _active_goal_filters(now, user_id)
+
+    goals = {
+        goal.id: goal
+        for goal in db.query(
+            models.Goal.id,
+            models.Goal.user_id,
+            models.Goal.type,
+            models.Goal.period,
+            models.Goal.target_value,
+            models.Goal.start_date,
+            models.Goal.end_date,
+            models.User.stats_version
+        ).join(models.User, models.User.id == models.Goal.user_id).filter(*filters)
+    }
+    limits = _limit_totals(db, filters, windows)
+    sober = _sober_seconds(db, filters, goals, windows, now)
+
+    rows = []
+    for goal in goals.values():
+        period_start, period_end = _goal_window(windows, goal.period, goal.start_date, goal.end_date)
+        if goal.type == "sober_days":
+            current = float(int(sober.get(goal.id, 0.0) // 86400))
+            is_achieved = current >= goal.target_value
+        else:
+            count, spent = limits.get(goal.id, (0, 0.0))
+            current = float(count) if goal.type == "drinks_limit" else spent
+            is_achieved = current <= goal.target_value
+        rows.append({
+            "goal_id": goal.id,
+            "user_id": goal.user_id,
+            "period_start": period_start,
+            "period_end": period_end,
+            "current_value": current,
+            "progress": current / goal.target_value if goal.target_value else 0.0,
+            "is_achieved": is_achieved,
+            "stats_version": goal.stats_version,
+            "evaluated_at": now
+        })
+
+    # Строки неактивных целей удаляются вместе со старыми результатами
+    stale = db.query(models.GoalProgress)
+    if user_id is not None:
+        stale = stale.filter(models.GoalProgress.user_id == user_id)
+    stale.delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(models.GoalProgress), rows)
+    db.commit()
+    return len(rows)
+
+def _progress_rows(db: Session, user_id: int, now: datetime):
+    # populate_existing: после пересчета объекты в сессии не должны остаться прежними
+    return db.query(
+        models.Goal, models.GoalProgress, models.User.stats_version
+    ).join(
+        models.User, models.User.id == models.Goal.user_id
+    ).outerjoin(
+        models.GoalProgress, models.GoalProgress.goal_id == models.Goal.id
+    ).filter(*_active_goal_filters(now, user_id)).order_by(models.Goal.id).populate_existing().all()
+
+def get_goal_progress(db: Session, user_id: int, now: datetime = None, evaluate: bool = True) -> List[schemas.GoalProgress]:
+    """Сохраненный прогресс целей пользователя.
+
+    Пересчет для пользователя выполняется, только если результат устарел: цель
+    еще не оценивалась, данные изменились (users.stats_version) или наступил новый день.
+    С evaluate=False (чтение с реплики) вместо пересчета возвращается None.
+    """
+    now = now or datetime.utcnow()
+    rows = _progress_rows(db, user_id, now)
+    if any(
+        progress is None
+        or progress.stats_version != stats_version
+        or progress.evaluated_at.date() != now.date()
+        for _, progress, stats_version in rows
+    ):
+        if not evaluate:
+            return None
+        try:
+            evaluate_goals(db, user_id=user_id, now=now)
+        except IntegrityError:
+            # Параллельная оценка уже записала результат, он и читается
+            db.rollback()
+        rows = _progress_rows(db, user_id, now)
+
+    return [
+        schemas.GoalProgress(
+            goal_id=goal.id,
+            user_id=goal.user_id,
+            type=goal.type,
+            period=goal.period,
+            target_value=goal.target_value,
+            current_value=progress.current_value,
+            progress=progress.progress,
+            is_achieved=progress.is_achieved,
+            period_start=progress.period_start,
+            period_end=progress.period_end,
+            evaluated_at=progress.evaluated_at
+        )
+        for goal, progress, _ in rows
+        if progress is not None
+    ]
+
+def main():
+    """Периодическая оценка прогресса целей"""
+    parser = argparse.ArgumentParser(description="Evaluate progress of active goals")
+    parser.add_argument("--user-id", type=int, default=None, help="оценить цели только одного пользователя")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine, tables=[models.GoalProgress.__table__])
+    db = SessionLocal()
+    try:
+        rows = evaluate_goals(db, user_id=args.user_id)
+        logger.info(f"Evaluated {rows} goals")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error evaluating goals: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
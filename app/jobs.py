@@ -0,0 +1,120 @@
+"""Аренда роли бота и очередь заданий бота в базе.
+
+При нескольких воркерах API бот работает в одном процессе (app.bot_worker):
+роль получает держатель аренды в bot_leases и продлевает ее, пока жив. Процессы
+API ничего не передают боту напрямую, а кладут задания в bot_jobs: обновления
+Telegram из webhook и перепланирование напоминаний после смены настроек.
+
+Взятое задание скрывается до available_at и удаляется после выполнения; если
+воркер упал, задание снова становится доступным (доставка не реже одного раза).
+Повторное обновление с тем же update_id отбрасывается по dedupe_key.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import case, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+BOT_LEASE_NAME = "telegram_bot"
+# Время, на которое взятое задание скрыто от других воркеров
+BOT_JOB_LOCK_SECONDS = int(os.getenv("BOT_JOB_LOCK_SECONDS", "60"))
+BOT_JOB_MAX_ATTEMPTS = int(os.getenv("BOT_JOB_MAX_ATTEMPTS", "5"))
+
+def acquire_lease(db: Session, name: str, holder: str, ttl: timedelta, now: datetime = None) -> Optional[int]:
+    """Захват или продление аренды. Возвращает номер аренды или None, если она занята"""
+    now = now or datetime.utcnow()
+    lease = models.BotLease
+    # Одним UPDATE: продление своей аренды или захват истекшей; номер растет
+    # только при смене держателя (в SET используются старые значения колонок)
+    result = db.execute(
+        update(lease)
+        .where(lease.name == name, or_(lease.holder == holder, lease.expires_at < now))
+        .values(
+            token=case((lease.holder == holder, lease.token), else_=lease.token + 1),
+            holder=holder,
+            expires_at=now + ttl
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.add(models.BotLease(name=name, holder=holder, token=1, expires_at=now + ttl))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Аренда существует и занята другим процессом
+            db.rollback()
+            return None
+    else:
+        db.commit()
+    return db.query(lease.token).filter(lease.name == name, lease.holder == holder).scalar()
+
+def release_lease(db: Session, name: str, holder: str):
+    """Досрочное освобождение аренды при остановке, резерв забирает роль сразу"""
+    db.execute(
+        update(models.BotLease)
+        .where(models.BotLease.name == name, models.BotLease.holder == holder)
+        .values(expires_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+def enqueue_job(db: Session, kind: str, payload: dict, dedupe_key: str = None) -> Optional[int]:
+    """Добавление задания; повтор с тем же dedupe_key игнорируется (возвращает None)"""
+    job = models.BotJob(kind=kind, payload=payload, dedupe_key=dedupe_key, available_at=datetime.utcnow())
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    return job.id
+
+def claim_jobs(db: Session, worker: str, limit: int = 100, now: datetime = None) -> List[dict]:
+    """Взятие готовых заданий в порядке добавления.
+
+    В PostgreSQL строки блокируются с SKIP LOCKED, поэтому одновременные
+    воркеры не берут одно задание дважды.
+    """
+    now = now or datetime.utcnow()
+    jobs = db.query(models.BotJob).filter(
+        models.BotJob.failed_at.is_(None),
+        models.BotJob.available_at <= now
+    ).order_by(models.BotJob.id).limit(limit).with_for_update(skip_locked=True).all()
+    claimed = []
+    for job in jobs:
+        job.available_at = now + timedelta(seconds=BOT_JOB_LOCK_SECONDS)
+        job.attempts = (job.attempts or 0) + 1
+        job.locked_by = worker
+        claimed.append({"id": job.id, "kind": job.kind, "payload": job.payload, "attempts": job.attempts})
+    db.commit()
+    return claimed
+
+def complete_jobs(db: Session, job_ids: List[int]):
+    if job_ids:
+        db.query(models.BotJob).filter(models.BotJob.id.in_(job_ids)).delete(synchronize_session=False)
+        db.commit()
+
+def retry_job(db: Session, job_id: int, attempts: int, error: str, now: datetime = None):
+    """Отложить задание после ошибки; после BOT_JOB_MAX_ATTEMPTS попыток оно остается в таблице с failed_at"""
+    now = now or datetime.utcnow()
+    values = {"last_error": error[:1000], "locked_by": None}
+    if attempts >= BOT_JOB_MAX_ATTEMPTS:
+        values["failed_at"] = now
+    else:
+        values["available_at"] = now + timedelta(seconds=2 ** attempts)
+    db.query(models.BotJob).filter(models.BotJob.id == job_id).update(values, synchronize_session=False)
+    db.commit()
+
+def get_lease(db: Session, name: str):
+    return db.query(models.BotLease).filter(models.BotLease.name == name).first()
+
+def pending_jobs(db: Session):
+    """Число заданий в очереди по видам (без исчерпавших попытки)"""
+    rows = db.query(models.BotJob.kind, func.count()).filter(
+        models.BotJob.failed_at.is_(None)
+    ).group_by(models.BotJob.kind).all()
+    return dict(rows)
@@ -1,51 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from typing import List, Literal, Optional
+from contextlib import asynccontextmanager
 import os
-from dotenv import load_dotenv
+import json
 import logging
-from datetime import datetime, timedelta
-from fastapi.responses import JSONResponse
+from datetime import date, datetime, timedelta
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 
-from . import models, schemas, crud
-from .database import SessionLocal, engine
-from .telegram_bot import setup_bot
+from . import models, schemas, crud, async_crud, bac, export, jobs
+from .database import AsyncSessionLocal, async_engine, engine, get_pool_status, read_session, replicas
+from .metrics import PrometheusMiddleware, instrument_engine, render_metrics
+from .stats_cache import stats_cache
 
-# Загрузка переменных окружения
-load_dotenv()
+# Режим бота: polling - отдельный процесс (API работает без бота), webhook - внутри API,
+# worker - отдельный процесс app.bot_worker, API передает ему обновления через bot_jobs
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Создание таблиц при старте (для локальной разработки; в продакшене - alembic)
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "false").lower() in ("1", "true", "yes")
 
-# Создание таблиц
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="AlcoControl API")
-
-# Настройка CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # В продакшене заменить на конкретные домены
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Максимальный размер пакета для POST /drinks/batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50000"))
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+router = APIRouter()
+
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-# Инициализация бота
-bot = setup_bot()
+async def get_read_db(user_id: Optional[int] = None):
+    # Только чтение: реплика, если недавно не было записи этого пользователя
+    async with read_session(user_id) as db:
+        yield db
 
 # Обработчики ошибок
-@app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     logger.error(f"HTTP error occurred: {exc.detail}")
     return JSONResponse(
@@ -53,7 +48,6 @@ async def http_exception_handler(request, exc):
         content={"detail": exc.detail}
     )
 
-@app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     logger.error(f"Unexpected error occurred: {str(exc)}")
     return JSONResponse(
@@ -61,29 +55,56 @@ async def general_exception_handler(request, exc):
         content={"detail": "Internal server error"}
     )
 
-@app.get("/")
+@router.get("/")
 async def root():
     return {"message": "Welcome to AlcoControl API"}
 
-@app.post("/users/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+@router.get("/metrics")
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+@router.get("/internal/pool")
+async def pool_stats():
+    return {
+        "sync": get_pool_status(engine),
+        "async": get_pool_status(async_engine.sync_engine),
+        "read_routing": replicas.status()
+    }
+
+@router.get("/internal/bot")
+async def bot_status(db: AsyncSession = Depends(get_db)):
+    # Держатель аренды бота и задания в очереди bot_jobs
+    return await async_crud.get_bot_status(db, jobs.BOT_LEASE_NAME)
+
+@router.get("/internal/cache")
+async def cache_stats():
+    return {"users": crud.user_cache.stats(), "statistics": stats_cache.stats()}
+
+def page_response(items, next_cursor):
+    # Строки из базы уже имеют вид схемы ответа: response_model остается для
+    # документации, а построчная валидация pydantic и json.dumps пропускаются
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
+
+@router.post("/users/", response_model=schemas.User)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     try:
-        db_user = crud.get_user_by_telegram_id(db, telegram_id=user.telegram_id)
+        db_user = await async_crud.get_user_by_telegram_id(db, telegram_id=user.telegram_id)
         if db_user:
             raise HTTPException(status_code=400, detail="Telegram ID already registered")
-        return crud.create_user(db=db, user=user)
+        return await async_crud.create_user(db=db, user=user)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating user: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Could not create user"
         )
 
-@app.get("/users/{user_id}", response_model=schemas.User)
-def read_user(user_id: int, db: Session = Depends(get_db)):
+@router.get("/users/{user_id}", response_model=schemas.User)
+async def read_user(user_id: int, db: AsyncSession = Depends(get_db)):
     try:
-        db_user = crud.get_user(db, user_id=user_id)
+        db_user = await async_crud.get_user(db, user_id=user_id)
         if db_user is None:
             raise HTTPException(status_code=404, detail="User not found")
         return db_user
@@ -96,23 +117,152 @@ def read_user(user_id: int, db: Session = Depends(get_db)):
             detail="Could not read user"
         )
 
-@app.post("/drinks/", response_model=schemas.Drink)
-def create_drink(drink: schemas.DrinkCreate, db: Session = Depends(get_db)):
+@router.get("/users/{user_id}/export")
+async def export_user_data(
+    user_id: int,
+    format: Literal["csv", "ndjson"] = "csv",
+    db: AsyncSession = Depends(get_db)
+):
+    # Напитки, периоды трезвости и цели пользователя одним потоком
+    db_user = await async_crud.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return StreamingResponse(
+        export.EXPORTERS[format](user_id),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="alcocontrol_user{user_id}.{format}"'}
+    )
+
+@router.get("/settings", response_model=schemas.UserSettings)
+async def read_settings(user_id: int, db: AsyncSession = Depends(get_db)):
+    try:
+        db_settings = await async_crud.get_user_settings(db, user_id=user_id)
+    except Exception as e:
+        logger.error(f"Error reading settings: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not read settings"
+        )
+    # Для пользователя без сохраненных настроек возвращаются значения по умолчанию
+    if db_settings is None:
+        return schemas.UserSettings(user_id=user_id)
+    return db_settings
+
+@router.post("/settings", response_model=schemas.UserSettings)
+async def update_settings(
+    user_id: int,
+    settings: schemas.UserSettingsUpdate,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    db_user = await async_crud.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        db_settings = await async_crud.update_user_settings(db, user_id=user_id, settings=settings)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error updating settings: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not update settings"
+        )
+    # Планировщик бота в этом процессе перепланируется сразу, остальные
+    # процессы подхватят изменение по updated_at
+    bot = getattr(request.app.state, "bot", None)
+    scheduler = bot.bot_data.get("reminders") if bot is not None else None
+    if scheduler is not None:
+        scheduler.reschedule(
+            user_id, db_user.telegram_id, db_settings.notification_enabled, db_settings.notification_time
+        )
+    elif request.app.state.bot_mode == "worker":
+        # Воркер бота перепланирует напоминание через очередь, не дожидаясь проверки updated_at
+        try:
+            await async_crud.enqueue_job(db, "reschedule", {
+                "user_id": user_id,
+                "telegram_id": db_user.telegram_id,
+                "enabled": db_settings.notification_enabled,
+                "notification_time": (
+                    db_settings.notification_time.isoformat() if db_settings.notification_time else None
+                )
+            })
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error enqueueing reminder reschedule: {str(e)}")
+    return db_settings
+
+@router.post("/drinks/", response_model=schemas.Drink)
+async def create_drink(drink: schemas.DrinkCreate, db: AsyncSession = Depends(get_db)):
     try:
-        return crud.create_drink(db=db, drink=drink)
+        return await async_crud.create_drink(db=db, drink=drink)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating drink: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Could not create drink"
         )
 
-@app.get("/drinks/", response_model=List[schemas.Drink])
-def read_drinks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@router.post("/drinks/batch", response_model=schemas.DrinkBatchResult)
+async def create_drinks_batch(request: Request, db: AsyncSession = Depends(get_db)):
+    # Принимает JSON-массив или NDJSON (Content-Type: application/x-ndjson)
+    try:
+        body = await request.body()
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a list of drinks")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch is limited to {BATCH_MAX_ITEMS} drinks"
+        )
+
+    results = [schemas.DrinkBatchItemResult(index=i) for i in range(len(items))]
+    valid, valid_results = [], []
+    for result, item in zip(results, items):
+        try:
+            valid.append(schemas.DrinkImport.model_validate(item))
+            valid_results.append(result)
+        except ValidationError as e:
+            result.error = "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+
+    try:
+        ids = await async_crud.create_drinks_bulk(db, valid) if valid else []
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error creating drinks batch: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not create drinks"
+        )
+    for result, drink_id in zip(valid_results, ids):
+        if drink_id is None:
+            result.error = "User not found"
+        else:
+            result.id = drink_id
+
+    created = sum(1 for result in results if result.id is not None)
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+@router.get("/drinks/", response_model=schemas.DrinkPage)
+async def read_drinks(
+    user_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db)
+):
     try:
-        drinks = crud.get_drinks(db, skip=skip, limit=limit)
-        return drinks
+        drinks, next_cursor = await async_crud.get_drink_rows(db, user_id=user_id, cursor=cursor, limit=limit)
+        return page_response(drinks, next_cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Error reading drinks: {str(e)}")
         raise HTTPException(
@@ -120,23 +270,30 @@ def read_drinks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
             detail="Could not read drinks"
         )
 
-@app.post("/sober-periods/", response_model=schemas.SoberPeriod)
-def create_sober_period(period: schemas.SoberPeriodCreate, db: Session = Depends(get_db)):
+@router.post("/sober-periods/", response_model=schemas.SoberPeriod)
+async def create_sober_period(period: schemas.SoberPeriodCreate, db: AsyncSession = Depends(get_db)):
     try:
-        return crud.create_sober_period(db=db, period=period)
+        return await async_crud.create_sober_period(db=db, period=period)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating sober period: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Could not create sober period"
         )
 
-@app.get("/sober-periods/", response_model=List[schemas.SoberPeriod])
-def read_sober_periods(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@router.get("/sober-periods/", response_model=schemas.SoberPeriodPage)
+async def read_sober_periods(
+    user_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db)
+):
     try:
-        periods = crud.get_sober_periods(db, skip=skip, limit=limit)
-        return periods
+        periods, next_cursor = await async_crud.get_sober_period_rows(db, user_id=user_id, cursor=cursor, limit=limit)
+        return page_response(periods, next_cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Error reading sober periods: {str(e)}")
         raise HTTPException(
@@ -144,23 +301,30 @@ def read_sober_periods(skip: int = 0, limit: int = 100, db: Session = Depends(ge
             detail="Could not read sober periods"
         )
 
-@app.post("/goals/", response_model=schemas.Goal)
-def create_goal(goal: schemas.GoalCreate, db: Session = Depends(get_db)):
+@router.post("/goals/", response_model=schemas.Goal)
+async def create_goal(goal: schemas.GoalCreate, db: AsyncSession = Depends(get_db)):
     try:
-        return crud.create_goal(db=db, goal=goal)
+        return await async_crud.create_goal(db=db, goal=goal)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating goal: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Could not create goal"
         )
 
-@app.get("/goals/", response_model=List[schemas.Goal])
-def read_goals(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@router.get("/goals/", response_model=schemas.GoalPage)
+async def read_goals(
+    user_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db)
+):
     try:
-        goals = crud.get_goals(db, skip=skip, limit=limit)
-        return goals
+        goals, next_cursor = await async_crud.get_goal_rows(db, user_id=user_id, cursor=cursor, limit=limit)
+        return page_response(goals, next_cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Error reading goals: {str(e)}")
         raise HTTPException(
@@ -168,36 +332,209 @@ def read_goals(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
             detail="Could not read goals"
         )
 
-@app.get("/statistics/")
-def get_statistics(user_id: int, db: Session = Depends(get_db)):
-    try:
-        # Получаем все напитки пользователя
-        drinks = db.query(models.Drink).filter(models.Drink.user_id == user_id).all()
-        
-        # Считаем общее количество алкоголя
-        total_alcohol = sum(drink.volume * drink.alcohol_content / 100 for drink in drinks)
-        
-        # Считаем количество дней с употреблением
-        days_with_drinks = len(set(drink.created_at.date() for drink in drinks))
-        
-        # Получаем текущий период трезвости
-        current_period = db.query(models.SoberPeriod).filter(
-            models.SoberPeriod.user_id == user_id,
-            models.SoberPeriod.end_date == None
-        ).first()
-        
-        sober_days = 0
-        if current_period:
-            sober_days = (datetime.now() - current_period.start_date).days
-        
-        return {
-            "total_alcohol": total_alcohol,
-            "days_with_drinks": days_with_drinks,
-            "sober_days": sober_days
-        }
+@router.get("/goals/progress", response_model=List[schemas.GoalProgress])
+async def read_goal_progress(user_id: int):
+    try:
+        return await async_crud.read_goal_progress(user_id)
+    except Exception as e:
+        logger.error(f"Error reading goal progress: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not read goal progress"
+        )
+
+@router.post("/goals/evaluate")
+async def evaluate_goals(user_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    try:
+        evaluated = await async_crud.evaluate_goals(db, user_id=user_id)
+        return {"evaluated": evaluated}
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error evaluating goals: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not evaluate goals"
+        )
+
+@router.get("/bac", response_model=schemas.BacTimeline)
+async def read_bac_timeline(
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    step_minutes: int = Query(5, ge=1, le=1440),
+    db: AsyncSession = Depends(get_read_db)
+):
+    try:
+        # Время с часовым поясом сравнивается с naive UTC из базы, поэтому приводится к нему.
+        # По умолчанию последние сутки
+        end = schemas.to_naive_utc(end) or datetime.utcnow()
+        start = schemas.to_naive_utc(start) or end - timedelta(days=1)
+        step = timedelta(minutes=step_minutes)
+        if start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        if (end - start) / step > bac.BAC_MAX_POINTS:
+            raise HTTPException(status_code=400, detail="Too many points, increase step_minutes")
+        if not await async_crud.get_user(db, user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+        timeline = await async_crud.get_bac_timeline(db, user_id, start, end, step)
+        return ORJSONResponse(timeline)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing BAC timeline: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not compute BAC timeline"
+        )
+
+@router.get("/percentiles", response_model=schemas.PercentileComparison)
+async def read_percentiles(
+    user_id: int,
+    period: Literal["weekly", "monthly"] = "weekly",
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Сравнение с другими пользователями по скетчам, без просмотра их напитков
+    if not await async_crud.get_user(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        return await async_crud.get_user_percentiles(db, user_id, period)
+    except Exception as e:
+        logger.error(f"Error reading percentiles: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not read percentiles"
+        )
+
+@router.get("/statistics/")
+async def get_statistics(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    try:
+        return await async_crud.get_user_statistics(db, user_id=user_id)
     except Exception as e:
         logger.error(f"Error getting statistics: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Could not get statistics"
-        ) 
\ No newline at end of file
+        )
+
+@router.get("/stats", response_model=schemas.RangeStats)
+async def get_range_stats(
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    bucket: Literal["day", "week", "month"] = "day",
+    db: AsyncSession = Depends(get_read_db)
+):
+    try:
+        return await async_crud.get_range_stats(
+            db, user_id=user_id, start_date=start_date, end_date=end_date, bucket=bucket
+        )
+    except Exception as e:
+        logger.error(f"Error getting range statistics: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not get statistics"
+        )
+
+
+async def telegram_webhook(request: Request):
+    # Модуль бота импортируется только в режиме webhook
+    from .telegram_bot import TELEGRAM_WEBHOOK_SECRET, feed_update
+
+    bot = request.app.state.bot
+    if bot is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Bot is not running")
+    # Telegram передает секрет, указанный в set_webhook, в этом заголовке
+    if TELEGRAM_WEBHOOK_SECRET and request.headers.get(
+        "X-Telegram-Bot-Api-Secret-Token"
+    ) != TELEGRAM_WEBHOOK_SECRET:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid secret token")
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid update payload")
+    await feed_update(bot, data)
+    return {"ok": True}
+
+async def enqueue_telegram_update(request: Request, db: AsyncSession = Depends(get_db)):
+    # Режим worker: обновление сохраняется в bot_jobs до ответа Telegram, поэтому
+    # не теряется при перезапуске; повтор доставки отбрасывается по update_id
+    from .telegram_bot import TELEGRAM_WEBHOOK_SECRET
+
+    if TELEGRAM_WEBHOOK_SECRET and request.headers.get(
+        "X-Telegram-Bot-Api-Secret-Token"
+    ) != TELEGRAM_WEBHOOK_SECRET:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid secret token")
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid update payload")
+    if not isinstance(data, dict) or not isinstance(data.get("update_id"), int):
+        raise HTTPException(status_code=400, detail="Invalid update payload")
+    try:
+        await async_crud.enqueue_job(db, "update", data, dedupe_key=f"update:{data['update_id']}")
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error enqueueing update: {str(e)}")
+        # Telegram повторит доставку после ошибки
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Could not enqueue update")
+    return {"ok": True}
+
+def create_app(bot_mode: str = None, create_schema: bool = None) -> FastAPI:
+    """Фабрика приложения. Импорт модуля не подключается к базе и не создает бота"""
+    bot_mode = bot_mode or BOT_MODE
+    create_schema = DB_CREATE_SCHEMA if create_schema is None else create_schema
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if create_schema:
+            models.Base.metadata.create_all(bind=engine)
+
+        app.state.bot = None
+        app.state.bot_mode = bot_mode
+        if bot_mode == "webhook":
+            from .telegram_bot import setup_bot, start_webhook
+
+            try:
+                bot = setup_bot(webhook=True)
+                await start_webhook(bot)
+                app.state.bot = bot
+            except Exception as e:
+                # API продолжает работать, webhook отвечает 503
+                logger.error(f"Error starting bot: {str(e)}")
+        try:
+            yield
+        finally:
+            if app.state.bot is not None:
+                from .telegram_bot import stop_webhook
+
+                await stop_webhook(app.state.bot)
+
+    app = FastAPI(title="AlcoControl API", lifespan=lifespan)
+
+    # Метрики Prometheus
+    app.add_middleware(PrometheusMiddleware)
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    for replica_engine in replicas.engines:
+        instrument_engine(replica_engine.sync_engine)
+
+    # Настройка CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # В продакшене заменить на конкретные домены
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.add_exception_handler(HTTPException, http_exception_handler)
+    app.add_exception_handler(Exception, general_exception_handler)
+
+    app.include_router(router)
+    if bot_mode == "webhook":
+        app.add_api_route("/telegram/webhook", telegram_webhook, methods=["POST"])
+    elif bot_mode == "worker":
+        app.add_api_route("/telegram/webhook", enqueue_telegram_update, methods=["POST"])
+    return app
+
+app = create_app()
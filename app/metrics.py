@@ -0,0 +1,203 @@
+"""Метрики Prometheus: задержки HTTP по шаблону маршрута, SQL на запрос, обработчики бота.
+
+При нескольких воркерах uvicorn задайте PROMETHEUS_MULTIPROC_DIR, тогда /metrics
+собирает значения всех процессов.
+"""
+from contextvars import ContextVar
+import functools
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from starlette.routing import Match
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"]
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being processed",
+    ["method", "route"],
+    multiprocess_mode="livesum"
+)
+DB_STATEMENTS = Counter(
+    "db_statements_total",
+    "SQL statements executed",
+    ["context"]
+)
+DB_TIME = Counter(
+    "db_time_seconds_total",
+    "Time spent executing SQL statements",
+    ["context"]
+)
+DB_STATEMENTS_PER_UNIT = Histogram(
+    "db_statements_per_unit",
+    "SQL statements per HTTP request or bot update",
+    ["context"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float("inf"))
+)
+DB_TIME_PER_UNIT = Histogram(
+    "db_time_per_unit_seconds",
+    "SQL time per HTTP request or bot update",
+    ["context"]
+)
+BOT_HANDLER_DURATION = Histogram(
+    "bot_handler_duration_seconds",
+    "Telegram bot handler latency",
+    ["handler", "status"]
+)
+BOT_OUTBOUND_SENT = Counter(
+    "bot_outbound_messages_total",
+    "Bot API requests sent through the outbound queue",
+    ["priority", "status"]
+)
+BOT_OUTBOUND_BACKLOG = Gauge(
+    "bot_outbound_backlog",
+    "Bot API requests waiting in the outbound queue",
+    ["priority"],
+    multiprocess_mode="livesum"
+)
+BOT_OUTBOUND_WAIT = Histogram(
+    "bot_outbound_wait_seconds",
+    "Time a request spent in the outbound queue before sending",
+    ["priority"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 300, float("inf"))
+)
+REMINDERS_SENT = Counter(
+    "bot_reminders_sent_total",
+    "Reminders delivered by the scheduler",
+    ["status"]
+)
+REMINDERS_SCHEDULED = Gauge(
+    "bot_reminders_scheduled",
+    "Reminders loaded into the scheduler heap",
+    multiprocess_mode="livesum"
+)
+
+BOT_JOBS = Counter(
+    "bot_jobs_total",
+    "Jobs from the bot_jobs queue processed by the bot worker",
+    ["kind", "status"]
+)
+BOT_LEASE_HELD = Gauge(
+    "bot_lease_held",
+    "1 if this process holds the bot lease",
+    multiprocess_mode="livesum"
+)
+
+class DBUsage:
+    __slots__ = ("statements", "time")
+
+    def __init__(self):
+        self.statements = 0
+        self.time = 0.0
+
+# Счетчики SQL текущего HTTP-запроса или обновления бота
+_db_usage = ContextVar("db_usage", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    usage = _db_usage.get()
+    if usage is not None:
+        usage.statements += 1
+        usage.time += elapsed
+
+def instrument_engine(engine):
+    """Подсчет SQL-запросов и времени в базе через события движка SQLAlchemy"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def _observe_db_usage(context: str, usage: DBUsage):
+    DB_STATEMENTS.labels(context).inc(usage.statements)
+    DB_TIME.labels(context).inc(usage.time)
+    DB_STATEMENTS_PER_UNIT.labels(context).observe(usage.statements)
+    DB_TIME_PER_UNIT.labels(context).observe(usage.time)
+
+def _match_route(scope):
+    # Шаблон маршрута ("/users/{user_id}") вместо пути, чтобы не плодить метки
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+class PrometheusMiddleware:
+    """ASGI middleware: задержка, запросы в работе и SQL по шаблону маршрута"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        usage = DBUsage()
+        token = _db_usage.set(usage)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        route_path = _match_route(scope)
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route_path)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            _db_usage.reset(token)
+            HTTP_REQUEST_DURATION.labels(method, route_path, str(status_code)).observe(elapsed)
+            _observe_db_usage(f"{method} {route_path}", usage)
+
+def track_bot_handler(name: str):
+    """Декоратор для обработчиков бота: длительность и SQL на обновление"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            usage = DBUsage()
+            token = _db_usage.set(usage)
+            status = "ok"
+            start = time.perf_counter()
+            try:
+                return await handler(update, context)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                BOT_HANDLER_DURATION.labels(name, status).observe(time.perf_counter() - start)
+                _db_usage.reset(token)
+                _observe_db_usage(f"bot {name}", usage)
+        return wrapper
+    return decorator
+
+def render_metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
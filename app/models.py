@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Time, ForeignKey, Boolean, JSON, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -15,6 +15,8 @@ class User(Base):
     last_name = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     settings = Column(JSON, default={})
+    # Увеличивается при каждой записи, влияющей на статистику (ключ кэша)
+    stats_version = Column(Integer, default=0, nullable=False)
     
     drinks = relationship("Drink", back_populates="user")
     sober_periods = relationship("SoberPeriod", back_populates="user")
@@ -22,6 +24,7 @@ class User(Base):
 
 class Drink(Base):
     __tablename__ = "drinks"
+    __table_args__ = (Index("idx_drinks_user_date", "user_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -36,8 +39,20 @@ class Drink(Base):
     
     user = relationship("User", back_populates="drinks")
 
+    # В PostgreSQL первичный ключ партиционированной таблицы (id, created_at),
+    # поэтому ORM перечитывает строку по обоим полям и затрагивает одну партицию
+    __mapper_args__ = {"primary_key": [id, created_at]}
+
 class SoberPeriod(Base):
     __tablename__ = "sober_periods"
+    __table_args__ = (
+        Index("idx_sober_periods_user_start", "user_id", "start_time"),
+        # Частичный индекс: активных периодов мало, поиск текущего не читает историю
+        Index(
+            "idx_sober_periods_active", "user_id", "start_time",
+            postgresql_where=text("is_active"), sqlite_where=text("is_active")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -49,6 +64,7 @@ class SoberPeriod(Base):
 
 class Goal(Base):
     __tablename__ = "goals"
+    __table_args__ = (Index("idx_goals_user_start", "user_id", "start_date"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -59,4 +75,99 @@ class Goal(Base):
     end_date = Column(DateTime, nullable=True)
     is_active = Column(Boolean, default=True)
     
-    user = relationship("User", back_populates="goals") 
\ No newline at end of file
+    user = relationship("User", back_populates="goals")
+
+class UserSettings(Base):
+    __tablename__ = "user_settings"
+    __table_args__ = (
+        # Планировщик напоминаний выбирает пользователей по окну notification_time
+        Index("idx_user_settings_notification", "notification_enabled", "notification_time", "user_id"),
+        # и подхватывает изменения настроек по updated_at
+        Index("idx_user_settings_updated", "updated_at"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    daily_limit = Column(Float, nullable=True)
+    notification_enabled = Column(Boolean, default=True)
+    notification_time = Column(Time, nullable=True)  # UTC
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UserDailyStats(Base):
+    __tablename__ = "user_daily_stats"
+
+    # Дневной агрегат по напиткам, обновляется в crud.create_drink
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    drinks_count = Column(Integer, default=0)
+    total_volume = Column(Float, default=0.0)  # в мл
+    total_alcohol = Column(Float, default=0.0)  # чистый алкоголь в мл
+    total_spent = Column(Float, default=0.0)
+    drinks_by_type = Column(JSON, default={})
+
+class UserStreak(Base):
+    __tablename__ = "user_streaks"
+
+    # Серия трезвости, обновляется в crud при записи напитков и периодов трезвости.
+    # Серия идет, пока есть активный период; напиток начинает ее заново
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    current_start = Column(DateTime, nullable=True)  # NULL — активного периода нет
+    longest_seconds = Column(Float, default=0.0)  # самая длинная завершенная серия
+    last_drink_at = Column(DateTime, nullable=True)
+
+class GoalProgress(Base):
+    __tablename__ = "goal_progress"
+
+    # Результат последней оценки цели, пересчитывается app.goals
+    goal_id = Column(Integer, ForeignKey("goals.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    period_start = Column(DateTime)
+    period_end = Column(DateTime)
+    current_value = Column(Float, default=0.0)  # дни трезвости, напитки или расходы за период
+    progress = Column(Float, default=0.0)  # current_value / target_value
+    is_achieved = Column(Boolean, default=False)
+    stats_version = Column(Integer, default=0)  # users.stats_version на момент оценки
+    evaluated_at = Column(DateTime, default=datetime.utcnow)
+
+class PopulationSketchBin(Base):
+    __tablename__ = "population_sketch_bins"
+
+    # Скетч распределения итогов пользователей за период (app.percentiles):
+    # число пользователей, чей итог попал в корзину bin, в части shard
+    metric = Column(String, primary_key=True)  # 'alcohol', 'spent'
+    period = Column(String, primary_key=True)  # 'weekly', 'monthly'
+    period_start = Column(Date, primary_key=True)
+    shard = Column(Integer, primary_key=True)  # user_id % PERCENTILE_SHARDS
+    bin = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0)
+
+class BotLease(Base):
+    __tablename__ = "bot_leases"
+
+    # Аренда роли бота: ее держатель опрашивает Telegram и выполняет задания bot_jobs
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)  # host:pid процесса
+    token = Column(Integer, default=1)  # растет при смене держателя
+    expires_at = Column(DateTime, nullable=False)
+
+class BotJob(Base):
+    __tablename__ = "bot_jobs"
+    __table_args__ = (
+        # Воркер бота выбирает готовые задания; отложенные после ошибок не мешают
+        Index(
+            "idx_bot_jobs_available", "available_at",
+            postgresql_where=text("failed_at IS NULL"), sqlite_where=text("failed_at IS NULL")
+        ),
+    )
+
+    # Задание для воркера бота от процессов API (app.jobs)
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # 'update', 'reschedule'
+    payload = Column(JSON, nullable=False)
+    dedupe_key = Column(String, unique=True, nullable=True)  # update_id обновления Telegram
+    created_at = Column(DateTime, default=datetime.utcnow)
+    available_at = Column(DateTime, default=datetime.utcnow)  # взятое задание скрыто до этого времени
+    attempts = Column(Integer, default=0)
+    locked_by = Column(String, nullable=True)
+    last_error = Column(String, nullable=True)
+    failed_at = Column(DateTime, nullable=True)  # попытки исчерпаны
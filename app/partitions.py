@@ -0,0 +1,97 @@
+import argparse
+import logging
+import os
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .database import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько будущих месяцев держать заранее созданными
+PARTITION_MONTHS_AHEAD = int(os.getenv("DRINKS_PARTITION_MONTHS_AHEAD", "3"))
+
+DEFAULT_PARTITION = "drinks_default"
+
+def month_start(value: date):
+    return date(value.year, value.month, 1)
+
+def add_months(value: date, months: int):
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date):
+    return f"drinks_y{month.year:04d}m{month.month:02d}"
+
+def is_partitioned(conn: Connection):
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('drinks')"
+    )).scalar() is not None
+
+def existing_partitions(conn: Connection):
+    return set(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('drinks')"
+    )).scalars())
+
+def create_month_partition(conn: Connection, month: date):
+    """Создание месячной партиции drinks.
+
+    Строки этого месяца, уже попавшие в партицию по умолчанию, переносятся
+    в новую партицию до ее подключения, иначе ATTACH завершится ошибкой.
+    CHECK родительской таблицы копируются в партицию: без них ATTACH тоже
+    не пройдет.
+    """
+    name = partition_name(month)
+    bounds = {"start": datetime.combine(month, datetime.min.time()),
+              "end": datetime.combine(add_months(month, 1), datetime.min.time())}
+    conn.execute(text(f"CREATE TABLE {name} (LIKE drinks INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE created_at >= :start AND created_at < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    conn.execute(text(
+        f"ALTER TABLE drinks ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start'].date()}') TO ('{bounds['end'].date()}')"
+    ))
+    return name
+
+def ensure_drink_partitions(conn: Connection, months_ahead: int = PARTITION_MONTHS_AHEAD, today: date = None):
+    """Создание недостающих партиций drinks от текущего месяца на months_ahead вперед"""
+    if not is_partitioned(conn):
+        return []
+    current = month_start(today or datetime.utcnow().date())
+    existing = existing_partitions(conn)
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if partition_name(month) not in existing:
+            created.append(create_month_partition(conn, month))
+    return created
+
+def main():
+    """Плановое создание партиций таблицы drinks на будущие месяцы"""
+    parser = argparse.ArgumentParser(description="Pre-create monthly partitions of the drinks table")
+    parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD,
+                        help="на сколько месяцев вперед создавать партиции")
+    args = parser.parse_args()
+
+    try:
+        with engine.begin() as conn:
+            if not is_partitioned(conn):
+                logger.warning("Table drinks is not partitioned, nothing to do")
+                return
+            created = ensure_drink_partitions(conn, months_ahead=args.months_ahead)
+        logger.info(f"Created {len(created)} drinks partitions: {', '.join(created) or '-'}")
+    except Exception as e:
+        logger.error(f"Error creating drinks partitions: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""Сравнение с другими пользователями: перцентиль потребления за неделю и месяц.
+
+Для каждой метрики (чистый алкоголь, расходы) и календарного периода хранится
+скетч распределения итогов пользователей, отмечавших напитки в этом периоде:
+счетчики по логарифмическим корзинам, как в DDSketch. Значение v попадает в
+корзину ceil(log_γ v), γ = (1 + α) / (1 − α), поэтому граница корзины отличается
+от значения не больше чем на α. Корзин не больше log_γ(MAX / MIN) + 1 независимо
+от числа пользователей, запрос перцентиля читает только их.
+
+В отличие от t-digest и KLL счетчики можно вычитать: когда напиток меняет итог
+пользователя за неделю, старое значение убирается из скетча, новое добавляется.
+Скетч разбит на PERCENTILE_SHARDS частей по user_id, чтобы параллельные записи
+разных пользователей реже ждали одну строку; при чтении части складываются.
+Скетчи обновляются в транзакции записи напитков (crud) и пересчитываются
+из user_daily_stats командой python -m app.percentiles.
+"""
+import argparse
+import logging
+import math
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import TTLCache
+from .database import SessionLocal, engine, upsert
+from .goals import period_window
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Относительная точность границ корзин
+PERCENTILE_ACCURACY = float(os.getenv("PERCENTILE_ACCURACY", "0.01"))
+# Значения меньше MIN считаются нулем, больше MAX попадают в последнюю корзину
+PERCENTILE_MIN_VALUE = float(os.getenv("PERCENTILE_MIN_VALUE", "1"))
+PERCENTILE_MAX_VALUE = float(os.getenv("PERCENTILE_MAX_VALUE", "1000000"))
+PERCENTILE_SHARDS = int(os.getenv("PERCENTILE_SHARDS", "8"))
+
+METRICS = {
+    "alcohol": models.UserDailyStats.total_alcohol,  # чистый алкоголь, мл
+    "spent": models.UserDailyStats.total_spent
+}
+PERIODS = ("weekly", "monthly")
+
+GAMMA = (1 + PERCENTILE_ACCURACY) / (1 - PERCENTILE_ACCURACY)
+MIN_BIN = math.ceil(math.log(PERCENTILE_MIN_VALUE) / math.log(GAMMA))
+MAX_BIN = math.ceil(math.log(PERCENTILE_MAX_VALUE) / math.log(GAMMA))
+ZERO_BIN = MIN_BIN - 1
+
+# Скетч периода меняется с каждым напитком, но для сравнения задержка в минуту допустима
+sketch_cache = TTLCache(
+    maxsize=64,
+    ttl=float(os.getenv("PERCENTILE_CACHE_TTL", "60"))
+)
+
+def bin_index(value: float) -> int:
+    if value is None or value < PERCENTILE_MIN_VALUE:
+        return ZERO_BIN
+    return min(max(math.ceil(math.log(value) / math.log(GAMMA)), MIN_BIN), MAX_BIN)
+
+def bin_value(index: int) -> float:
+    """Середина корзины (относительная ошибка не больше PERCENTILE_ACCURACY)"""
+    if index == ZERO_BIN:
+        return 0.0
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+class QuantileSketch:
+    """Счетчики значений по корзинам; скетчи складываются и вычитаются"""
+
+    def __init__(self, bins: Dict[int, int] = None):
+        self.bins = {}
+        for index, count in (bins or {}).items():
+            self.add_bin(index, count)
+
+    def add_bin(self, index: int, count: int = 1):
+        count = self.bins.get(index, 0) + count
+        if count > 0:
+            self.bins[index] = count
+        else:
+            self.bins.pop(index, None)
+
+    def add(self, value: float, count: int = 1):
+        self.add_bin(bin_index(value), count)
+
+    def merge(self, other: "QuantileSketch"):
+        for index, count in other.bins.items():
+            self.add_bin(index, count)
+        return self
+
+    @property
+    def count(self):
+        return sum(self.bins.values())
+
+    def share_above(self, value: float, exclude_self: bool = False):
+        """Доля значений больше value; значения из той же корзины считаются наполовину.
+
+        exclude_self — value уже учтено в скетче (итог самого пользователя).
+        None, если сравнивать не с кем.
+        """
+        index = bin_index(value)
+        above = sum(count for i, count in self.bins.items() if i > index)
+        same = self.bins.get(index, 0)
+        total = self.count
+        if exclude_self:
+            same, total = max(same - 1, 0), total - 1
+        if total <= 0:
+            return None
+        return (above + same / 2) / total
+
+    def quantile(self, q: float):
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return bin_value(index)
+        return bin_value(max(self.bins))
+
+def period_start(period: str, day: date) -> date:
+    return period_window(period, datetime.combine(day, time.min))[0].date()
+
+def _user_totals(db: Session, keys) -> Dict[tuple, tuple]:
+    """Итоги (напитков, алкоголь, расходы) по ключам (user_id, период, начало периода) из user_daily_stats"""
+    keys = set(keys)
+    if not keys:
+        return {}
+    user_ids = {user_id for user_id, _, _ in keys}
+    first_day = min(start for _, _, start in keys)
+    last_day = max(period_window(period, datetime.combine(start, time.min))[1].date() for _, period, start in keys)
+
+    totals = {}
+    rows = db.query(
+        models.UserDailyStats.user_id,
+        models.UserDailyStats.day,
+        models.UserDailyStats.drinks_count,
+        *METRICS.values()
+    ).filter(
+        models.UserDailyStats.user_id.in_(user_ids),
+        models.UserDailyStats.day >= first_day,
+        models.UserDailyStats.day < last_day
+    )
+    for user_id, day, count, *values in rows:
+        for period in PERIODS:
+            key = (user_id, period, period_start(period, day))
+            if key not in keys:
+                continue
+            total = totals.get(key, (0,) + (0.0,) * len(METRICS))
+            totals[key] = (total[0] + (count or 0),) + tuple(t + (v or 0.0) for t, v in zip(total[1:], values))
+    return totals
+
+def _apply_bin_changes(db: Session, changes: Dict[tuple, int]):
+    # Ключ: (metric, period, period_start, shard, bin). Счетчики прибавляются в
+    # INSERT ... ON CONFLICT DO UPDATE, поэтому новую корзину могут одновременно
+    # создать две транзакции. Строки идут в порядке ключа, чтобы параллельные
+    # транзакции не ждали друг друга по кругу
+    keys = sorted(key for key, delta in changes.items() if delta)
+    table = models.PopulationSketchBin.__table__
+    for i in range(0, len(keys), 500):
+        statement = upsert(db, table).values([
+            {"metric": metric, "period": period, "period_start": start, "shard": shard, "bin": index,
+             "count": changes[metric, period, start, shard, index]}
+            for metric, period, start, shard, index in keys[i:i + 500]
+        ])
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.metric, table.c.period, table.c.period_start, table.c.shard, table.c.bin],
+            set_={"count": table.c["count"] + statement.excluded["count"]}
+        ))
+
+def apply_drinks_to_sketches(db: Session, drinks: List[dict]):
+    """Перенос пользователей между корзинами после записи напитков.
+
+    Вызывается в транзакции записи после apply_drinks_to_daily_stats и
+    apply_drinks_to_streaks: блокировка user_streaks упорядочивает записи одного
+    пользователя, поэтому прежний итог равен новому минус добавленное.
+    """
+    deltas = {}
+    for drink in drinks:
+        day = drink["created_at"].date()
+        values = (
+            1,
+            drink["volume"] * drink["alcohol_content"] / 100,
+            drink.get("price") or 0.0
+        )
+        for period in PERIODS:
+            key = (drink["user_id"], period, period_start(period, day))
+            delta = deltas.get(key, (0,) + (0.0,) * len(METRICS))
+            deltas[key] = tuple(d + v for d, v in zip(delta, values))
+
+    db.flush()
+    totals = _user_totals(db, deltas)
+    changes = {}
+    for key, delta in deltas.items():
+        user_id, period, start = key
+        new = totals.get(key, delta)
+        old = tuple(n - d for n, d in zip(new, delta))
+        shard = user_id % PERCENTILE_SHARDS
+        for i, metric in enumerate(METRICS, 1):
+            # Пользователь без напитков в периоде в распределение не входил
+            if old[0] > 0:
+                old_key = (metric, period, start, shard, bin_index(old[i]))
+                changes[old_key] = changes.get(old_key, 0) - 1
+            new_key = (metric, period, start, shard, bin_index(new[i]))
+            changes[new_key] = changes.get(new_key, 0) + 1
+    _apply_bin_changes(db, changes)
+
+def get_sketch(db: Session, metric: str, period: str, start: date) -> QuantileSketch:
+    key = (metric, period, start)
+    sketch = sketch_cache.get(key)
+    if sketch is None:
+        table = models.PopulationSketchBin
+        rows = db.query(table.bin, func.sum(table.count)).filter(
+            table.metric == metric,
+            table.period == period,
+            table.period_start == start
+        ).group_by(table.bin)
+        sketch = QuantileSketch({index: int(count) for index, count in rows})
+        sketch_cache.set(key, sketch)
+    return sketch
+
+def get_user_percentiles(db: Session, user_id: int, period: str = "weekly", now: datetime = None):
+    """Итоги пользователя за текущий период и доля пользователей, выпивших (потративших) больше"""
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+    now = now or datetime.utcnow()
+    start = period_start(period, now.date())
+    key = (user_id, period, start)
+    count, *values = _user_totals(db, [key]).get(key, (0,) + (0.0,) * len(METRICS))
+
+    metrics = {}
+    for metric, value in zip(METRICS, values):
+        sketch = get_sketch(db, metric, period, start)
+        share = sketch.share_above(value, exclude_self=count > 0)
+        metrics[metric] = {
+            "value": value,
+            "users": sketch.count,
+            "less_than_percent": None if share is None else round(share * 100, 1),
+            "median": sketch.quantile(0.5)
+        }
+    return {"user_id": user_id, "period": period, "period_start": start, "metrics": metrics}
+
+def rebuild_period(db: Session, period: str, start: date):
+    """Пересчет скетчей периода из user_daily_stats одной транзакцией"""
+    end = period_window(period, datetime.combine(start, time.min))[1].date()
+    sketches = {(metric, shard): QuantileSketch() for metric in METRICS for shard in range(PERCENTILE_SHARDS)}
+    rows = db.query(
+        models.UserDailyStats.user_id,
+        *[func.coalesce(func.sum(column), 0.0) for column in METRICS.values()]
+    ).filter(
+        models.UserDailyStats.day >= start,
+        models.UserDailyStats.day < end,
+        models.UserDailyStats.drinks_count > 0
+    ).group_by(models.UserDailyStats.user_id).yield_per(10000)
+    users = 0
+    for user_id, *values in rows:
+        users += 1
+        for metric, value in zip(METRICS, values):
+            sketches[(metric, user_id % PERCENTILE_SHARDS)].add(value)
+
+    table = models.PopulationSketchBin
+    db.query(table).filter(table.period == period, table.period_start == start).delete(synchronize_session=False)
+    db.add_all([
+        models.PopulationSketchBin(
+            metric=metric, period=period, period_start=start, shard=shard, bin=index, count=count
+        )
+        for (metric, shard), sketch in sketches.items()
+        for index, count in sketch.bins.items()
+    ])
+    db.commit()
+    for metric in METRICS:
+        sketch_cache.delete((metric, period, start))
+    return users
+
+def rebuild_sketches(db: Session, weeks: int = 4, months: int = 2, now: datetime = None):
+    """Пересчет скетчей текущего и предыдущих периодов"""
+    today = (now or datetime.utcnow()).date()
+    starts = [("weekly", period_start("weekly", today) - timedelta(weeks=i)) for i in range(weeks)]
+    month = period_start("monthly", today)
+    for _ in range(months):
+        starts.append(("monthly", month))
+        month = period_start("monthly", month - timedelta(days=1))
+    return {f"{period} {start}": rebuild_period(db, period, start) for period, start in starts}
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild population percentile sketches")
+    parser.add_argument("--weeks", type=int, default=4, help="сколько последних недель пересчитать")
+    parser.add_argument("--months", type=int, default=2, help="сколько последних месяцев пересчитать")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine, tables=[models.PopulationSketchBin.__table__])
+    db = SessionLocal()
+    try:
+        users = rebuild_sketches(db, weeks=args.weeks, months=args.months)
+        logger.info(f"Rebuilt percentile sketches (users per period): {users}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error rebuilding percentile sketches: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
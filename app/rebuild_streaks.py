@@ -0,0 +1,29 @@
+import argparse
+import logging
+
+from . import crud, models
+from .database import SessionLocal, engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Пересчет таблицы user_streaks по истории напитков и периодов трезвости"""
+    parser = argparse.ArgumentParser(description="Rebuild the user_streaks state")
+    parser.add_argument("--user-id", type=int, default=None, help="пересчитать только одного пользователя")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine, tables=[models.UserStreak.__table__])
+    db = SessionLocal()
+    try:
+        rows = crud.rebuild_streaks(db, user_id=args.user_id)
+        logger.info(f"Rebuilt {rows} streak rows")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error rebuilding streaks: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Планировщик напоминаний бота.
+
+В памяти держится только ближайшее окно (REMINDER_HORIZON_SECONDS): пользователи,
+чье notification_time попадает в окно, подгружаются из user_settings по индексу
+страницами и кладутся в кучу по времени отправки. Изменения настроек подхватываются
+по updated_at или через reschedule() и перепланируются за O(log n); устаревшие
+записи кучи отбрасываются лениво. Часы и бот передаются снаружи, поэтому
+планировщик проверяется с поддельными часами и поддельным ботом.
+"""
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, time, timedelta
+
+from . import async_crud
+from .database import AsyncSessionLocal
+from .metrics import REMINDERS_SCHEDULED, REMINDERS_SENT
+
+logger = logging.getLogger(__name__)
+
+# Окно, загружаемое в память; должно быть меньше суток
+REMINDER_HORIZON = timedelta(seconds=int(os.getenv("REMINDER_HORIZON_SECONDS", "600")))
+# Размер страницы при загрузке окна и изменений
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "1000"))
+# Как часто проверять изменения настроек, в секундах
+REMINDER_CHANGES_INTERVAL = float(os.getenv("REMINDER_CHANGES_INTERVAL", "30"))
+
+REMINDER_TEXT = "🔔 Напоминание: не забудьте отметить напитки за сегодня в AlcoControl."
+# Дописывается пользователям, чья оценка промилле сейчас выше допустимой (app.bac)
+REMINDER_BAC_WARNING = "\n🚗 По оценке, концентрация алкоголя сейчас выше допустимой — не садитесь за руль."
+
+def next_occurrence(notification_time: time, now: datetime):
+    """Ближайший момент после now, когда наступает notification_time"""
+    due = datetime.combine(now.date(), notification_time)
+    if due <= now:
+        due += timedelta(days=1)
+    return due
+
+def day_segments(start: datetime, end: datetime):
+    """Разбиение [start, end) на отрезки суток (день, с, до); до=None — до конца суток"""
+    segments = []
+    while start < end:
+        next_day = datetime.combine(start.date() + timedelta(days=1), time.min)
+        if end < next_day:
+            segments.append((start.date(), start.time(), end.time()))
+            break
+        segments.append((start.date(), start.time(), None))
+        start = next_day
+    return segments
+
+class ReminderScheduler:
+    def __init__(
+        self,
+        bot,
+        session_factory=AsyncSessionLocal,
+        clock=datetime.utcnow,
+        horizon: timedelta = REMINDER_HORIZON,
+        batch_size: int = REMINDER_BATCH_SIZE,
+        changes_interval: float = REMINDER_CHANGES_INTERVAL,
+        text: str = REMINDER_TEXT,
+        rate_limit_args=None,
+        bac_warning: str = REMINDER_BAC_WARNING
+    ):
+        self.bot = bot
+        self.session_factory = session_factory
+        self.clock = clock
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.changes_interval = timedelta(seconds=changes_interval)
+        self.text = text
+        # None отключает проверку промилле перед отправкой
+        self.bac_warning = bac_warning
+        # Приоритет в очереди исходящих сообщений бота (telegram_bot.OutboundQueue)
+        self.rate_limit_args = rate_limit_args
+        # Куча (время отправки, user_id, telegram_id); актуальна запись,
+        # время которой совпадает с _scheduled[user_id]
+        self._heap = []
+        self._scheduled = {}
+        # Все напоминания раньше _loaded_until уже загружены в кучу
+        self._loaded_until = None
+        self._changes_since = None
+        self._changes_checked_at = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closed = False
+        self._deliveries = set()
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def _push(self, due: datetime, user_id: int, telegram_id: int):
+        if self._scheduled.get(user_id) == due:
+            return
+        self._scheduled[user_id] = due
+        heapq.heappush(self._heap, (due, user_id, telegram_id))
+        # Сжатие, если устаревших записей стало больше, чем актуальных
+        if len(self._heap) > 2 * len(self._scheduled) + self.batch_size:
+            self._heap = [entry for entry in self._heap if self._scheduled.get(entry[1]) == entry[0]]
+            heapq.heapify(self._heap)
+
+    def reschedule(self, user_id: int, telegram_id: int, enabled: bool, notification_time: time = None):
+        """Перепланирование напоминания пользователя после изменения настроек"""
+        self._scheduled.pop(user_id, None)
+        if self._loaded_until is None or not enabled or notification_time is None:
+            return
+        due = next_occurrence(notification_time, self.clock())
+        # Напоминания за пределами загруженного окна подгрузятся из базы при его сдвиге
+        if due < self._loaded_until:
+            self._push(due, user_id, telegram_id)
+            self._wakeup.set()
+
+    async def _load_window(self, start: datetime, end: datetime):
+        for day, from_time, to_time in day_segments(start, end):
+            after = None
+            while True:
+                async with self.session_factory() as db:
+                    rows = await async_crud.get_due_notifications(
+                        db, from_time, to_time, after, self.batch_size
+                    )
+                for user_id, telegram_id, notification_time in rows:
+                    self._push(datetime.combine(day, notification_time), user_id, telegram_id)
+                if len(rows) < self.batch_size:
+                    break
+                after = (rows[-1].notification_time, rows[-1].user_id)
+        self._loaded_until = end
+
+    async def _load_changes(self):
+        while True:
+            async with self.session_factory() as db:
+                rows = await async_crud.get_changed_notifications(db, self._changes_since, self.batch_size)
+            for user_id, telegram_id, enabled, notification_time, updated_at in rows:
+                self.reschedule(user_id, telegram_id, enabled, notification_time)
+                self._changes_since = max(self._changes_since, updated_at)
+            if len(rows) < self.batch_size:
+                break
+
+    async def tick(self, wait: bool = True):
+        """Один шаг планировщика: загрузка окна и изменений, отправка наступивших напоминаний.
+
+        Возвращает число отправленных напоминаний. При wait=False отправка идет
+        в фоне, чтобы длинная пачка не задерживала следующие шаги.
+        """
+        now = self.clock()
+        if self._loaded_until is None:
+            # Напоминания, время которых прошло до запуска, не отправляются
+            self._loaded_until = now
+            self._changes_since = now
+            self._changes_checked_at = now
+
+        if now - self._changes_checked_at >= self.changes_interval:
+            await self._load_changes()
+            self._changes_checked_at = now
+
+        # Окно сдвигается, когда загруженной части осталось меньше половины горизонта;
+        # после долгой паузы пропущенные напоминания старше горизонта не отправляются
+        if self._loaded_until - now < self.horizon / 2:
+            await self._load_window(max(self._loaded_until, now - self.horizon), now + self.horizon)
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            at, user_id, telegram_id = heapq.heappop(self._heap)
+            if self._scheduled.get(user_id) == at:
+                del self._scheduled[user_id]
+                due.append((user_id, telegram_id))
+        REMINDERS_SCHEDULED.set(len(self._scheduled))
+
+        over_limit = await self._over_limit([user_id for user_id, _ in due], now)
+        # Отправки идут параллельно, темп задает очередь исходящих сообщений бота
+        delivery = asyncio.gather(*(
+            self._send(telegram_id, self.text + self.bac_warning if user_id in over_limit else self.text)
+            for user_id, telegram_id in due
+        ))
+        if not wait:
+            self._deliveries.add(delivery)
+            delivery.add_done_callback(self._deliveries.discard)
+            return len(due)
+        return sum(await delivery)
+
+    async def _over_limit(self, user_ids, now: datetime):
+        # Одна пакетная оценка промилле на всю пачку напоминаний
+        if not user_ids or self.bac_warning is None:
+            return set()
+        try:
+            async with self.session_factory() as db:
+                return await async_crud.users_over_limit(db, user_ids, now)
+        except Exception as e:
+            logger.error(f"Failed to estimate BAC for reminders: {str(e)}")
+            return set()
+
+    async def _send(self, telegram_id: int, text: str):
+        kwargs = {"rate_limit_args": self.rate_limit_args} if self.rate_limit_args is not None else {}
+        try:
+            await self.bot.send_message(chat_id=telegram_id, text=text, **kwargs)
+            REMINDERS_SENT.labels(status="ok").inc()
+            return 1
+        except Exception as e:
+            REMINDERS_SENT.labels(status="error").inc()
+            logger.error(f"Failed to send reminder to {telegram_id}: {str(e)}")
+            return 0
+
+    def seconds_until_next(self):
+        """Сколько можно спать до следующего события: напоминания, сдвига окна или проверки изменений"""
+        if self._loaded_until is None:
+            return self.changes_interval.total_seconds()
+        now = self.clock()
+        moments = [
+            self._loaded_until - self.horizon / 2,
+            self._changes_checked_at + self.changes_interval
+        ]
+        if self._heap:
+            moments.append(self._heap[0][0])
+        return max(0.0, (min(moments) - now).total_seconds())
+
+    async def run(self):
+        while not self._closed:
+            try:
+                await self.tick(wait=False)
+            except Exception as e:
+                logger.error(f"Error in reminder scheduler: {str(e)}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(self.seconds_until_next(), 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        self._closed = False
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            # Флаг нужен, потому что wait_for может поглотить отмену задачи
+            self._closed = True
+            self._wakeup.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for delivery in list(self._deliveries):
+            delivery.cancel()
@@ -1,6 +1,15 @@
-from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime
+from pydantic import AfterValidator, BaseModel, Field
+from typing import Annotated, Dict, Optional, List
+from datetime import date, datetime, time, timezone
+
+def to_naive_utc(value: datetime):
+    """Время с часовым поясом переводится в UTC без tzinfo: база и код работают с naive UTC"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# Время от клиента ("...Z", "+03:00" или без пояса, тогда считается UTC)
+UTCDateTime = Annotated[datetime, AfterValidator(to_naive_utc)]
 
 class UserBase(BaseModel):
     telegram_id: int
@@ -19,11 +28,26 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserSettingsBase(BaseModel):
+    daily_limit: Optional[float] = None
+    notification_enabled: bool = True
+    notification_time: Optional[time] = None
+
+class UserSettingsUpdate(UserSettingsBase):
+    pass
+
+class UserSettings(UserSettingsBase):
+    user_id: int
+
+    class Config:
+        from_attributes = True
+
 class DrinkBase(BaseModel):
+    # Границы совпадают с CHECK в таблице drinks
     drink_type: str
-    volume: float
-    alcohol_content: float
-    price: Optional[float] = None
+    volume: float = Field(gt=0)
+    alcohol_content: float = Field(ge=0, le=100)
+    price: Optional[float] = Field(default=None, ge=0)
     location: Optional[str] = None
     mood: Optional[str] = None
     comment: Optional[str] = None
@@ -31,6 +55,19 @@ class DrinkBase(BaseModel):
 class DrinkCreate(DrinkBase):
     user_id: int
 
+class DrinkImport(DrinkCreate):
+    created_at: Optional[UTCDateTime] = None
+
+class DrinkBatchItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class DrinkBatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[DrinkBatchItemResult]
+
 class Drink(DrinkBase):
     id: int
     user_id: int
@@ -40,8 +77,8 @@ class Drink(DrinkBase):
         from_attributes = True
 
 class SoberPeriodBase(BaseModel):
-    start_time: datetime
-    end_time: Optional[datetime] = None
+    start_time: UTCDateTime
+    end_time: Optional[UTCDateTime] = None
     is_active: bool = True
 
 class SoberPeriodCreate(SoberPeriodBase):
@@ -58,8 +95,8 @@ class GoalBase(BaseModel):
     type: str
     target_value: float
     period: str
-    start_date: datetime
-    end_date: Optional[datetime] = None
+    start_date: UTCDateTime
+    end_date: Optional[UTCDateTime] = None
     is_active: bool = True
 
 class GoalCreate(GoalBase):
@@ -70,4 +107,67 @@ class Goal(GoalBase):
     user_id: int
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class GoalProgress(BaseModel):
+    goal_id: int
+    user_id: int
+    type: str
+    period: str
+    target_value: float
+    current_value: float
+    progress: float
+    is_achieved: bool
+    period_start: datetime
+    period_end: datetime
+    evaluated_at: datetime
+
+class DrinkPage(BaseModel):
+    items: List[Drink]
+    next_cursor: Optional[str] = None
+
+class SoberPeriodPage(BaseModel):
+    items: List[SoberPeriod]
+    next_cursor: Optional[str] = None
+
+class GoalPage(BaseModel):
+    items: List[Goal]
+    next_cursor: Optional[str] = None
+
+class BacTimeline(BaseModel):
+    user_id: int
+    start: datetime
+    step_minutes: float
+    limit: float  # промилле
+    peak: float
+    peak_at: datetime
+    minutes_over_limit: float
+    points: List[float]  # значение в момент start + i * step_minutes
+
+class PercentileMetric(BaseModel):
+    value: float  # итог пользователя за период
+    users: int  # пользователей с напитками в периоде
+    less_than_percent: Optional[float] = None  # доля пользователей с большим итогом, %
+    median: Optional[float] = None
+
+class PercentileComparison(BaseModel):
+    user_id: int
+    period: str
+    period_start: date
+    metrics: Dict[str, PercentileMetric]  # 'alcohol' (чистый алкоголь, мл), 'spent'
+
+class StatsBucket(BaseModel):
+    date: date
+    count: int
+    volume: float
+    alcohol: float
+    spent: float
+
+class RangeStats(BaseModel):
+    total_drinks: int
+    total_volume: float
+    total_alcohol: float
+    total_spent: float
+    drinks_by_type: Dict[str, int]
+    bucket: str
+    daily_stats: List[StatsBucket]
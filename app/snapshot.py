@@ -0,0 +1,308 @@
+"""Аналитический снимок данных в Parquet.
+
+Напитки выгружаются инкрементально по id: каждый запуск дописывает новые строки
+в файлы drinks/month=YYYY-MM/ (месяц по created_at). Периоды трезвости и цели
+изменяются после создания и невелики, поэтому переписываются целиком при каждом
+запуске (партиции по месяцу начала). Аналитические запросы читают файлы через
+aggregate() и не нагружают базу; читаются только нужные колонки и месяцы.
+
+Требуется pyarrow (есть в requirements.txt).
+
+    python -m app.snapshot export
+    python -m app.snapshot aggregate drinks --group-by month drink_type --sum volume
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from typing import List, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import func, select
+
+from . import models
+from .database import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_BATCH_SIZE = int(os.getenv("SNAPSHOT_BATCH_SIZE", "50000"))
+# Пауза первого запуска: за это время транзакции, получившие id до max(id), успевают завершиться
+SNAPSHOT_SETTLE_SECONDS = float(os.getenv("SNAPSHOT_SETTLE_SECONDS", "5"))
+
+STATE_FILE = "_state.json"
+
+TABLES = {
+    "drinks": (models.Drink, models.Drink.created_at, pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("drink_type", pa.string()),
+        ("volume", pa.float64()),
+        ("alcohol_content", pa.float64()),
+        ("price", pa.float64()),
+        ("location", pa.string()),
+        ("mood", pa.string()),
+        ("comment", pa.string()),
+        ("created_at", pa.timestamp("us"))
+    ])),
+    "sober_periods": (models.SoberPeriod, models.SoberPeriod.start_time, pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("start_time", pa.timestamp("us")),
+        ("end_time", pa.timestamp("us")),
+        ("is_active", pa.bool_())
+    ])),
+    "goals": (models.Goal, models.Goal.start_date, pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("type", pa.string()),
+        ("target_value", pa.float64()),
+        ("period", pa.string()),
+        ("start_date", pa.timestamp("us")),
+        ("end_date", pa.timestamp("us")),
+        ("is_active", pa.bool_())
+    ])),
+}
+
+def _load_state(snapshot_dir: str):
+    path = os.path.join(snapshot_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _save_state(snapshot_dir: str, state: dict):
+    # Запись через временный файл, чтобы прерванный запуск не испортил отметку
+    path = os.path.join(snapshot_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+class _MonthWriters:
+    """Открытые ParquetWriter по месяцам.
+
+    Пока идет запись, файлы называются .<name>.tmp: dataset пропускает имена
+    с точкой в начале, поэтому читатели не видят ни недописанный файл, ни его
+    копию до переименования. close() публикует файлы, discard() удаляет их.
+    """
+
+    def __init__(self, directory: str, schema: pa.Schema, name: str):
+        self.directory = directory
+        self.schema = schema
+        self.name = name
+        self.writers = {}
+        self.rows = 0
+
+    def _paths(self, month: str):
+        month_dir = os.path.join(self.directory, f"month={month}")
+        return os.path.join(month_dir, f".{self.name}.tmp"), os.path.join(month_dir, self.name)
+
+    def write(self, rows: List[dict], month_column: str):
+        by_month = {}
+        for row in rows:
+            value = row[month_column]
+            by_month.setdefault(value.strftime("%Y-%m") if value else "unknown", []).append(row)
+        for month, month_rows in by_month.items():
+            writer = self.writers.get(month)
+            if writer is None:
+                staged, _ = self._paths(month)
+                os.makedirs(os.path.dirname(staged), exist_ok=True)
+                writer = self.writers[month] = pq.ParquetWriter(staged, self.schema)
+            writer.write_table(pa.Table.from_pylist(month_rows, schema=self.schema))
+            self.rows += len(month_rows)
+
+    def close(self):
+        for month, writer in self.writers.items():
+            writer.close()
+        for month in self.writers:
+            staged, path = self._paths(month)
+            os.replace(staged, path)
+
+    def discard(self):
+        for month, writer in self.writers.items():
+            writer.close()
+            staged, _ = self._paths(month)
+            if os.path.exists(staged):
+                os.remove(staged)
+
+def _stream_rows(statement, batch_size: int):
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+        for rows in result.mappings().partitions():
+            yield [dict(row) for row in rows]
+
+def export_drinks(
+    snapshot_dir: str = SNAPSHOT_DIR,
+    batch_size: int = SNAPSHOT_BATCH_SIZE,
+    settle_seconds: float = SNAPSHOT_SETTLE_SECONDS
+):
+    """Дозапись напитков с id больше отметки прошлого запуска.
+
+    Верхняя граница — max(id), увиденный прошлым запуском: транзакции, получившие
+    меньшие id, к этому времени завершены, поэтому строки не теряются. Новые строки
+    попадают в снимок со следующего запуска. Первый запуск (без _state.json)
+    прошлой отметки не имеет: он ждет settle_seconds после чтения max(id) и
+    выгружает все строки до него.
+    """
+    model, month_column, schema = TABLES["drinks"]
+    directory = os.path.join(snapshot_dir, "drinks")
+    state = _load_state(snapshot_dir)
+    drinks_state = state.get("drinks")
+
+    with engine.connect() as conn:
+        seen_max_id = conn.execute(select(func.coalesce(func.max(model.id), 0))).scalar()
+
+    if drinks_state is None:
+        if seen_max_id and settle_seconds > 0:
+            time.sleep(settle_seconds)
+        drinks_state = {"last_id": 0, "seen_max_id": seen_max_id}
+    last_id, upper = drinks_state["last_id"], drinks_state["seen_max_id"]
+
+    # Файлы прерванного запуска с той же нижней границей удаляются
+    prefix = f"part-{last_id:012d}-"
+    if os.path.isdir(directory):
+        for month_dir in os.listdir(directory):
+            for name in os.listdir(os.path.join(directory, month_dir)):
+                if name.startswith(prefix) or name.startswith("." + prefix):
+                    os.remove(os.path.join(directory, month_dir, name))
+
+    written = 0
+    if upper > last_id:
+        writers = _MonthWriters(directory, schema, f"{prefix}{upper:012d}.parquet")
+        statement = select(*[getattr(model, field.name) for field in schema]).where(
+            model.id > last_id, model.id <= upper
+        ).order_by(model.id)
+        try:
+            for rows in _stream_rows(statement, batch_size):
+                writers.write(rows, month_column.key)
+        except BaseException:
+            writers.discard()
+            raise
+        writers.close()
+        written = writers.rows
+        last_id = upper
+
+    state["drinks"] = {"last_id": last_id, "seen_max_id": max(seen_max_id, last_id)}
+    _save_state(snapshot_dir, state)
+    return written
+
+def export_table(table: str, snapshot_dir: str = SNAPSHOT_DIR, batch_size: int = SNAPSHOT_BATCH_SIZE):
+    """Полная перезапись небольшой изменяемой таблицы"""
+    model, month_column, schema = TABLES[table]
+    directory = os.path.join(snapshot_dir, table)
+    staging = directory + ".new"
+    shutil.rmtree(staging, ignore_errors=True)
+
+    writers = _MonthWriters(staging, schema, "part-0.parquet")
+    statement = select(*[getattr(model, field.name) for field in schema]).order_by(model.id)
+    try:
+        for rows in _stream_rows(statement, batch_size):
+            writers.write(rows, month_column.key)
+    except BaseException:
+        writers.discard()
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    writers.close()
+
+    os.makedirs(staging, exist_ok=True)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.replace(staging, directory)
+    return writers.rows
+
+def export_snapshot(
+    snapshot_dir: str = SNAPSHOT_DIR,
+    batch_size: int = SNAPSHOT_BATCH_SIZE,
+    settle_seconds: float = SNAPSHOT_SETTLE_SECONDS
+):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    return {
+        "drinks": export_drinks(snapshot_dir, batch_size, settle_seconds),
+        "sober_periods": export_table("sober_periods", snapshot_dir, batch_size),
+        "goals": export_table("goals", snapshot_dir, batch_size)
+    }
+
+def open_dataset(table: str, snapshot_dir: str = SNAPSHOT_DIR):
+    # Колонка month берется из имени каталога (hive-партиции)
+    return ds.dataset(
+        os.path.join(snapshot_dir, table),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+    )
+
+def aggregate(
+    table: str,
+    group_by: Sequence[str],
+    metrics: Sequence[Tuple[str, str]],
+    start_month: str = None,
+    end_month: str = None,
+    filter: ds.Expression = None,
+    snapshot_dir: str = SNAPSHOT_DIR
+) -> pa.Table:
+    """Агрегация по снимку.
+
+    metrics — пары (колонка, функция pyarrow: sum, count, mean, min, max, ...).
+    start_month и end_month (YYYY-MM, включительно) отсекают лишние каталоги
+    до чтения файлов; читаются только колонки из group_by, metrics и filter.
+
+        aggregate("drinks", ["month", "drink_type"], [("volume", "sum"), ("id", "count")])
+    """
+    dataset = open_dataset(table, snapshot_dir)
+    conditions = []
+    if start_month:
+        conditions.append(pc.field("month") >= start_month)
+    if end_month:
+        conditions.append(pc.field("month") <= end_month)
+    if filter is not None:
+        conditions.append(filter)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    columns = list(dict.fromkeys(list(group_by) + [column for column, _ in metrics]))
+    data = dataset.to_table(columns=columns, filter=expression)
+    result = data.group_by(list(group_by)).aggregate(list(metrics))
+    if group_by:
+        result = result.sort_by([(column, "ascending") for column in group_by])
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Parquet analytics snapshot")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="каталог снимка")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export", help="дозаписать снимок")
+    query = commands.add_parser("aggregate", help="агрегировать данные снимка")
+    query.add_argument("table", choices=sorted(TABLES))
+    query.add_argument("--group-by", nargs="*", default=["month"])
+    query.add_argument("--sum", nargs="*", default=[])
+    query.add_argument("--count", nargs="*", default=[])
+    query.add_argument("--start-month")
+    query.add_argument("--end-month")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        try:
+            rows = export_snapshot(args.dir)
+            logger.info(f"Snapshot rows written: {rows}")
+        except Exception as e:
+            logger.error(f"Error exporting snapshot: {str(e)}")
+            raise
+        return
+
+    metrics = [(column, "sum") for column in args.sum] + [(column, "count") for column in args.count]
+    result = aggregate(
+        args.table, args.group_by, metrics or [("id", "count")],
+        start_month=args.start_month, end_month=args.end_month, snapshot_dir=args.dir
+    )
+    print(",".join(result.column_names))
+    for row in result.to_pylist():
+        print(",".join("" if value is None else str(value) for value in row.values()))
+
+if __name__ == "__main__":
+    main()
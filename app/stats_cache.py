@@ -0,0 +1,103 @@
+"""Кэш результатов статистики с инвалидацией по версии данных пользователя.
+
+Ключ включает users.stats_version, которую crud увеличивает в той же транзакции,
+что и запись напитка или периода трезвости. После записи старые ключи просто
+перестают читаться и вытесняются по LRU/TTL, поэтому устаревший результат не
+возвращается ни в одном воркере.
+
+Значение хранится в JSON-виде схемы ответа и при чтении снова проходит через
+схему, поэтому результат из кэша и только что посчитанный совпадают по типам
+(даты остаются date) в обоих хранилищах.
+"""
+import json
+import os
+
+from .cache import TTLCache
+
+class MemoryBackend:
+    """Хранилище в памяти процесса (по умолчанию)"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: str):
+        return self.cache.get(key)
+
+    def set(self, key: str, value):
+        self.cache.set(key, value)
+
+    def stats(self):
+        return self.cache.stats()
+
+class RedisBackend:
+    """Общее хранилище для нескольких воркеров.
+
+    Принимает любой клиент с интерфейсом redis.Redis (get/set с ex).
+    Значения должны быть JSON-совместимыми, их готовит StatsCache.
+    """
+
+    def __init__(self, client, ttl: int = 3600, prefix: str = "alcocontrol:stats:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "ttl": self.ttl}
+
+class StatsCache:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+
+    @staticmethod
+    def make_key(user_id: int, version: int, kind: str, params: tuple = ()):
+        return ":".join(str(part) for part in (user_id, version, kind) + tuple(params))
+
+    def get_or_compute(self, user_id: int, version: int, kind: str, params: tuple, compute, schema=None):
+        """Результат compute() из кэша или с записью в кэш.
+
+        schema — pydantic-модель результата; без нее результат должен состоять
+        только из JSON-типов.
+        """
+        if version is None:
+            return compute()
+        key = self.make_key(user_id, version, kind, params)
+        value = self.backend.get(key)
+        if value is None:
+            value = compute()
+            if schema is not None:
+                value = schema.model_validate(value).model_dump(mode="json")
+            self.backend.set(key, value)
+        if schema is not None:
+            return schema.model_validate(value).model_dump()
+        return value
+
+    def stats(self):
+        return self.backend.stats()
+
+def create_stats_cache():
+    url = os.getenv("STATS_CACHE_URL")
+    ttl = int(os.getenv("STATS_CACHE_TTL", "3600"))
+    if url and url.startswith("redis"):
+        return StatsCache(RedisBackend.from_url(url, ttl=ttl))
+    return StatsCache(MemoryBackend(maxsize=int(os.getenv("STATS_CACHE_SIZE", "10000")), ttl=ttl))
+
+stats_cache = create_stats_cache()
@@ -1,33 +1,91 @@
 from telegram import Update, WebAppInfo, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler
+from telegram.error import RetryAfter
+from telegram.ext import Application, BaseRateLimiter, CommandHandler, ContextTypes, CallbackQueryHandler
+import asyncio
+import heapq
+import itertools
 import os
-from dotenv import load_dotenv
-from . import crud
-from .database import SessionLocal
+import time
+from . import async_crud, bac, schemas
+from .database import AsyncSessionLocal, async_engine, read_session, replicas
+from .metrics import (
+    BOT_OUTBOUND_BACKLOG,
+    BOT_OUTBOUND_SENT,
+    BOT_OUTBOUND_WAIT,
+    instrument_engine,
+    track_bot_handler,
+)
+from .reminders import ReminderScheduler
 from datetime import datetime
 import logging
 
-load_dotenv()
-
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 WEBAPP_URL = os.getenv("WEBAPP_URL", "http://localhost:3000")
 
+# Режим работы: polling (отдельный процесс) или webhook (внутри FastAPI)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+# Адрес Bot API, можно указать локальную заглушку для тестов
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL")
+# Сколько обновлений обрабатывается одновременно
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "16"))
+# Ограничения исходящих сообщений (лимиты Telegram: ~30 в секунду на бота,
+# 1 в секунду на личный чат, 20 в минуту на группу)
+BOT_SEND_RATE = float(os.getenv("BOT_SEND_RATE", "25"))
+# Запас сверх темпа: за любую секунду уходит не больше BOT_SEND_RATE + BOT_SEND_BURST
+BOT_SEND_BURST = float(os.getenv("BOT_SEND_BURST", "5"))
+BOT_CHAT_RATE = float(os.getenv("BOT_CHAT_RATE", "1"))
+BOT_CHAT_BURST = float(os.getenv("BOT_CHAT_BURST", "3"))
+BOT_GROUP_RATE = float(os.getenv("BOT_GROUP_RATE", str(20 / 60)))
+BOT_SEND_CONCURRENCY = int(os.getenv("BOT_SEND_CONCURRENCY", "16"))
+BOT_SEND_RETRIES = int(os.getenv("BOT_SEND_RETRIES", "3"))
+# Планировщик напоминаний; при нескольких процессах бота включайте только в одном
+BOT_REMINDERS = os.getenv("BOT_REMINDERS", "true").lower() == "true"
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PERIOD_NAMES = {"daily": "в день", "weekly": "в неделю", "monthly": "в месяц"}
+
+def format_goal(goal: schemas.GoalProgress):
+    """Текст цели с прогрессом за текущий период"""
+    period = PERIOD_NAMES.get(goal.period, goal.period)
+    mark = "✅" if goal.is_achieved else "⏳"
+    if goal.type == "sober_days":
+        title = f"{goal.target_value:g} дней трезвости {period}"
+    elif goal.type == "drinks_limit":
+        title = f"Не больше {goal.target_value:g} напитков {period}"
+        mark = "✅" if goal.is_achieved else "❌"
+    else:
+        title = f"Расходы не больше {goal.target_value:g} {period}"
+        mark = "✅" if goal.is_achieved else "❌"
+    return f"{title}: {goal.current_value:g} из {goal.target_value:g} {mark}"
+
+def format_percentiles(comparison: dict):
+    """Сравнение с другими пользователями за неделю для /stats"""
+    alcohol = comparison["metrics"]["alcohol"]
+    if alcohol["less_than_percent"] is None:
+        return None
+    text = f"🏆 На этой неделе вы выпили меньше, чем {alcohol['less_than_percent']:.0f}% пользователей"
+    spent = comparison["metrics"]["spent"]
+    if spent["value"] > 0 and spent["less_than_percent"] is not None:
+        text += f", потратили меньше, чем {spent['less_than_percent']:.0f}%"
+    return text + "."
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     try:
-        db = SessionLocal()
-        user = crud.get_user_by_telegram_id(db, update.effective_user.id)
-        if not user:
-            user = crud.create_user(db, {
-                "telegram_id": update.effective_user.id,
-                "username": update.effective_user.username,
-                "first_name": update.effective_user.first_name,
-                "last_name": update.effective_user.last_name
-            })
+        async with AsyncSessionLocal() as db:
+            user = await async_crud.get_user_identity(db, update.effective_user.id)
+            if not user:
+                user = await async_crud.create_user(db, schemas.UserCreate(
+                    telegram_id=update.effective_user.id,
+                    username=update.effective_user.username,
+                    first_name=update.effective_user.first_name,
+                    last_name=update.effective_user.last_name
+                ))
         
         keyboard = [
             [InlineKeyboardButton("📊 Статистика", callback_data="stats")],
@@ -46,8 +104,6 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             "Произошла ошибка. Пожалуйста, попробуйте позже."
         )
-    finally:
-        db.close()
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /help"""
@@ -58,6 +114,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         /help - Показать это сообщение
         /stats - Показать статистику
         /sober - Начать период трезвости
+        /bac - Оценка концентрации алкоголя
         /app - Открыть веб-приложение
         """
         await update.message.reply_text(help_text)
@@ -70,25 +127,30 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /stats"""
     try:
-        db = SessionLocal()
-        user = crud.get_user_by_telegram_id(db, update.effective_user.id)
-        
-        if not user:
-            await update.message.reply_text(
-                "Пожалуйста, сначала зарегистрируйтесь в веб-приложении."
-            )
-            return
-        
-        # Получаем статистику
-        drinks = crud.get_user_drinks(db, user.id)
-        total_alcohol = sum(drink.volume * drink.alcohol_content / 100 for drink in drinks)
-        days_with_drinks = len(set(drink.created_at.date() for drink in drinks))
+        async with AsyncSessionLocal() as db:
+            user = await async_crud.get_user_identity(db, update.effective_user.id)
+            
+            if not user:
+                await update.message.reply_text(
+                    "Пожалуйста, сначала зарегистрируйтесь в веб-приложении."
+                )
+                return
+            
+        # Статистика читается с реплики, если она настроена
+        async with read_session(user.id) as db:
+            statistics = await async_crud.get_user_statistics(db, user.id)
+            weekly = await async_crud.get_user_percentiles(db, user.id, "weekly")
         
         stats_text = f"""
         📊 Ваша статистика:
-        Всего алкоголя: {total_alcohol:.1f} мл
-        Дней с употреблением: {days_with_drinks}
+        Всего алкоголя: {statistics['total_alcohol']:.1f} мл
+        Дней с употреблением: {statistics['days_with_drinks']}
+        Дней трезвости: {statistics['sober_days']}
+        Лучшая серия: {statistics['best_streak_days']} дн.
         """
+        comparison = format_percentiles(weekly)
+        if comparison:
+            stats_text += f"\n{comparison}"
         
         await update.message.reply_text(stats_text)
     except Exception as e:
@@ -97,27 +159,25 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "Произошла ошибка при получении статистики. "
             "Пожалуйста, попробуйте позже."
         )
-    finally:
-        db.close()
 
 async def sober(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /sober"""
     try:
-        db = SessionLocal()
-        user = crud.get_user_by_telegram_id(db, update.effective_user.id)
-        
-        if not user:
-            await update.message.reply_text(
-                "Пожалуйста, сначала зарегистрируйтесь в веб-приложении."
-            )
-            return
-        
-        # Создаем новый период трезвости
-        period = crud.create_sober_period(db, {
-            "user_id": user.id,
-            "start_time": datetime.now(),
-            "is_active": True
-        })
+        async with AsyncSessionLocal() as db:
+            user = await async_crud.get_user_identity(db, update.effective_user.id)
+            
+            if not user:
+                await update.message.reply_text(
+                    "Пожалуйста, сначала зарегистрируйтесь в веб-приложении."
+                )
+                return
+            
+            # Создаем новый период трезвости
+            period = await async_crud.create_sober_period(db, schemas.SoberPeriodCreate(
+                user_id=user.id,
+                start_time=datetime.utcnow(),
+                is_active=True
+            ))
         await update.message.reply_text(
             "🎉 Поздравляем! Вы начали новый период трезвости. "
             "Держитесь!"
@@ -127,8 +187,33 @@ async def sober(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             "Произошла ошибка. Пожалуйста, попробуйте позже."
         )
-    finally:
-        db.close()
+
+async def bac_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /bac"""
+    try:
+        async with AsyncSessionLocal() as db:
+            user = await async_crud.get_user_identity(db, update.effective_user.id)
+
+            if not user:
+                await update.message.reply_text(
+                    "Пожалуйста, сначала зарегистрируйтесь в веб-приложении."
+                )
+                return
+
+        async with read_session(user.id) as db:
+            current = await async_crud.get_current_bac(db, [user.id])
+        value, below_limit_at = current[user.id]
+
+        text = f"🧪 Оценка концентрации алкоголя: {value:.2f} ‰ (допустимо {bac.BAC_LIMIT:g} ‰)"
+        if below_limit_at:
+            text += f"\nОпустится ниже допустимой примерно к {below_limit_at:%H:%M} UTC. Не садитесь за руль."
+        text += "\nОценка по формуле Видмарка приблизительна и не заменяет алкотестер."
+        await update.message.reply_text(text)
+    except Exception as e:
+        logger.error(f"Error in bac command: {str(e)}")
+        await update.message.reply_text(
+            "Произошла ошибка. Пожалуйста, попробуйте позже."
+        )
 
 async def app(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /app"""
@@ -182,16 +267,16 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "Введите вашу цель (например, '30 дней трезвости'):"
             )
         elif query.data == "list_goals":
-            db = SessionLocal()
-            user = crud.get_user_by_telegram_id(db, update.effective_user.id)
-            
-            if not user:
-                await query.message.reply_text(
-                    "Пожалуйста, сначала зарегистрируйтесь в веб-приложении."
-                )
-                return
-            
-            goals = crud.get_user_goals(db, user.id)
+            async with AsyncSessionLocal() as db:
+                user = await async_crud.get_user_identity(db, update.effective_user.id)
+                
+                if not user:
+                    await query.message.reply_text(
+                        "Пожалуйста, сначала зарегистрируйтесь в веб-приложении."
+                    )
+                    return
+                
+            goals = await async_crud.read_goal_progress(user.id)
             if not goals:
                 await query.message.reply_text(
                     "У вас пока нет целей. Создайте новую цель!"
@@ -200,7 +285,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             goals_text = "📋 Ваши цели:\n\n"
             for goal in goals:
-                goals_text += f"- {goal.description}\n"
+                goals_text += f"- {format_goal(goal)}\n"
             
             await query.message.reply_text(goals_text)
     except Exception as e:
@@ -209,27 +294,327 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "Произошла ошибка. Пожалуйста, попробуйте позже."
         )
 
-def setup_bot():
+# Приоритеты исходящих сообщений: ответы пользователю раньше массовых рассылок
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float):
+        """Сколько секунд ждать до появления токена"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+class _OutboundItem:
+    __slots__ = ("callback", "args", "kwargs", "future", "priority", "enqueued_at", "attempts")
+
+    def __init__(self, callback, args, kwargs, future, priority, enqueued_at):
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.priority = priority
+        self.enqueued_at = enqueued_at
+        self.attempts = 0
+
+class OutboundQueue(BaseRateLimiter):
+    """Очередь исходящих запросов к Bot API с ограничением скорости.
+
+    Подключается как rate_limiter приложения, поэтому через нее проходят все
+    reply_text и send_message. Запросы с chat_id ограничиваются общей корзиной
+    (BOT_SEND_RATE в секунду) и корзиной чата (BOT_CHAT_RATE, для групп
+    BOT_GROUP_RATE); порядок сообщений внутри чата сохраняется. Приоритет
+    передается через rate_limit_args: INTERACTIVE (по умолчанию) или BULK.
+    При RetryAfter отправка приостанавливается на указанное время и запрос
+    повторяется. Запросы без chat_id идут в обход очереди.
+    """
+
+    def __init__(
+        self,
+        rate: float = BOT_SEND_RATE,
+        burst: float = BOT_SEND_BURST,
+        chat_rate: float = BOT_CHAT_RATE,
+        chat_burst: float = BOT_CHAT_BURST,
+        group_rate: float = BOT_GROUP_RATE,
+        max_in_flight: int = BOT_SEND_CONCURRENCY,
+        max_retries: int = BOT_SEND_RETRIES,
+        clock=time.monotonic
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.clock = clock
+        self._global = TokenBucket(rate, max(burst, 1), clock())
+        self._buckets = {}
+        # chat_id -> очереди по приоритетам
+        self._pending = {}
+        # Чаты с сообщениями: готовые к отправке (приоритет, seq, chat_id)
+        # и ждущие токен своей корзины (время, seq, chat_id); _state — где чат сейчас
+        self._ready = []
+        self._delayed = []
+        self._state = {}
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._pruned_at = clock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closed = False
+        self._sending = set()
+
+    async def initialize(self):
+        if self._task is None:
+            self._closed = False
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._task is not None:
+            # Флаг нужен, потому что wait_for может поглотить отмену задачи
+            self._closed = True
+            self._wakeup.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for queues in self._pending.values():
+            for queue in queues:
+                for item in queue:
+                    if not item.future.done():
+                        item.future.cancel()
+        self._pending.clear()
+
+    def backlog(self):
+        return sum(len(queue) for queues in self._pending.values() for queue in queues)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+        priority = BULK if rate_limit_args == BULK else INTERACTIVE
+        item = _OutboundItem(
+            callback, args, kwargs, asyncio.get_running_loop().create_future(), priority, self.clock()
+        )
+        self._pending.setdefault(chat_id, ([], []))
+        self._pending[chat_id][priority].append(item)
+        BOT_OUTBOUND_BACKLOG.labels(priority=PRIORITY_NAMES[priority]).inc()
+        self._mark_ready(chat_id)
+        return await item.future
+
+    def _head_priority(self, chat_id):
+        queues = self._pending.get(chat_id)
+        if queues is None:
+            return None
+        for priority, queue in enumerate(queues):
+            if queue:
+                return priority
+        return None
+
+    def _mark_ready(self, chat_id):
+        # Запись в куче может устареть (приоритет вырос); лишние записи отбрасываются при выборке
+        state = self._state.get(chat_id)
+        if state in ("busy", "delayed"):
+            return
+        priority = self._head_priority(chat_id)
+        if priority is None:
+            return
+        self._state[chat_id] = "ready"
+        heapq.heappush(self._ready, (priority, next(self._seq), chat_id))
+        self._wakeup.set()
+
+    def _bucket(self, chat_id, now: float):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            group = isinstance(chat_id, int) and chat_id < 0
+            rate = self.group_rate if group else self.chat_rate
+            bucket = self._buckets[chat_id] = TokenBucket(rate, self.chat_burst, now)
+        return bucket
+
+    def _prune(self, now: float):
+        # Корзины простаивающих чатов удаляются, когда снова полны
+        for chat_id in [chat_id for chat_id, bucket in self._buckets.items()
+                        if chat_id not in self._state and bucket.is_full(now)]:
+            del self._buckets[chat_id]
+            self._pending.pop(chat_id, None)
+        self._pruned_at = now
+
+    async def _dispatch(self):
+        while not self._closed:
+            now = self.clock()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, chat_id = heapq.heappop(self._delayed)
+                if self._state.get(chat_id) == "delayed":
+                    del self._state[chat_id]
+                    self._mark_ready(chat_id)
+            if now - self._pruned_at > 60:
+                self._prune(now)
+
+            timeout = None
+            if self._ready and self._in_flight < self.max_in_flight:
+                wait = max(self._global.delay(now), self._paused_until - now)
+                if wait <= 0:
+                    self._start_next(now)
+                    continue
+                timeout = wait
+            elif self._delayed:
+                timeout = self._delayed[0][0] - now
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start_next(self, now: float):
+        _, _, chat_id = heapq.heappop(self._ready)
+        priority = self._head_priority(chat_id)
+        if self._state.get(chat_id) != "ready" or priority is None:
+            return
+        bucket = self._bucket(chat_id, now)
+        wait = bucket.delay(now)
+        if wait > 0:
+            self._state[chat_id] = "delayed"
+            heapq.heappush(self._delayed, (now + wait, next(self._seq), chat_id))
+            return
+        bucket.take(now)
+        self._global.take(now)
+        item = self._pending[chat_id][priority].pop(0)
+        BOT_OUTBOUND_BACKLOG.labels(priority=PRIORITY_NAMES[priority]).dec()
+        self._state[chat_id] = "busy"
+        self._in_flight += 1
+        task = asyncio.create_task(self._send(chat_id, item))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, chat_id, item: _OutboundItem):
+        priority = PRIORITY_NAMES[item.priority]
+        BOT_OUTBOUND_WAIT.labels(priority=priority).observe(self.clock() - item.enqueued_at)
+        try:
+            result = await item.callback(*item.args, **item.kwargs)
+            BOT_OUTBOUND_SENT.labels(priority=priority, status="ok").inc()
+            if not item.future.done():
+                item.future.set_result(result)
+        except RetryAfter as e:
+            # Пауза для всей очереди: флуд-контроль Telegram действует на бота целиком
+            BOT_OUTBOUND_SENT.labels(priority=priority, status="retry_after").inc()
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            self._paused_until = max(self._paused_until, self.clock() + retry_after)
+            logger.warning(f"Bot API flood control, pausing outbound queue for {retry_after}s")
+            item.attempts += 1
+            if item.attempts > self.max_retries:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            else:
+                self._pending.setdefault(chat_id, ([], []))[item.priority].insert(0, item)
+                BOT_OUTBOUND_BACKLOG.labels(priority=priority).inc()
+        except Exception as e:
+            BOT_OUTBOUND_SENT.labels(priority=priority, status="error").inc()
+            if not item.future.done():
+                item.future.set_exception(e)
+        finally:
+            self._in_flight -= 1
+            del self._state[chat_id]
+            self._mark_ready(chat_id)
+            self._wakeup.set()
+
+def setup_bot(webhook: bool = False):
     """Настройка и запуск бота"""
     try:
-        application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        builder = Application.builder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(BOT_CONCURRENT_UPDATES)
+        builder = builder.rate_limiter(OutboundQueue())
+        if TELEGRAM_BASE_URL:
+            builder = builder.base_url(TELEGRAM_BASE_URL)
+        if webhook:
+            # Обновления приходят через FastAPI, Updater для polling не нужен
+            builder = builder.updater(None)
+        else:
+            builder = builder.post_init(start_reminders).post_shutdown(stop_reminders)
+        application = builder.build()
         
         # Регистрация обработчиков команд
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("stats", stats))
-        application.add_handler(CommandHandler("sober", sober))
-        application.add_handler(CommandHandler("app", app))
+        application.add_handler(CommandHandler("start", track_bot_handler("start")(start)))
+        application.add_handler(CommandHandler("help", track_bot_handler("help")(help_command)))
+        application.add_handler(CommandHandler("stats", track_bot_handler("stats")(stats)))
+        application.add_handler(CommandHandler("sober", track_bot_handler("sober")(sober)))
+        application.add_handler(CommandHandler("bac", track_bot_handler("bac")(bac_command)))
+        application.add_handler(CommandHandler("app", track_bot_handler("app")(app)))
         
         # Регистрация обработчика callback-запросов
-        application.add_handler(CallbackQueryHandler(button_callback))
+        application.add_handler(CallbackQueryHandler(track_bot_handler("button")(button_callback)))
         
         return application
     except Exception as e:
         logger.error(f"Error setting up bot: {str(e)}")
         raise
 
+async def start_reminders(application: Application):
+    """Запуск планировщика напоминаний вместе с ботом"""
+    if BOT_REMINDERS:
+        scheduler = ReminderScheduler(application.bot, rate_limit_args=BULK)
+        scheduler.start()
+        application.bot_data["reminders"] = scheduler
+
+async def stop_reminders(application: Application):
+    scheduler = application.bot_data.pop("reminders", None)
+    if scheduler is not None:
+        await scheduler.stop()
+
+async def start_webhook(application: Application):
+    """Запуск приложения бота в режиме webhook"""
+    await application.initialize()
+    if TELEGRAM_WEBHOOK_URL:
+        await application.bot.set_webhook(
+            url=TELEGRAM_WEBHOOK_URL,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+    await application.start()
+    await start_reminders(application)
+
+async def stop_webhook(application: Application):
+    """Остановка приложения бота в режиме webhook"""
+    await stop_reminders(application)
+    await application.stop()
+    await application.shutdown()
+
+async def feed_update(application: Application, data: dict):
+    """Передача обновления из webhook в очередь приложения бота"""
+    update = Update.de_json(data, application.bot)
+    await application.update_queue.put(update)
+
 # Запуск бота
 if __name__ == "__main__":
+    # В режиме polling метрики отдаются отдельным HTTP-сервером
+    if os.getenv("BOT_METRICS_PORT"):
+        from prometheus_client import start_http_server
+
+        start_http_server(int(os.getenv("BOT_METRICS_PORT")))
+    instrument_engine(async_engine.sync_engine)
+    for replica_engine in replicas.engines:
+        instrument_engine(replica_engine.sync_engine)
     bot = setup_bot()
     bot.run_polling() 
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""Генератор синтетических данных для нагрузочных тестов.
+
+Создает пользователей с историей напитков, периодов трезвости и целей.
+Данные детерминированы (seed), поэтому прогоны на разных коммитах сравнимы.
+"""
+from datetime import datetime, timedelta
+import random
+
+from sqlalchemy import insert
+
+from app import crud, models
+
+TELEGRAM_ID_OFFSET = 100000
+
+DRINK_TYPES = [
+    # (тип, объем в мл, крепость в %, цена)
+    ("beer", 500, 5.0, 150.0),
+    ("wine_red", 150, 13.0, 300.0),
+    ("wine_white", 150, 12.0, 280.0),
+    ("vodka", 50, 40.0, 120.0),
+    ("whiskey", 50, 40.0, 400.0),
+    ("cocktail", 250, 10.0, 500.0),
+]
+
+def generate(db, users: int = 100, drinks_per_user: int = 500, history_days: int = 730, seed: int = 42):
+    """Заполнить базу и вернуть список telegram_id созданных пользователей"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    user_rows = [
+        {
+            "telegram_id": TELEGRAM_ID_OFFSET + i,
+            "username": f"bench_{i}",
+            "first_name": "Bench",
+            "created_at": now - timedelta(days=history_days),
+            "settings": {},
+            "stats_version": 0
+        }
+        for i in range(users)
+    ]
+    user_ids = db.execute(
+        insert(models.User.__table__).returning(models.User.id), user_rows
+    ).scalars().all()
+
+    drink_rows, period_rows, goal_rows = [], [], []
+    for user_id in user_ids:
+        # Напитки распределены неравномерно: у части пользователей история заметно длиннее
+        count = max(1, int(rng.expovariate(1 / drinks_per_user)))
+        for _ in range(count):
+            drink_type, volume, alcohol, price = rng.choice(DRINK_TYPES)
+            drink_rows.append({
+                "user_id": user_id,
+                "drink_type": drink_type,
+                "volume": float(volume),
+                "alcohol_content": alcohol,
+                "price": price,
+                "location": None,
+                "mood": None,
+                "comment": None,
+                "created_at": now - timedelta(minutes=rng.randrange(history_days * 24 * 60))
+            })
+
+        start = now - timedelta(days=history_days)
+        while start < now:
+            length = timedelta(days=rng.randint(1, 60))
+            end = start + length
+            active = end >= now
+            period_rows.append({
+                "user_id": user_id,
+                "start_time": start,
+                "end_time": None if active else end,
+                "is_active": active
+            })
+            start = end + timedelta(days=rng.randint(1, 30))
+
+        for goal_type, target in (("sober_days", 30.0), ("drinks_limit", 10.0), ("spending_limit", 5000.0)):
+            goal_rows.append({
+                "user_id": user_id,
+                "type": goal_type,
+                "target_value": target,
+                "period": rng.choice(["daily", "weekly", "monthly"]),
+                "start_date": now - timedelta(days=rng.randint(0, history_days)),
+                "end_date": None,
+                "is_active": True
+            })
+
+    for table, rows in (
+        (models.Drink.__table__, drink_rows),
+        (models.SoberPeriod.__table__, period_rows),
+        (models.Goal.__table__, goal_rows),
+    ):
+        for i in range(0, len(rows), 10000):
+            db.execute(insert(table), rows[i:i + 10000])
+    db.commit()
+
+    crud.rebuild_daily_stats(db)
+    return [row["telegram_id"] for row in user_rows], len(drink_rows)
@@ -0,0 +1,203 @@
+"""Нагрузочный прогон API и обработчиков бота.
+
+Пример:
+    python -m benchmarks.run --users 200 --drinks-per-user 500 --requests 300
+    python -m benchmarks.run --save-baseline            # записать benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+По умолчанию используется временная база SQLite; для PostgreSQL передайте
+--database-url (база будет очищена).
+"""
+import argparse
+from datetime import datetime
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+class FakeMessage:
+    """Заглушка telegram.Message: ответы сохраняются, а не отправляются"""
+
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+def fake_update(telegram_id: int):
+    user = SimpleNamespace(id=telegram_id, username=None, first_name="Bench", last_name=None)
+    return SimpleNamespace(effective_user=user, message=FakeMessage(), callback_query=None)
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+def summarize(latencies, elapsed):
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "mean_ms": statistics.fmean(values) * 1000,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "throughput_rps": len(values) / elapsed if elapsed else 0.0
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+def build_scenarios(client, rng, user_ids, telegram_ids):
+    from app import telegram_bot
+
+    def statistics_endpoint():
+        client.get("/statistics/", params={"user_id": rng.choice(user_ids)})
+
+    def range_stats():
+        client.get("/stats", params={"user_id": rng.choice(user_ids), "bucket": "week"})
+
+    def list_drinks():
+        client.get("/drinks/", params={"user_id": rng.choice(user_ids), "limit": 100})
+
+    def create_drink():
+        client.post("/drinks/", json={
+            "user_id": rng.choice(user_ids),
+            "drink_type": "beer",
+            "volume": 500,
+            "alcohol_content": 5,
+            "price": 150
+        })
+
+    def bot_stats():
+        update = fake_update(rng.choice(telegram_ids))
+        client.portal.call(telegram_bot.stats, update, SimpleNamespace(user_data={}))
+
+    return {
+        "GET /statistics/": statistics_endpoint,
+        "GET /stats": range_stats,
+        "GET /drinks/": list_drinks,
+        "POST /drinks/": create_drink,
+        "bot /stats": bot_stats,
+    }
+
+def run_scenario(func, requests: int, warmup: int):
+    for _ in range(warmup):
+        func()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, time.perf_counter() - started)
+
+def compare(results, baseline, threshold: float):
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        change = current["p95_ms"] / previous["p95_ms"] - 1 if previous["p95_ms"] else 0.0
+        marker = "REGRESSION" if change > threshold else ""
+        print(f"{name:<20} p95 {previous['p95_ms']:8.2f} -> {current['p95_ms']:8.2f} ms ({change:+.0%}) {marker}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="AlcoControl benchmark suite")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--drinks-per-user", type=int, default=500)
+    parser.add_argument("--history-days", type=int, default=730)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="файл для результатов в JSON")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", default=None, help="файл базовых результатов")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимый рост p95")
+    args = parser.parse_args()
+
+    tmpdir = None
+    if args.database_url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    # Переменные окружения нужно задать до импорта app
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+    from fastapi.testclient import TestClient
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    from app import models
+    from app.database import SessionLocal, engine
+    from app.main import app
+    from benchmarks import datagen
+
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    started = time.perf_counter()
+    telegram_ids, drinks = datagen.generate(
+        db, users=args.users, drinks_per_user=args.drinks_per_user,
+        history_days=args.history_days, seed=args.seed
+    )
+    user_ids = [user_id for (user_id,) in db.query(models.User.id)]
+    db.close()
+    print(f"Generated {len(user_ids)} users, {drinks} drinks in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(args.seed)
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.utcnow().isoformat(),
+            "database": args.database_url.split(":", 1)[0],
+            "users": args.users,
+            "drinks": drinks,
+            "requests": args.requests
+        },
+        "scenarios": {}
+    }
+    with TestClient(app) as client:
+        for name, func in build_scenarios(client, rng, user_ids, telegram_ids).items():
+            summary = run_scenario(func, args.requests, args.warmup)
+            results["scenarios"][name] = summary
+            print(
+                f"{name:<20} p50 {summary['p50_ms']:8.2f}  p95 {summary['p95_ms']:8.2f}  "
+                f"p99 {summary['p99_ms']:8.2f} ms  {summary['throughput_rps']:8.1f} req/s"
+            )
+
+    output = DEFAULT_BASELINE if args.save_baseline else args.output
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            exit_code = 1
+    if tmpdir:
+        tmpdir.cleanup()
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
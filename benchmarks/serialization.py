@@ -0,0 +1,108 @@
+"""Стоимость одной строки в списочных эндпоинтах: ORM + pydantic против строк + orjson.
+
+Прежний путь: ORM-объекты страницы, валидация схемы страницы из атрибутов
+(from_attributes), сериализация в JSON-совместимые значения и json.dumps, как это
+делают FastAPI и JSONResponse. Быстрый путь: только колонки схемы кортежами и
+ORJSONResponse. Для каждой таблицы печатается время на строку по этапам.
+
+Пример:
+    python -m benchmarks.serialization --users 20 --drinks-per-user 500 --limit 500
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def measure(func, repeat: int):
+    # Медиана по повторам устойчивее к паузам сборщика мусора
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="List endpoint serialization benchmark")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--drinks-per-user", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=500, help="строк на странице")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    tmpdir = None
+    if args.database_url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+    from fastapi.responses import ORJSONResponse
+
+    from app import crud, models, schemas
+    from app.database import SessionLocal, engine
+    from benchmarks import datagen
+
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    datagen.generate(db, users=args.users, drinks_per_user=args.drinks_per_user, seed=args.seed)
+
+    tables = {
+        "drinks": (crud.get_drinks, crud.get_drink_rows, schemas.DrinkPage),
+        "sober_periods": (crud.get_sober_periods, crud.get_sober_period_rows, schemas.SoberPeriodPage),
+        "goals": (crud.get_goals, crud.get_goal_rows, schemas.GoalPage),
+    }
+
+    print(f"{'table':<14} {'rows':>5} {'path':<6} {'query':>9} {'encode':>9} {'total':>9}  us/row")
+    for name, (orm_page, row_page, page_schema) in tables.items():
+        # Без user_id: страница заполняется до limit даже на малых данных
+        rows = len(row_page(db, limit=args.limit)[0])
+        if not rows:
+            continue
+
+        def orm_query():
+            db.expunge_all()
+            return orm_page(db, limit=args.limit)
+
+        def row_query():
+            return row_page(db, limit=args.limit)
+
+        items, next_cursor = orm_query()
+        fast_items, _ = row_query()
+
+        def orm_encode():
+            page = page_schema.model_validate({"items": items, "next_cursor": next_cursor})
+            json.dumps(page.model_dump(mode="json"), ensure_ascii=False, allow_nan=False,
+                       separators=(",", ":")).encode("utf-8")
+
+        def row_encode():
+            ORJSONResponse({"items": fast_items, "next_cursor": next_cursor}).body
+
+        # Оба пути отдают одинаковый JSON
+        before = page_schema.model_validate({"items": items, "next_cursor": next_cursor}).model_dump(mode="json")
+        after = json.loads(ORJSONResponse({"items": fast_items, "next_cursor": next_cursor}).body)
+        assert before == after, f"{name}: responses differ"
+
+        for path, query, encode in (("orm", orm_query, orm_encode), ("rows", row_query, row_encode)):
+            query_time = measure(query, args.repeat)
+            encode_time = measure(encode, args.repeat)
+            total = query_time + encode_time
+            print(
+                f"{name:<14} {rows:>5} {path:<6} {query_time * 1000:7.2f}ms {encode_time * 1000:7.2f}ms "
+                f"{total * 1000:7.2f}ms  {total / rows * 1e6:6.1f}"
+            )
+
+    db.close()
+    if tmpdir:
+        tmpdir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -40,15 +40,31 @@ ChartJS.register(
   ArcElement
 );
 
+interface StatsBucket {
+  date: string;
+  count: number;
+  volume: number;
+  alcohol: number;
+  spent: number;
+}
+
 interface DrinkStats {
   total_drinks: number;
   total_volume: number;
   total_alcohol: number;
   total_spent: number;
   drinks_by_type: { [key: string]: number };
-  drinks_by_day: { [key: string]: number };
+  bucket: 'day' | 'week' | 'month';
+  daily_stats: StatsBucket[];
 }
 
+// Для длинных периодов сервер агрегирует ряд крупнее, чтобы не тянуть каждую точку
+const periodParams: { [key: string]: { days: number; bucket: string } } = {
+  week: { days: 7, bucket: 'day' },
+  month: { days: 30, bucket: 'day' },
+  year: { days: 365, bucket: 'week' },
+};
+
 const Statistics: React.FC = () => {
   const [period, setPeriod] = useState('week');
   const [stats, setStats] = useState<DrinkStats | null>(null);
@@ -60,7 +76,13 @@ const Statistics: React.FC = () => {
 
   const fetchStats = async () => {
     try {
-      const response = await axios.get(`/api/statistics?period=${period}`);
+      const { days, bucket } = periodParams[period];
+      const response = await axios.get('/api/stats', {
+        params: {
+          start_date: format(subDays(new Date(), days), 'yyyy-MM-dd'),
+          bucket,
+        },
+      });
       setStats(response.data);
     } catch (error) {
       console.error('Error fetching statistics:', error);
@@ -115,13 +137,13 @@ const Statistics: React.FC = () => {
   };
 
   const drinksByDayData = {
-    labels: Object.keys(stats.drinks_by_day).map(date =>
-      format(new Date(date), 'dd MMM', { locale: ru })
+    labels: stats.daily_stats.map(item =>
+      format(new Date(item.date), 'dd MMM', { locale: ru })
     ),
     datasets: [
       {
         label: 'Количество напитков',
-        data: Object.values(stats.drinks_by_day),
+        data: stats.daily_stats.map(item => item.count),
         borderColor: '#2196f3',
         backgroundColor: 'rgba(33, 150, 243, 0.5)',
       },
@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+# Движки создаются при импорте app.database, поэтому база задается до импорта app.
+# Без DATABASE_URL тесты идут на временной SQLite; в CI — на PostgreSQL
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123:test")
+
+import pytest
+
+from app import crud, models, percentiles, schemas
+from app.database import SessionLocal, async_engine, engine
+from app.stats_cache import MemoryBackend, stats_cache
+
+def reset_async_pool():
+    # Соединения asyncpg/aiosqlite привязаны к event loop, а у каждого теста он свой
+    async_engine.sync_engine.dispose(close=False)
+
+@pytest.fixture
+def db():
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    # id и stats_version начинаются заново, поэтому кэши прошлых тестов сбрасываются
+    crud.user_cache.clear()
+    stats_cache.backend = MemoryBackend()
+    percentiles.sketch_cache.clear()
+    reset_async_pool()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+
+    from app.main import create_app
+
+    with TestClient(create_app(bot_mode="polling")) as client:
+        yield client
+    reset_async_pool()
+
+@pytest.fixture
+def user(db):
+    return crud.create_user(db, schemas.UserCreate(telegram_id=1000, username="user"))
+
+@pytest.fixture
+def bot_api(monkeypatch):
+    from app import telegram_bot
+    from fake_bot_api import FakeBotAPI
+
+    api = FakeBotAPI().start()
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_BASE_URL", api.base_url)
+    yield api
+    api.stop()
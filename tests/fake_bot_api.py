@@ -0,0 +1,106 @@
+"""Заглушка Telegram Bot API для тестов бота (TELEGRAM_BASE_URL).
+
+Записывает вызовы с временем получения; ответ на метод можно подменить,
+например вернуть 429 с retry_after.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+BOT_USER = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "AlcoControl",
+    "username": "alcocontrol_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False
+}
+
+class FakeBotAPI:
+    def __init__(self):
+        self.calls = []
+        # метод -> функция(params) -> (HTTP-статус, тело ответа) или None для ответа по умолчанию
+        self.handlers = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/bot"
+
+    def start(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1]
+                body = self.rfile.read(int(self.headers.get("content-length", 0))).decode()
+                if self.headers.get("content-type", "").startswith("application/json"):
+                    params = json.loads(body or "{}")
+                else:
+                    params = dict(parse_qsl(body))
+                with api._lock:
+                    api.calls.append((time.monotonic(), method, params))
+                status, result = api.respond(method, params)
+                payload = json.dumps(result).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, method, params):
+        handler = self.handlers.get(method)
+        response = handler(params) if handler else None
+        if response is not None:
+            return response
+        if method == "getMe":
+            return 200, {"ok": True, "result": BOT_USER}
+        if method == "sendMessage":
+            result = {
+                "message_id": len(self.calls),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "text": params.get("text", "")
+            }
+            return 200, {"ok": True, "result": result}
+        return 200, {"ok": True, "result": True}
+
+    def sent(self, method="sendMessage"):
+        with self._lock:
+            return [(at, params) for at, name, params in self.calls if name == method]
+
+    def wait_for(self, predicate, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if predicate():
+                return True
+            time.sleep(0.02)
+        return predicate()
+
+def message_update(update_id: int, chat_id: int, text: str):
+    """Обновление Telegram с текстовым сообщением (команда, если начинается с /)"""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Test", "username": f"user{chat_id}"},
+        "text": text
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
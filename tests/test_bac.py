@@ -0,0 +1,36 @@
+def test_bac_accepts_timezone_aware_bounds(client, user):
+    response = client.post("/drinks/batch", json=[{
+        "user_id": user.id,
+        "drink_type": "vodka",
+        "volume": 200,
+        "alcohol_content": 40,
+        "created_at": "2024-03-01T20:00:00Z"
+    }])
+    assert response.json()["created"] == 1
+
+    naive = client.get("/bac", params={
+        "user_id": user.id, "start": "2024-03-01T19:00:00", "end": "2024-03-02T03:00:00"
+    })
+    assert naive.status_code == 200
+    for start, end in (
+        ("2024-03-01T19:00:00Z", "2024-03-02T03:00:00Z"),
+        ("2024-03-01T22:00:00+03:00", "2024-03-02T03:00:00"),
+    ):
+        aware = client.get("/bac", params={"user_id": user.id, "start": start, "end": end})
+        assert aware.status_code == 200
+        assert aware.json() == naive.json()
+    timeline = naive.json()
+    assert timeline["start"] == "2024-03-01T19:00:00"
+    assert timeline["peak"] > 0
+    assert "2024-03-01T20:00:00" <= timeline["peak_at"] <= "2024-03-01T23:00:00"
+
+    # Только одна граница с поясом: конец по умолчанию сейчас, в UTC
+    params = {"user_id": user.id, "start": "2024-03-01T19:00:00+00:00", "step_minutes": 1440}
+    assert client.get("/bac", params=params).status_code == 200
+
+def test_bac_rejects_invalid_ranges(client, user):
+    params = {"user_id": user.id, "start": "2024-03-02T00:00:00+03:00", "end": "2024-03-01T21:00:00Z"}
+    assert client.get("/bac", params=params).status_code == 400
+    params = {"user_id": user.id, "start": "2000-01-01T00:00:00Z", "end": "2024-01-01T00:00:00Z", "step_minutes": 1}
+    assert client.get("/bac", params=params).status_code == 400
+    assert client.get("/bac", params={"user_id": user.id + 1}).status_code == 404
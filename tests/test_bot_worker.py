@@ -0,0 +1,153 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import jobs, telegram_bot
+from app.bot_worker import BotWorker
+from app.database import SessionLocal
+from app.main import create_app
+
+from conftest import reset_async_pool
+from fake_bot_api import message_update
+
+NOW = datetime(2026, 10, 18, 12, 0)
+TTL = timedelta(seconds=30)
+
+def test_lease_acquire_renew_and_expiry(db):
+    assert jobs.acquire_lease(db, "bot", "a", TTL, now=NOW) == 1
+    # Занятую аренду другой держатель не получает, владелец продлевает без смены номера
+    assert jobs.acquire_lease(db, "bot", "b", TTL, now=NOW + timedelta(seconds=10)) is None
+    assert jobs.acquire_lease(db, "bot", "a", TTL, now=NOW + timedelta(seconds=20)) == 1
+    assert jobs.acquire_lease(db, "bot", "b", TTL, now=NOW + timedelta(seconds=49)) is None
+
+    # Не продленная аренда истекает и переходит к другому держателю с новым номером
+    assert jobs.acquire_lease(db, "bot", "b", TTL, now=NOW + timedelta(seconds=51)) == 2
+    assert jobs.acquire_lease(db, "bot", "a", TTL, now=NOW + timedelta(seconds=52)) is None
+    lease = jobs.get_lease(db, "bot")
+    assert (lease.holder, lease.token, lease.expires_at) == ("b", 2, NOW + timedelta(seconds=81))
+
+def test_released_lease_is_taken_immediately(db):
+    assert jobs.acquire_lease(db, "bot", "a", TTL) == 1
+    assert jobs.acquire_lease(db, "bot", "b", TTL) is None
+    jobs.release_lease(db, "bot", "a")
+    assert jobs.acquire_lease(db, "bot", "b", TTL, now=datetime.utcnow() + timedelta(milliseconds=1)) == 2
+
+def test_concurrent_first_acquire_has_one_winner(db):
+    other = SessionLocal()
+    try:
+        assert jobs.acquire_lease(db, "bot", "a", TTL, now=NOW) == 1
+        assert jobs.acquire_lease(other, "bot", "b", TTL, now=NOW) is None
+    finally:
+        other.close()
+
+def test_job_of_dead_worker_is_retried_after_lock(db, monkeypatch):
+    monkeypatch.setattr(jobs, "BOT_JOB_LOCK_SECONDS", 60)
+    first = jobs.enqueue_job(db, "update", {"update_id": 1}, dedupe_key="update:1")
+    assert jobs.enqueue_job(db, "update", {"update_id": 1}, dedupe_key="update:1") is None
+    second = jobs.enqueue_job(db, "reschedule", {"user_id": 1})
+
+    claimed = jobs.claim_jobs(db, "dead", now=NOW)
+    assert [job["id"] for job in claimed] == [first, second]
+    # Воркер упал, не завершив задания: пока они взяты, другим не выдаются
+    assert jobs.claim_jobs(db, "alive", now=NOW + timedelta(seconds=59)) == []
+
+    retried = jobs.claim_jobs(db, "alive", limit=1, now=NOW + timedelta(seconds=61))
+    assert [(job["id"], job["attempts"]) for job in retried] == [(first, 2)]
+    jobs.complete_jobs(db, [first])
+    assert jobs.pending_jobs(db) == {"reschedule": 1}
+
+def test_failed_job_backs_off_and_stops_after_max_attempts(db, monkeypatch):
+    monkeypatch.setattr(jobs, "BOT_JOB_MAX_ATTEMPTS", 2)
+    job_id = jobs.enqueue_job(db, "update", {"update_id": 1})
+
+    [job] = jobs.claim_jobs(db, "worker", now=NOW)
+    jobs.retry_job(db, job_id, job["attempts"], "boom", now=NOW)
+    assert jobs.claim_jobs(db, "worker", now=NOW + timedelta(seconds=1)) == []
+    [job] = jobs.claim_jobs(db, "worker", now=NOW + timedelta(seconds=2))
+    assert job["attempts"] == 2
+
+    jobs.retry_job(db, job_id, job["attempts"], "boom", now=NOW + timedelta(seconds=2))
+    assert jobs.claim_jobs(db, "worker", now=NOW + timedelta(days=1)) == []
+    assert jobs.pending_jobs(db) == {}
+
+def worker(holder: str, **kwargs):
+    kwargs.setdefault("updates", "webhook")
+    kwargs.setdefault("lease_seconds", 0.6)
+    kwargs.setdefault("jobs_interval", 0.05)
+    return BotWorker(holder=holder, **kwargs)
+
+async def wait_until(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+@pytest.fixture
+def bot_env(db, bot_api, monkeypatch):
+    monkeypatch.setattr(telegram_bot, "BOT_REMINDERS", False)
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_WEBHOOK_URL", None)
+    return bot_api
+
+def test_worker_stops_bot_soon_after_losing_lease(bot_env):
+    async def scenario():
+        holder = worker("a")
+        task = asyncio.create_task(holder.run())
+        await wait_until(lambda: holder.application is not None)
+
+        # Другой процесс забирает аренду (например, после паузы держателя)
+        with SessionLocal() as db:
+            assert jobs.acquire_lease(
+                db, jobs.BOT_LEASE_NAME, "b", timedelta(seconds=60), now=datetime.utcnow() + timedelta(minutes=1)
+            ) == holder.token + 1
+        lost_at = time.monotonic()
+        await wait_until(lambda: holder.application is None)
+        stopped_after = time.monotonic() - lost_at
+
+        holder.stop()
+        await asyncio.wait_for(task, 5)
+        return stopped_after
+
+    # Проверка аренды идет каждую треть срока
+    assert asyncio.run(scenario()) < 0.6 / 3 + 0.3
+
+def test_standby_takes_over_and_processes_queued_updates(bot_env, monkeypatch):
+    monkeypatch.setattr(jobs, "BOT_JOB_LOCK_SECONDS", 0.5)
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_WEBHOOK_SECRET", None)
+
+    # Процесс API в режиме worker кладет обновления в очередь, повтор доставки отбрасывается
+    with TestClient(create_app(bot_mode="worker")) as client:
+        for update_id in (1, 1, 2):
+            assert client.post("/telegram/webhook", json=message_update(update_id, 700, "/help")).status_code == 200
+    with SessionLocal() as db:
+        assert jobs.pending_jobs(db) == {"update": 2}
+        # Упавший воркер успел взять первое обновление
+        assert len(jobs.claim_jobs(db, "dead", limit=1)) == 1
+
+    async def scenario():
+        # Упавший держатель: аренда не освобождается, резерв ждет ее истечения
+        crashed, standby = worker("a"), worker("b")
+        crashed._release = lambda: asyncio.sleep(0)
+        first = asyncio.create_task(crashed.run())
+        await wait_until(lambda: crashed.application is not None)
+        second = asyncio.create_task(standby.run())
+        crashed.stop()
+        await asyncio.wait_for(first, 5)
+        crashed_at = time.monotonic()
+
+        await wait_until(lambda: standby.application is not None)
+        took_over_after = time.monotonic() - crashed_at
+        await wait_until(lambda: len(bot_env.sent()) == 2)
+        standby.stop()
+        await asyncio.wait_for(second, 5)
+        return took_over_after
+
+    reset_async_pool()
+    took_over_after = asyncio.run(scenario())
+    assert 0.3 < took_over_after < 2.0
+    assert [int(params["chat_id"]) for _, params in bot_env.sent()] == [700, 700]
+    with SessionLocal() as db:
+        assert jobs.pending_jobs(db) == {}
@@ -0,0 +1,107 @@
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import crud, models, percentiles, schemas
+from app.database import SessionLocal, engine
+
+pytestmark = pytest.mark.skipif(
+    engine.dialect.name != "postgresql",
+    reason="на SQLite записи идут по одной, гонки первой вставки нет"
+)
+
+ROUNDS = 10
+
+def run_concurrently(work, workers: int = 4):
+    """work(session, worker) во всех потоках сразу, каждый в своей транзакции"""
+    barrier = threading.Barrier(workers)
+    errors = []
+
+    def run(worker):
+        session = SessionLocal()
+        try:
+            barrier.wait()
+            work(session, worker)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            errors.append(e)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=run, args=(worker,)) for worker in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+def drink_row(user_id: int, created_at: datetime, drink_type: str = "beer"):
+    return {
+        "user_id": user_id, "drink_type": drink_type, "volume": 500.0,
+        "alcohol_content": 5.0, "price": 2.0, "created_at": created_at
+    }
+
+def test_first_daily_stats_row_of_a_day(db, user):
+    # Каждый раунд — новый день, строки user_daily_stats еще нет ни у одного потока
+    for day in range(ROUNDS):
+        at = datetime(2026, 1, 1, 12) + timedelta(days=day)
+        errors = run_concurrently(lambda session, worker: crud.apply_drinks_to_daily_stats(
+            session, [drink_row(user.id, at, "beer" if worker % 2 else "wine")]
+        ))
+        assert errors == []
+
+    rows = crud.get_user_daily_stats(db, user.id)
+    assert [row.day for row in rows] == [date(2026, 1, 1) + timedelta(days=day) for day in range(ROUNDS)]
+    for row in rows:
+        assert row.drinks_count == 4
+        assert row.total_volume == 2000
+        assert row.total_alcohol == 100
+        assert row.total_spent == 8
+        assert row.drinks_by_type == {"beer": 2, "wine": 2}
+
+def test_first_streak_row_of_a_user(db):
+    users = [
+        crud.create_user(db, schemas.UserCreate(telegram_id=2000 + i, username=f"user{i}"))
+        for i in range(ROUNDS)
+    ]
+    # Каждый раунд — новый пользователь без строки user_streaks
+    for i, user in enumerate(users):
+        at = datetime(2026, 1, 1, 12) + timedelta(hours=i)
+        errors = run_concurrently(lambda session, worker: crud.apply_drinks_to_streaks(
+            session, [{"user_id": user.id, "created_at": at + timedelta(minutes=worker)}]
+        ))
+        assert errors == []
+
+    for i, user in enumerate(users):
+        db.expire_all()
+        streak = crud.get_user_streak(db, user.id)
+        assert streak.last_drink_at == datetime(2026, 1, 1, 12) + timedelta(hours=i, minutes=3)
+        assert streak.current_start is None
+
+def test_first_sketch_bin(db):
+    # Каждый раунд — новая корзина, которой еще нет в population_sketch_bins
+    for index in range(ROUNDS):
+        key = ("alcohol", "weekly", date(2026, 10, 12), 0, index)
+        errors = run_concurrently(lambda session, worker: percentiles._apply_bin_changes(session, {key: 1}))
+        assert errors == []
+
+    table = models.PopulationSketchBin
+    assert sorted(db.query(table.bin, table.count)) == [(index, 4) for index in range(ROUNDS)]
+
+def test_concurrent_first_drinks_of_a_user(db):
+    # Сводка дня, серия и корзины скетча создаются одновременно несколькими пачками
+    for i in range(ROUNDS):
+        user = crud.create_user(db, schemas.UserCreate(telegram_id=3000 + i, username=f"user{i}"))
+        at = datetime(2026, 1, 5, 12) + timedelta(weeks=i)
+        errors = run_concurrently(lambda session, worker: crud.create_drinks_bulk(session, [
+            schemas.DrinkImport(**drink_row(user.id, at + timedelta(minutes=worker)))
+        ]))
+        assert errors == []
+
+        [daily] = crud.get_user_daily_stats(db, user.id)
+        assert daily.drinks_count == 4
+        assert crud.get_user_streak(db, user.id).last_drink_at == at + timedelta(minutes=3)
+        # Пользователь учтен в скетче недели один раз
+        assert percentiles.get_sketch(db, "alcohol", "weekly", at.date()).count == 1
@@ -0,0 +1,82 @@
+from datetime import date, datetime
+
+from app import crud, models
+
+def drink(user_id: int, created_at: str):
+    return {
+        "user_id": user_id,
+        "drink_type": "beer",
+        "volume": 500,
+        "alcohol_content": 5,
+        "created_at": created_at
+    }
+
+def test_batch_converts_aware_timestamps_to_naive_utc(client, db, user):
+    first = client.post("/drinks/batch", json=[
+        drink(user.id, "2024-03-01T23:30:00Z"),
+        drink(user.id, "2024-03-02T01:30:00+03:00")
+    ])
+    assert first.status_code == 200
+    assert first.json()["created"] == 2
+
+    # Вторая пачка того же пользователя сравнивается с уже сохраненным временем
+    second = client.post("/drinks/batch", json=[
+        drink(user.id, "2024-03-02T00:30:00+03:00"),
+        drink(user.id, "2024-03-02T08:00:00Z"),
+        drink(user.id, "2024-03-02T09:00:00")
+    ])
+    assert second.status_code == 200
+    assert second.json()["created"] == 3
+    assert second.json()["failed"] == 0
+
+    stored = [at for (at,) in db.query(models.Drink.created_at).order_by(models.Drink.created_at)]
+    assert all(at.tzinfo is None for at in stored)
+    assert stored == [
+        datetime(2024, 3, 1, 21, 30),
+        datetime(2024, 3, 1, 22, 30),
+        datetime(2024, 3, 1, 23, 30),
+        datetime(2024, 3, 2, 8, 0),
+        datetime(2024, 3, 2, 9, 0)
+    ]
+
+    # Дневная сводка раскладывает напитки по дням UTC
+    daily = {row.day: row.drinks_count for row in crud.get_user_daily_stats(db, user.id)}
+    assert daily == {date(2024, 3, 1): 3, date(2024, 3, 2): 2}
+
+def test_batch_reports_unknown_users_and_invalid_items(client, user):
+    response = client.post("/drinks/batch", json=[
+        drink(user.id, "2024-03-01T20:00:00Z"),
+        drink(user.id + 1, "2024-03-01T20:00:00Z"),
+        {"user_id": user.id, "drink_type": "beer"}
+    ])
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["id"] is not None
+    assert results[1]["error"] == "User not found"
+    assert results[2]["error"]
+
+def test_batch_rejects_out_of_range_items_and_keeps_valid_ones(client, db, user):
+    valid = drink(user.id, "2024-03-01T20:00:00Z")
+    response = client.post("/drinks/batch", json=[
+        valid,
+        {**valid, "volume": -5, "alcohol_content": 500},
+        {**valid, "volume": 0},
+        {**valid, "price": -1},
+        {**valid, "alcohol_content": 100, "price": 0},
+        {**valid, "alcohol_content": -0.1}
+    ])
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 4)
+    results = body["results"]
+    assert [result["id"] is not None for result in results] == [True, False, False, False, True, False]
+    assert "volume" in results[1]["error"] and "alcohol_content" in results[1]["error"]
+    assert "volume" in results[2]["error"]
+    assert "price" in results[3]["error"]
+    assert "alcohol_content" in results[5]["error"]
+
+    # В сводку попали только принятые напитки
+    [day] = crud.get_user_daily_stats(db, user.id)
+    assert day.drinks_count == 2
+    assert day.total_volume == 1000
+    assert db.query(models.Drink).count() == 2
@@ -0,0 +1,112 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from app import crud, export, schemas
+
+from conftest import reset_async_pool
+
+START = datetime(2026, 9, 1, 18)
+
+def add_history(db, user_id: int, drinks: int):
+    crud.create_drinks_bulk(db, [
+        schemas.DrinkImport(
+            user_id=user_id, drink_type="beer" if i % 2 else "wine", volume=100 + i, alcohol_content=5,
+            price=2.5 if i % 3 else None, comment="пиво, \"светлое\"" if i == 1 else None,
+            created_at=START + timedelta(minutes=i)
+        )
+        for i in range(drinks)
+    ])
+    crud.create_sober_period(db, schemas.SoberPeriodCreate(
+        user_id=user_id, start_time=START - timedelta(days=10), end_time=START - timedelta(days=2), is_active=False
+    ))
+    crud.create_goal(db, schemas.GoalCreate(
+        user_id=user_id, type="max_drinks", target_value=3, period="weekly", start_date=START
+    ))
+
+def test_csv_export(client, db, user):
+    add_history(db, user.id, 5)
+    other = crud.create_user(db, schemas.UserCreate(telegram_id=2000, username="other"))
+    add_history(db, other.id, 3)
+
+    response = client.get(f"/users/{user.id}/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert f'alcocontrol_user{user.id}.csv' in response.headers["content-disposition"]
+
+    reader = csv.DictReader(io.StringIO(response.text))
+    assert reader.fieldnames == export.CSV_COLUMNS
+    rows = list(reader)
+    assert [row["record_type"] for row in rows] == ["drink"] * 5 + ["sober_period", "goal"]
+
+    drinks = rows[:5]
+    assert [float(row["volume"]) for row in drinks] == [100, 101, 102, 103, 104]
+    assert drinks[1]["comment"] == "пиво, \"светлое\""
+    assert drinks[0]["price"] == "" and drinks[1]["price"] == "2.5"
+    assert drinks[4]["created_at"] == (START + timedelta(minutes=4)).isoformat()
+    assert rows[5]["end_time"] == (START - timedelta(days=2)).isoformat()
+    assert rows[6]["goal_type"] == "max_drinks" and rows[6]["drink_type"] == ""
+
+def test_ndjson_export(client, db, user):
+    add_history(db, user.id, 4)
+
+    response = client.get(f"/users/{user.id}/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["type"] for record in records] == ["drink"] * 4 + ["sober_period", "goal"]
+    assert records[1] == {
+        "type": "drink", "id": records[1]["id"], "drink_type": "beer", "volume": 101.0, "alcohol_content": 5.0,
+        "price": 2.5, "location": None, "mood": None, "comment": "пиво, \"светлое\"",
+        "created_at": (START + timedelta(minutes=1)).isoformat()
+    }
+    assert records[4]["is_active"] is False
+    assert records[5]["target_value"] == 3
+
+def test_export_of_unknown_user(client):
+    assert client.get("/users/999/export").status_code == 404
+
+async def asgi_body_chunks(app, path: str, query: str):
+    """Части тела ответа в том виде, как их отправляет приложение (TestClient склеивает их)"""
+    chunks, done, requested = [], asyncio.Event(), []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query.encode(), "headers": [(b"host", b"testserver")],
+        "server": ("testserver", 80), "client": ("testclient", 50000)
+    }
+
+    async def receive():
+        if not requested:
+            requested.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            if message.get("body"):
+                chunks.append(message["body"].decode())
+            if not message.get("more_body"):
+                done.set()
+
+    await app(scope, receive, send)
+    return chunks
+
+def test_export_streams_in_batches(client, db, user):
+    drinks = export.EXPORT_BATCH_SIZE * 2 + 500
+    add_history(db, user.id, drinks)
+
+    for format in ("csv", "ndjson"):
+        reset_async_pool()
+        chunks = asyncio.run(asgi_body_chunks(client.app, f"/users/{user.id}/export", f"format={format}"))
+        lines = [chunk.count("\n") for chunk in chunks]
+        if format == "csv":
+            # Заголовок уходит отдельной частью до чтения строк
+            assert chunks[0] == ",".join(export.CSV_COLUMNS) + "\r\n"
+            lines = lines[1:]
+        # Напитки — пачками по EXPORT_BATCH_SIZE, затем период трезвости и цель
+        assert lines == [export.EXPORT_BATCH_SIZE, export.EXPORT_BATCH_SIZE, 500, 1, 1]
+    reset_async_pool()
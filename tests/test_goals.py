@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from app import crud, goals, schemas
+
+NOW = datetime(2026, 10, 18, 12, 0)
+
+def sober_goal(db, user_id: int, period: str = "monthly"):
+    return crud.create_goal(db, schemas.GoalCreate(
+        user_id=user_id, type="sober_days", target_value=20, period=period, start_date=datetime(2026, 10, 1)
+    ))
+
+def sober_period(db, user_id: int, start_time: datetime, end_time: datetime = None):
+    crud.create_sober_period(db, schemas.SoberPeriodCreate(
+        user_id=user_id, start_time=start_time, end_time=end_time, is_active=end_time is None
+    ))
+
+def current_value(db, user_id: int):
+    [progress] = goals.get_goal_progress(db, user_id, now=NOW)
+    return progress.current_value
+
+def test_overlapping_active_periods_are_counted_once(db, user):
+    sober_goal(db, user.id)
+    sober_period(db, user.id, datetime(2026, 10, 5))
+    sober_period(db, user.id, datetime(2026, 10, 5))
+    assert current_value(db, user.id) == 13
+
+def test_sober_days_use_union_of_periods(db, user):
+    sober_goal(db, user.id)
+    # 1-4 и 3-6 октября пересекаются (5 дней), 10-12 отдельно (2 дня), период с сентября
+    # обрезается началом месяца и целиком покрыт первым
+    sober_period(db, user.id, datetime(2026, 10, 1), datetime(2026, 10, 4))
+    sober_period(db, user.id, datetime(2026, 10, 3), datetime(2026, 10, 6))
+    sober_period(db, user.id, datetime(2026, 9, 20), datetime(2026, 10, 2))
+    sober_period(db, user.id, datetime(2026, 10, 10), datetime(2026, 10, 12))
+    assert current_value(db, user.id) == 7
+
+def test_periods_are_clipped_to_goal_window(db, user):
+    sober_goal(db, user.id, period="weekly")
+    # Неделя с понедельника 12 октября: 6.5 дней по 18 октября 12:00
+    sober_period(db, user.id, datetime(2026, 10, 1))
+    sober_period(db, user.id, datetime(2026, 10, 14), datetime(2026, 10, 16))
+    assert current_value(db, user.id) == 6
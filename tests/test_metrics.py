@@ -0,0 +1,80 @@
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import create_engine, event, text
+
+from app import metrics
+
+def read_metrics(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+def value(samples, name: str, **labels):
+    return samples.get((name, tuple(sorted(labels.items()))), 0.0)
+
+def test_requests_are_labelled_by_route_template(client, user):
+    route = "/users/{user_id}"
+    before = read_metrics(client)
+
+    assert client.get(f"/users/{user.id}").status_code == 200
+    assert client.get(f"/users/{user.id}").status_code == 200
+    assert client.get("/users/999").status_code == 404
+    assert client.get("/no-such-path").status_code == 404
+
+    after = read_metrics(client)
+    count = "http_request_duration_seconds_count"
+    assert value(after, count, method="GET", route=route, status="200") - \
+        value(before, count, method="GET", route=route, status="200") == 2
+    assert value(after, count, method="GET", route=route, status="404") - \
+        value(before, count, method="GET", route=route, status="404") == 1
+    assert value(after, count, method="GET", route="unmatched", status="404") - \
+        value(before, count, method="GET", route="unmatched", status="404") == 1
+    # Конкретные пути в метки не попадают
+    routes = {dict(labels).get("route") for _, labels in after}
+    assert f"/users/{user.id}" not in routes and "/users/999" not in routes
+
+    # SQL считается на запрос по тому же шаблону
+    context = f"GET {route}"
+    assert value(after, "db_statements_per_unit_count", context=context) - \
+        value(before, "db_statements_per_unit_count", context=context) == 3
+    assert value(after, "db_statements_total", context=context) - \
+        value(before, "db_statements_total", context=context) >= 3
+    assert value(after, "http_requests_in_progress", method="GET", route=route) == 0
+
+def test_instrument_engine_is_idempotent():
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(engine)
+    assert event.contains(engine, "before_cursor_execute", metrics._before_cursor_execute)
+    assert len(engine.dispatch.before_cursor_execute) == 1
+    assert len(engine.dispatch.after_cursor_execute) == 1
+
+    usage = metrics.DBUsage()
+    token = metrics._db_usage.set(usage)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+    finally:
+        metrics._db_usage.reset(token)
+    assert usage.statements == 2
+    assert usage.time > 0
+    engine.dispose()
+
+def test_app_factory_does_not_double_count_statements(client):
+    from app.database import engine
+    from app.main import create_app
+
+    # Каждый вызов фабрики снова подключает счетчики к тем же движкам
+    create_app(bot_mode="polling")
+    usage = metrics.DBUsage()
+    token = metrics._db_usage.set(usage)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    finally:
+        metrics._db_usage.reset(token)
+    assert usage.statements == 1
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from app.telegram_bot import BULK, OutboundQueue
+
+def run(api, queue: OutboundQueue, send):
+    """Отправка через бота с очередью исходящих сообщений на поддельный Bot API"""
+    async def scenario():
+        bot = ExtBot(
+            "123:test", base_url=api.base_url, rate_limiter=queue,
+            request=HTTPXRequest(connection_pool_size=32)
+        )
+        await bot.initialize()
+        try:
+            return await send(bot)
+        finally:
+            await bot.shutdown()
+    return asyncio.run(scenario())
+
+class RecordingQueue(OutboundQueue):
+    """Очередь, которая запоминает момент выпуска каждого запроса по своим часам.
+
+    _send вызывается синхронно при создании задачи отправки, сразу после
+    списания токенов, поэтому время не зависит от задержки соединения.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.released = []
+
+    def _send(self, chat_id, item):
+        self.released.append((self.clock(), chat_id))
+        return super()._send(chat_id, item)
+
+    def times(self, chat_id=None):
+        return [at for at, released_chat in self.released if chat_id is None or released_chat == chat_id]
+
+# Запас на погрешность часов и таймеров event loop
+TOLERANCE = 0.002
+
+def assert_spaced(times, interval: float):
+    """Каждый следующий запрос выпущен не раньше чем через interval после предыдущего"""
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert gaps and min(gaps) >= interval - TOLERANCE, gaps
+    # И очередь не держит запросы заметно дольше нужного
+    assert times[-1] - times[0] <= len(gaps) * interval + 0.5
+
+def test_global_rate_spaces_messages(bot_api):
+    queue = RecordingQueue(rate=10, burst=1, chat_rate=100, chat_burst=1)
+
+    async def send(bot):
+        await asyncio.gather(*(bot.send_message(chat_id=100 + i, text="hi") for i in range(8)))
+
+    run(bot_api, queue, send)
+    assert len(bot_api.sent()) == 8
+    assert len(queue.times()) == 8
+    assert_spaced(queue.times(), 0.1)
+
+def test_chat_rate_spaces_messages_and_keeps_order(bot_api):
+    queue = RecordingQueue(rate=100, burst=10, chat_rate=5, chat_burst=1)
+
+    async def send(bot):
+        await asyncio.gather(
+            *(bot.send_message(chat_id=100, text=str(i)) for i in range(5)),
+            *(bot.send_message(chat_id=200, text=str(i)) for i in range(5))
+        )
+
+    run(bot_api, queue, send)
+    for chat_id in (100, 200):
+        texts = [params["text"] for _, params in bot_api.sent() if int(params["chat_id"]) == chat_id]
+        assert texts == [str(i) for i in range(5)]
+        assert len(queue.times(chat_id)) == 5
+        assert_spaced(queue.times(chat_id), 0.2)
+    # Корзины чатов независимы: два чата отправляют одновременно
+    assert abs(queue.times(100)[0] - queue.times(200)[0]) < 0.1
+    assert queue.times()[-1] - queue.times()[0] < 1.2
+
+def test_retry_after_pauses_queue_and_retries(bot_api):
+    limited = []
+
+    def flood_control(params):
+        if not limited:
+            limited.append(params["text"])
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1}
+            }
+        return None
+
+    bot_api.handlers["sendMessage"] = flood_control
+    queue = RecordingQueue(rate=100, burst=1, chat_rate=100, chat_burst=10, max_in_flight=1)
+
+    async def send(bot):
+        return await asyncio.gather(
+            *(bot.send_message(chat_id=100, text=f"a{i}") for i in range(3)),
+            bot.send_message(chat_id=200, text="b0")
+        )
+
+    messages = run(bot_api, queue, send)
+    assert [message.text for message in messages] == ["a0", "a1", "a2", "b0"]
+    calls = bot_api.sent()
+    assert limited == ["a0"] and len(calls) == 5
+    # После 429 ни один запрос не уходит раньше retry_after, первым повторяется отклоненный
+    assert queue.released[1][0] - queue.released[0][0] >= 1 - TOLERANCE
+    assert calls[1][0] - calls[0][0] >= 0.95
+    assert calls[1][1]["text"] == "a0"
+    assert [params["text"] for _, params in calls if int(params["chat_id"]) == 100] == ["a0", "a0", "a1", "a2"]
+
+def test_retry_after_gives_up_after_max_retries(bot_api):
+    bot_api.handlers["sendMessage"] = lambda params: (429, {
+        "ok": False,
+        "error_code": 429,
+        "description": "Too Many Requests: retry after 1",
+        "parameters": {"retry_after": 1}
+    })
+    queue = OutboundQueue(rate=100, burst=10, chat_rate=100, chat_burst=10, max_retries=1)
+
+    async def send(bot):
+        await bot.send_message(chat_id=100, text="hi")
+
+    with pytest.raises(RetryAfter):
+        run(bot_api, queue, send)
+    assert len(bot_api.sent()) == 2
+
+def test_interactive_messages_overtake_bulk(bot_api):
+    queue = OutboundQueue(rate=20, burst=1, chat_rate=100, chat_burst=1, max_in_flight=1)
+
+    async def send(bot):
+        bulk = [
+            asyncio.create_task(bot.send_message(chat_id=100 + i, text="bulk", rate_limit_args=BULK))
+            for i in range(6)
+        ]
+        await asyncio.sleep(0.08)
+        await bot.send_message(chat_id=200, text="reply")
+        await asyncio.gather(*bulk)
+
+    run(bot_api, queue, send)
+    texts = [params["text"] for _, params in bot_api.sent()]
+    assert len(texts) == 7
+    assert texts.index("reply") <= 3
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import crud, models, schemas
+from app.database import engine
+
+START = datetime(2026, 9, 1, 12)
+
+def add_drinks(db, user_id: int, count: int, per_timestamp: int = 4):
+    # По per_timestamp напитков с одинаковым created_at: порядок внутри группы задает id
+    crud.create_drinks_bulk(db, [
+        schemas.DrinkImport(
+            user_id=user_id, drink_type="beer", volume=100 + i, alcohol_content=5,
+            created_at=START + timedelta(hours=i // per_timestamp)
+        )
+        for i in range(count)
+    ])
+
+def expected_ids(db, user_id: int):
+    return [drink_id for (drink_id,) in db.query(models.Drink.id).filter(
+        models.Drink.user_id == user_id
+    ).order_by(models.Drink.created_at.desc(), models.Drink.id.desc())]
+
+def page_through(read, limit: int):
+    ids, cursor, pages = [], None, 0
+    while True:
+        items, cursor = read(cursor, limit)
+        pages += 1
+        ids.extend(item["id"] for item in items)
+        if cursor is None:
+            return ids, pages
+
+@pytest.mark.parametrize("count, limit", [(22, 3), (24, 4), (4, 10), (0, 5)])
+def test_drink_pages_have_no_gaps_or_duplicates(db, user, count, limit):
+    add_drinks(db, user.id, count)
+    other = crud.create_user(db, schemas.UserCreate(telegram_id=2000, username="other"))
+    add_drinks(db, other.id, 7)
+
+    ids, pages = page_through(lambda cursor, limit: crud.get_drink_rows(db, user.id, cursor, limit), limit)
+    assert ids == expected_ids(db, user.id)
+    assert len(set(ids)) == count
+    # Последняя полная страница уже без курсора, пустой страницы в конце нет
+    assert pages == max(1, -(-count // limit))
+
+def test_drink_pages_through_api(client, db, user):
+    add_drinks(db, user.id, 13, per_timestamp=5)
+
+    def read(cursor, limit):
+        params = {"user_id": user.id, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/drinks/", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        return body["items"], body["next_cursor"]
+
+    ids, _ = page_through(read, 4)
+    assert ids == expected_ids(db, user.id)
+
+    assert client.get("/drinks/", params={"cursor": "not-a-cursor"}).status_code == 400
+
+def test_sober_period_pages_with_equal_start_times(db, user):
+    for i in range(9):
+        crud.create_sober_period(db, schemas.SoberPeriodCreate(
+            user_id=user.id, start_time=START + timedelta(days=i // 3), end_time=START + timedelta(days=5),
+            is_active=False
+        ))
+    ids, _ = page_through(lambda cursor, limit: crud.get_sober_period_rows(db, user.id, cursor, limit), 2)
+    assert ids == [period_id for (period_id,) in db.query(models.SoberPeriod.id).order_by(
+        models.SoberPeriod.start_time.desc(), models.SoberPeriod.id.desc()
+    )]
+
+def test_cursor_round_trip():
+    at = datetime(2026, 9, 1, 12, 30, 15, 123456)
+    cursor = crud.encode_cursor(at, 42)
+    assert "=" not in cursor
+    assert crud.decode_cursor(cursor) == (at, 42)
+    for bad in ("", "not-a-cursor", crud.encode_cursor(at, 1)[:-3]):
+        with pytest.raises(ValueError):
+            crud.decode_cursor(bad)
+
+def test_first_drink_page_is_bounded_by_created_at(db, user):
+    add_drinks(db, user.id, 3)
+    # Напиток из будущего тоже попадает на первую страницу: граница берется из дневной сводки
+    crud.create_drinks_bulk(db, [schemas.DrinkImport(
+        user_id=user.id, drink_type="wine", volume=150, alcohol_content=12, created_at=datetime(2030, 1, 1, 23, 59)
+    )])
+
+    statements = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if "FROM drinks" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", collect)
+    try:
+        items, cursor = crud.get_drink_rows(db, user.id, limit=2)
+    finally:
+        event.remove(engine, "before_cursor_execute", collect)
+
+    assert items[0]["created_at"] == datetime(2030, 1, 1, 23, 59)
+    assert cursor is not None
+    [statement] = statements
+    assert "drinks.created_at <" in statement
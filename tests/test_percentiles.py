@@ -0,0 +1,141 @@
+import math
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func
+
+from app import crud, models, percentiles, schemas
+from app.percentiles import GAMMA, PERCENTILE_ACCURACY, QuantileSketch
+
+NOW = datetime(2026, 10, 14, 12)  # среда
+
+def add_users(db, count: int):
+    return [
+        crud.create_user(db, schemas.UserCreate(telegram_id=5000 + i, username=f"user{i}"))
+        for i in range(count)
+    ]
+
+def add_drink(db, user_id: int, volume: float, created_at: datetime, price: float = None):
+    crud.create_drinks_bulk(db, [schemas.DrinkImport(
+        user_id=user_id, drink_type="beer", volume=volume, alcohol_content=5, price=price, created_at=created_at
+    )])
+
+def stored_bins(db):
+    # Части shard складываются, пустые корзины не учитываются
+    table = models.PopulationSketchBin
+    rows = db.query(
+        table.metric, table.period, table.period_start, table.bin, func.sum(table.count)
+    ).group_by(table.metric, table.period, table.period_start, table.bin).all()
+    return {
+        (metric, period, start, index): int(count)
+        for metric, period, start, index, count in rows if count
+    }
+
+def share_bounds(values, value):
+    # Значения из корзины value неотличимы от него с точностью до множителя GAMMA
+    return (
+        sum(v > value * GAMMA for v in values) / len(values),
+        sum(v > value / GAMMA for v in values) / len(values)
+    )
+
+def test_incremental_bins_match_rebuild(db):
+    users = add_users(db, 12)
+    rng = random.Random(7)
+    # Итоги пользователей растут и переходят между корзинами, в том числе через границу недели и месяца
+    for day in range(40):
+        at = datetime(2026, 9, 20, 18) + timedelta(days=day)
+        for user in rng.sample(users, 5):
+            add_drink(db, user.id, rng.choice([100, 330, 500, 1000]), at, price=rng.choice([None, 3, 12.5]))
+
+    incremental = stored_bins(db)
+    assert all(count > 0 for count in incremental.values())
+
+    starts = {(period, start) for _, period, start, _ in incremental}
+    for period, start in starts:
+        percentiles.rebuild_period(db, period, start)
+    assert stored_bins(db) == incremental
+
+def test_bins_stay_consistent_under_moves_and_removals(db):
+    [user, other] = add_users(db, 2)
+    at = datetime.combine(date(2026, 10, 12), datetime.min.time()) + timedelta(hours=20)
+    # Каждый напиток убирает пользователя из прежней корзины и добавляет в новую
+    for volume in (100, 100, 2000, 50):
+        add_drink(db, user.id, volume, at)
+    add_drink(db, other.id, 100, at)
+
+    bins = stored_bins(db)
+    weekly = {key[3]: count for key, count in bins.items() if key[:3] == ("alcohol", "weekly", date(2026, 10, 12))}
+    assert weekly == {percentiles.bin_index(112.5): 1, percentiles.bin_index(5): 1}
+    # Корзины прежних итогов пользователя опустели, но строки остаются с нулем
+    table = models.PopulationSketchBin
+    assert db.query(table).filter(table.count < 0).count() == 0
+
+    percentiles.rebuild_period(db, "weekly", date(2026, 10, 12))
+    assert stored_bins(db) == bins
+
+def test_sketch_quantiles_and_shares_within_accuracy():
+    rng = random.Random(11)
+    values = sorted(math.exp(rng.uniform(0, 12)) for _ in range(5000))
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    assert sketch.count == len(values)
+
+    for q in (0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1):
+        exact = values[math.floor(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= PERCENTILE_ACCURACY * exact * (1 + 1e-9)
+
+    for value in (1, 3.5, 100, 2500, 99999, values[0], values[-1]):
+        low, high = share_bounds(values, value)
+        assert low - 1e-9 <= sketch.share_above(value) <= high + 1e-9
+
+def test_user_percentiles_within_accuracy(db):
+    users = add_users(db, 40)
+    rng = random.Random(3)
+    totals = {}
+    for user in users:
+        volume = rng.uniform(50, 5000)
+        price = rng.uniform(1, 300)
+        add_drink(db, user.id, volume, NOW - timedelta(hours=1), price=price)
+        totals[user.id] = {"alcohol": volume * 5 / 100, "spent": price}
+    percentiles.sketch_cache.clear()
+
+    for user in users[:10]:
+        result = percentiles.get_user_percentiles(db, user.id, "weekly", now=NOW)
+        for metric, values in {m: [t[m] for t in totals.values()] for m in ("alcohol", "spent")}.items():
+            data = result["metrics"][metric]
+            value = totals[user.id][metric]
+            assert data["users"] == len(users)
+            assert math.isclose(data["value"], value)
+
+            median = sorted(values)[(len(values) - 1) // 2]
+            assert abs(data["median"] - median) <= PERCENTILE_ACCURACY * median * (1 + 1e-9)
+
+            # Сравнение с остальными пользователями, без самого себя
+            others = [v for uid, t in totals.items() if uid != user.id for v in [t[metric]]]
+            low, high = share_bounds(others, value)
+            assert low * 100 - 0.05 <= data["less_than_percent"] <= high * 100 + 0.05
+
+def test_percentiles_exclude_self(db):
+    [light, heavy, idle] = add_users(db, 3)
+    add_drink(db, light.id, 100, NOW)
+    add_drink(db, heavy.id, 5000, NOW)
+
+    def less_than(user):
+        percentiles.sketch_cache.clear()
+        return percentiles.get_user_percentiles(db, user.id, "weekly", now=NOW)["metrics"]["alcohol"]
+
+    # Свой итог не считается: единственный другой пользователь выпил больше или меньше
+    assert less_than(light)["less_than_percent"] == 100.0
+    assert less_than(heavy)["less_than_percent"] == 0.0
+    # Пользователь без напитков в периоде в скетче не учтен и сравнивается со всеми
+    assert less_than(idle) == {
+        "value": 0.0, "users": 2, "less_than_percent": 100.0, "median": percentiles.bin_value(percentiles.bin_index(5))
+    }
+
+def test_percentiles_without_others(db):
+    [user] = add_users(db, 1)
+    add_drink(db, user.id, 500, NOW)
+    data = percentiles.get_user_percentiles(db, user.id, "weekly", now=NOW)["metrics"]["alcohol"]
+    assert data["users"] == 1
+    assert data["less_than_percent"] is None
@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime, time, timedelta
+
+from app import crud, models, schemas
+from app.reminders import REMINDER_TEXT, ReminderScheduler
+
+START = datetime(2026, 10, 18, 23, 50)
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += timedelta(**kwargs)
+
+class FakeBot:
+    def __init__(self, failing=()):
+        self.sent = []
+        self.failing = set(failing)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.failing:
+            raise RuntimeError("Forbidden: bot was blocked by the user")
+        self.sent.append((chat_id, text))
+
+def add_user(db, telegram_id: int, notification_time: time = None, enabled: bool = True):
+    user = crud.create_user(db, schemas.UserCreate(telegram_id=telegram_id, username=f"user{telegram_id}"))
+    crud.update_user_settings(db, user.id, schemas.UserSettingsUpdate(
+        notification_enabled=enabled, notification_time=notification_time
+    ))
+    # Время изменения до запуска планировщика, чтобы оно не считалось новым изменением
+    db.query(models.UserSettings).filter(models.UserSettings.user_id == user.id).update(
+        {models.UserSettings.updated_at: START - timedelta(days=1)}
+    )
+    db.commit()
+    return user
+
+def scheduler(bot, clock, **kwargs):
+    kwargs.setdefault("horizon", timedelta(minutes=10))
+    kwargs.setdefault("changes_interval", 60)
+    return ReminderScheduler(bot, clock=clock, bac_warning=None, **kwargs)
+
+def test_reminders_are_sent_at_due_time_across_midnight(db):
+    for i, minute in enumerate((51, 52, 55, 59)):
+        add_user(db, 100 + i, time(23, minute))
+    add_user(db, 200, time(0, 3))
+    add_user(db, 201, time(23, 40))  # время прошло до запуска
+    add_user(db, 202, time(23, 55), enabled=False)
+    add_user(db, 203)
+
+    async def scenario():
+        clock, bot = FakeClock(START), FakeBot()
+        reminders = scheduler(bot, clock, batch_size=2)
+        sent = []
+        for _ in range(16):
+            sent.append(await reminders.tick())
+            clock.advance(minutes=1)
+        return bot, sent
+
+    bot, sent = asyncio.run(scenario())
+    # Окно загружается страницами по batch_size и продолжается в следующих сутках
+    assert [chat_id for chat_id, _ in bot.sent] == [100, 101, 102, 103, 200]
+    assert all(text == REMINDER_TEXT for _, text in bot.sent)
+    # 23:50 ... 00:05: напоминание отправляется в тик, когда наступило его время
+    assert sent == [0, 1, 1, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0]
+
+def test_reschedule_moves_and_cancels_reminders(db):
+    moved = add_user(db, 100, time(23, 52))
+    disabled = add_user(db, 101, time(23, 53))
+
+    async def scenario():
+        clock, bot = FakeClock(START), FakeBot()
+        reminders = scheduler(bot, clock)
+        await reminders.tick()
+        assert len(reminders) == 2
+        reminders.reschedule(moved.id, 100, True, time(23, 55))
+        reminders.reschedule(disabled.id, 101, False, time(23, 53))
+        sent = []
+        for _ in range(8):
+            clock.advance(minutes=1)
+            sent.append((clock.now.time(), await reminders.tick()))
+        return bot, sent
+
+    bot, sent = asyncio.run(scenario())
+    assert bot.sent == [(100, REMINDER_TEXT)]
+    assert [at for at, count in sent if count] == [time(23, 55)]
+
+def test_settings_changes_are_picked_up_from_database(db):
+    user = add_user(db, 100, time(23, 52))
+
+    async def scenario():
+        clock, bot = FakeClock(START), FakeBot()
+        reminders = scheduler(bot, clock, changes_interval=60)
+        await reminders.tick()
+        # Изменение из другого процесса API: только запись в user_settings
+        crud.update_user_settings(db, user.id, schemas.UserSettingsUpdate(notification_time=time(23, 56)))
+        db.query(models.UserSettings).update({models.UserSettings.updated_at: START + timedelta(seconds=30)})
+        db.commit()
+        for _ in range(10):
+            clock.advance(minutes=1)
+            await reminders.tick()
+            if bot.sent:
+                return bot, clock.now
+        return bot, None
+
+    bot, sent_at = asyncio.run(scenario())
+    assert bot.sent == [(100, REMINDER_TEXT)]
+    assert sent_at == datetime(2026, 10, 18, 23, 56)
+
+def test_failed_send_does_not_stop_other_reminders(db):
+    add_user(db, 100, time(23, 51))
+    add_user(db, 101, time(23, 51))
+    add_user(db, 102, time(23, 51))
+
+    async def scenario():
+        clock, bot = FakeClock(START), FakeBot(failing={101})
+        reminders = scheduler(bot, clock)
+        await reminders.tick()
+        clock.advance(minutes=1)
+        sent = await reminders.tick()
+        # Неудачное напоминание не повторяется в следующем тике
+        clock.advance(minutes=1)
+        assert await reminders.tick() == 0
+        return bot, sent
+
+    bot, sent = asyncio.run(scenario())
+    assert sent == 2
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [100, 102]
+
+def test_sleep_until_next_event(db):
+    add_user(db, 100, time(23, 53))
+
+    async def scenario():
+        clock = FakeClock(START)
+        reminders = scheduler(FakeBot(), clock, changes_interval=600)
+        await reminders.tick()
+        return reminders.seconds_until_next()
+
+    assert asyncio.run(scenario()) == 180
@@ -0,0 +1,89 @@
+import asyncio
+
+from sqlalchemy import create_engine, func, select, text
+
+from app import crud, models, schemas
+from app.database import AsyncSessionLocal, ReplicaRouter
+
+from conftest import reset_async_pool
+
+def drink(user_id: int):
+    return schemas.DrinkCreate(user_id=user_id, drink_type="beer", volume=500, alcohol_content=5)
+
+def replicate(db, replica_engine):
+    """Копия пользователей и напитков основной базы: реплика догнала основную базу"""
+    with replica_engine.begin() as conn:
+        for table in (models.Drink.__table__, models.User.__table__):
+            conn.execute(table.delete())
+        for table in (models.User.__table__, models.Drink.__table__):
+            rows = [dict(row._mapping) for row in db.execute(select(table))]
+            if rows:
+                conn.execute(table.insert(), rows)
+
+def read(router: ReplicaRouter, user_id):
+    async def scenario():
+        async with router.session(user_id) as session:
+            query = select(func.count(models.Drink.id))
+            if user_id is not None:
+                query = query.where(models.Drink.user_id == user_id)
+            return (await session.execute(query)).scalar()
+    # Соединения пула привязаны к циклу событий, в котором открыты
+    reset_async_pool()
+    return asyncio.run(scenario())
+
+def test_lagging_replica_is_skipped_after_write_from_another_process(db, user, tmp_path):
+    url = "sqlite:///" + str(tmp_path / "replica.db")
+    replica_engine = create_engine(url)
+    models.Base.metadata.create_all(bind=replica_engine, tables=[models.User.__table__, models.Drink.__table__])
+    # Отдельный маршрутизатор — процесс чтения; записи через crud отмечаются в другом
+    router = ReplicaRouter([url], AsyncSessionLocal, sticky_seconds=5)
+    try:
+        crud.create_drink(db, drink(user.id))
+        replicate(db, replica_engine)
+        assert read(router, user.id) == 1
+        assert router.reads["replica"] == 1
+
+        # Запись другого процесса: реплика отстает, чтение идет в основную базу
+        crud.create_drink(db, drink(user.id))
+        assert read(router, user.id) == 2
+        assert router.reads["lagging"] == 1 and router.reads["primary"] == 1
+
+        # Чтения без пользователя не проверяют версию
+        assert read(router, None) == 1
+
+        replicate(db, replica_engine)
+        assert read(router, user.id) == 2
+        assert router.reads["replica"] == 3
+
+        # Пользователь, которого на реплике еще нет
+        other = crud.create_user(db, schemas.UserCreate(telegram_id=2000, username="other"))
+        assert read(router, other.id) == 0
+        assert router.reads["lagging"] == 2
+
+        # Запись этого процесса: чтение сразу в основную базу, без проверки версий
+        router.note_write([user.id])
+        crud.create_drink(db, drink(user.id))
+        assert read(router, user.id) == 3
+        assert router.reads["sticky"] == 1
+    finally:
+        for replica in router.engines:
+            replica.sync_engine.dispose()
+        replica_engine.dispose()
+
+def test_replica_version_check_ignores_other_users(db, user, tmp_path):
+    url = "sqlite:///" + str(tmp_path / "replica.db")
+    replica_engine = create_engine(url)
+    models.Base.metadata.create_all(bind=replica_engine, tables=[models.User.__table__, models.Drink.__table__])
+    router = ReplicaRouter([url], AsyncSessionLocal)
+    try:
+        other = crud.create_user(db, schemas.UserCreate(telegram_id=2000, username="other"))
+        replicate(db, replica_engine)
+        crud.create_drink(db, drink(other.id))
+        assert read(router, user.id) == 0
+        assert router.reads == {"replica": 1, "primary": 0, "sticky": 0, "lagging": 0, "fallback": 0}
+        with replica_engine.connect() as conn:
+            assert conn.execute(text("SELECT count(*) FROM drinks")).scalar() == 0
+    finally:
+        for replica in router.engines:
+            replica.sync_engine.dispose()
+        replica_engine.dispose()
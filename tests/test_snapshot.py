@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from app import crud, schemas, snapshot
+
+def add_drinks(db, user_id: int, count: int):
+    for i in range(count):
+        crud.create_drink(db, schemas.DrinkCreate(
+            user_id=user_id, drink_type="beer" if i % 2 else "wine", volume=100 + i, alcohol_content=5
+        ))
+
+def exported(snapshot_dir):
+    [row] = snapshot.aggregate("drinks", [], [("id", "count")], snapshot_dir=snapshot_dir).to_pylist()
+    return row["id_count"]
+
+def test_first_export_writes_existing_drinks(db, user, tmp_path):
+    add_drinks(db, user.id, 5)
+    written = snapshot.export_snapshot(str(tmp_path), settle_seconds=0)
+    assert written["drinks"] == 5
+    assert exported(str(tmp_path)) == 5
+
+def test_next_exports_lag_one_run(db, user, tmp_path):
+    add_drinks(db, user.id, 3)
+    assert snapshot.export_drinks(str(tmp_path), settle_seconds=0) == 3
+
+    # Новые строки выгружаются запуском после того, который увидел их id
+    add_drinks(db, user.id, 4)
+    assert snapshot.export_drinks(str(tmp_path)) == 0
+    assert snapshot.export_drinks(str(tmp_path)) == 4
+    assert snapshot.export_drinks(str(tmp_path)) == 0
+
+    result = snapshot.aggregate(
+        "drinks", ["drink_type"], [("id", "count"), ("volume", "sum")], snapshot_dir=str(tmp_path)
+    ).to_pylist()
+    assert exported(str(tmp_path)) == 7
+    assert {row["drink_type"]: row["id_count"] for row in result} == {"beer": 3, "wine": 4}
+    assert sum(row["volume_sum"] for row in result) == 100 + 101 + 102 + 100 + 101 + 102 + 103
+
+def test_first_export_of_empty_database(db, tmp_path):
+    assert snapshot.export_snapshot(str(tmp_path), settle_seconds=0) == {
+        "drinks": 0, "sober_periods": 0, "goals": 0
+    }
+
+def test_readers_see_only_published_files(db, user, tmp_path, monkeypatch):
+    add_drinks(db, user.id, 2)
+    snapshot.export_drinks(str(tmp_path), settle_seconds=0)
+    add_drinks(db, user.id, 2)
+    assert snapshot.export_drinks(str(tmp_path)) == 0
+
+    # Пока файл пишется и пока он закрыт, но не переименован, читатель видит прошлый снимок
+    seen = []
+    stream_rows = snapshot._stream_rows
+
+    def reading_stream(statement, batch_size):
+        for rows in stream_rows(statement, batch_size):
+            yield rows
+            seen.append(exported(str(tmp_path)))
+
+    replace = os.replace
+
+    def reading_replace(src, dst):
+        if src.endswith(".parquet.tmp"):
+            seen.append(exported(str(tmp_path)))
+        replace(src, dst)
+
+    monkeypatch.setattr(snapshot, "_stream_rows", reading_stream)
+    monkeypatch.setattr(snapshot.os, "replace", reading_replace)
+    assert snapshot.export_drinks(str(tmp_path), batch_size=1) == 2
+    assert len(seen) >= 3 and set(seen) == {2}
+    assert exported(str(tmp_path)) == 4
+
+def test_failed_export_publishes_nothing(db, user, tmp_path, monkeypatch):
+    add_drinks(db, user.id, 2)
+    snapshot.export_drinks(str(tmp_path), settle_seconds=0)
+    add_drinks(db, user.id, 2)
+    snapshot.export_drinks(str(tmp_path))
+
+    stream_rows = snapshot._stream_rows
+
+    def failing_stream(statement, batch_size):
+        for rows in stream_rows(statement, batch_size):
+            yield rows
+            raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(snapshot, "_stream_rows", failing_stream)
+    with pytest.raises(RuntimeError):
+        snapshot.export_drinks(str(tmp_path), batch_size=1)
+    assert exported(str(tmp_path)) == 2
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names if name.endswith(".tmp")]
+
+    # Следующий запуск повторяет тот же диапазон id
+    monkeypatch.setattr(snapshot, "_stream_rows", stream_rows)
+    assert snapshot.export_drinks(str(tmp_path)) == 2
+    assert exported(str(tmp_path)) == 4
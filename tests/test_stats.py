@@ -0,0 +1,185 @@
+from datetime import date
+
+import pytest
+
+from app import crud, models, schemas
+from app.stats_cache import RedisBackend, stats_cache
+
+DRINKS = [
+    ("beer", 500, 5, 3.5, "2024-03-01T19:00:00"),
+    ("wine", 150, 12, 6.0, "2024-03-01T21:30:00"),
+    ("vodka", 50, 40, None, "2024-03-03T23:59:00"),
+    ("beer", 330, 4.5, 2.0, "2024-03-10T12:00:00"),
+    ("wine", 200, 11, 8.0, "2024-04-02T00:00:00")
+]
+
+def drink(user_id: int, drink_type: str, volume: float, alcohol_content: float, price, created_at: str):
+    return {
+        "user_id": user_id,
+        "drink_type": drink_type,
+        "volume": volume,
+        "alcohol_content": alcohol_content,
+        "price": price,
+        "created_at": created_at
+    }
+
+def raw_daily(db, user_id: int):
+    """Дневные агрегаты, посчитанные напрямую по drinks"""
+    days = {}
+    for row in db.query(models.Drink).filter(models.Drink.user_id == user_id):
+        day = days.setdefault(row.created_at.date(), {"count": 0, "volume": 0.0, "alcohol": 0.0, "spent": 0.0, "by_type": {}})
+        day["count"] += 1
+        day["volume"] += row.volume
+        day["alcohol"] += row.volume * row.alcohol_content / 100
+        day["spent"] += row.price or 0.0
+        day["by_type"][row.drink_type] = day["by_type"].get(row.drink_type, 0) + 1
+    return days
+
+def rollup_daily(db, user_id: int):
+    return {
+        row.day: {
+            "count": row.drinks_count,
+            "volume": row.total_volume,
+            "alcohol": row.total_alcohol,
+            "spent": row.total_spent,
+            "by_type": row.drinks_by_type
+        }
+        for row in crud.get_user_daily_stats(db, user_id)
+    }
+
+def assert_same_daily(actual, expected):
+    assert actual.keys() == expected.keys()
+    for day, values in expected.items():
+        assert actual[day]["count"] == values["count"]
+        assert actual[day]["by_type"] == values["by_type"]
+        for field in ("volume", "alcohol", "spent"):
+            assert actual[day][field] == pytest.approx(values[field])
+
+def add_drinks(client, user_id: int):
+    # Одиночные записи (время ставит база) и пачка с временем клиента, как пишут API и импорт
+    for item in DRINKS[:2]:
+        assert client.post("/drinks/", json=drink(user_id, *item)).status_code == 200
+    response = client.post("/drinks/batch", json=[drink(user_id, *item) for item in DRINKS[2:]])
+    assert response.json()["created"] == len(DRINKS) - 2
+
+def test_daily_rollup_matches_raw_drinks(client, db, user):
+    add_drinks(client, user.id)
+    expected = raw_daily(db, user.id)
+    assert_same_daily(rollup_daily(db, user.id), expected)
+
+    # Полный пересчет дает ту же сводку, что и инкрементальные обновления
+    crud.rebuild_user_daily_stats(db, user.id)
+    db.expire_all()
+    assert_same_daily(rollup_daily(db, user.id), expected)
+
+def test_range_stats_match_raw_drinks(client, db, user):
+    add_drinks(client, user.id)
+    daily = raw_daily(db, user.id)
+
+    stats = client.get("/stats", params={"user_id": user.id}).json()
+    assert stats["total_drinks"] == sum(day["count"] for day in daily.values())
+    assert stats["total_volume"] == pytest.approx(sum(day["volume"] for day in daily.values()))
+    assert stats["total_alcohol"] == pytest.approx(sum(day["alcohol"] for day in daily.values()))
+    assert stats["total_spent"] == pytest.approx(sum(day["spent"] for day in daily.values()))
+    assert stats["drinks_by_type"] == {"beer": 2, "wine": 2, "vodka": 1}
+    assert len(stats["daily_stats"]) == len(daily)
+    assert [item["date"] for item in stats["daily_stats"]] == [str(day) for day in sorted(daily)]
+    assert [item["count"] for item in stats["daily_stats"]] == [daily[day]["count"] for day in sorted(daily)]
+
+    march = client.get("/stats", params={
+        "user_id": user.id, "start_date": "2024-03-01", "end_date": "2024-03-31", "bucket": "month"
+    }).json()
+    in_march = sum(values["count"] for day, values in daily.items() if (day.year, day.month) == (2024, 3))
+    assert march["total_drinks"] == in_march == 2
+    assert [item["count"] for item in march["daily_stats"]] == [in_march]
+
+    totals = client.get("/statistics/", params={"user_id": user.id}).json()
+    assert totals["total_alcohol"] == pytest.approx(sum(day["alcohol"] for day in daily.values()))
+    assert totals["days_with_drinks"] == len(daily)
+
+def test_writes_invalidate_cached_statistics(client, db, user):
+    params = {"user_id": user.id}
+    assert client.get("/stats", params=params).json()["total_drinks"] == 0
+    assert client.get("/statistics/", params=params).json()["days_with_drinks"] == 0
+    version = crud.get_stats_version(db, user.id)
+
+    # Повторное чтение без записей берется из кэша
+    hits = stats_cache.stats()["hits"]
+    assert client.get("/stats", params=params).json()["total_drinks"] == 0
+    assert stats_cache.stats()["hits"] == hits + 1
+
+    assert client.post("/drinks/", json=drink(user.id, *DRINKS[0])).status_code == 200
+    db.expire_all()
+    assert crud.get_stats_version(db, user.id) > version
+    assert client.get("/stats", params=params).json()["total_drinks"] == 1
+    assert client.get("/statistics/", params=params).json()["days_with_drinks"] == 1
+
+    response = client.post("/drinks/batch", json=[drink(user.id, *item) for item in DRINKS[1:]])
+    assert response.json()["created"] == len(DRINKS) - 1
+    assert client.get("/stats", params=params).json()["total_drinks"] == len(DRINKS)
+
+    # Пересчет сводки тоже меняет версию
+    version = crud.get_stats_version(db, user.id)
+    crud.rebuild_user_daily_stats(db, user.id)
+    assert crud.get_stats_version(db, user.id) > version
+
+def test_cache_is_per_user(client, db, user):
+    other = crud.create_user(db, schemas.UserCreate(telegram_id=2000, username="other"))
+    assert client.get("/stats", params={"user_id": other.id}).json()["total_drinks"] == 0
+    assert client.post("/drinks/", json=drink(user.id, *DRINKS[0])).status_code == 200
+    assert client.get("/stats", params={"user_id": user.id}).json()["total_drinks"] == 1
+    assert client.get("/stats", params={"user_id": other.id}).json()["total_drinks"] == 0
+
+def test_user_cache_does_not_keep_missing_users(db):
+    assert crud.get_user_identity(db, 3000) is None
+    created = crud.create_user(db, schemas.UserCreate(telegram_id=3000, username="new"))
+    identity = crud.get_user_identity(db, 3000)
+    assert identity is not None and identity.id == created.id
+    # Повторное чтение из кэша без запроса к базе
+    assert crud.user_cache.get(3000) is identity
+
+class FakeRedis:
+    """get/set(ex) как у redis.Redis: значения хранятся байтами"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        self.expires[key] = ex
+
+def test_redis_backend_hits_equal_misses(client, db, user):
+    redis = FakeRedis()
+    stats_cache.backend = RedisBackend(redis, ttl=120)
+    add_drinks(client, user.id)
+    params = {"user_id": user.id, "start_date": "2024-03-01", "end_date": "2024-04-30", "bucket": "week"}
+
+    # Промах и попадание дают одинаковые значения и типы, в том числе даты
+    miss = crud.get_range_stats(db, user.id, date(2024, 3, 1), date(2024, 4, 30), "week")
+    hit = crud.get_range_stats(db, user.id, date(2024, 3, 1), date(2024, 4, 30), "week")
+    assert stats_cache.stats()["hits"] == 1
+    assert hit == miss
+    assert all(type(a) is type(b) for x, y in zip(hit["daily_stats"], miss["daily_stats"])
+               for a, b in zip(x.values(), y.values()))
+    assert isinstance(hit["daily_stats"][0]["date"], date)
+    # /drinks/ ставит время записи, в диапазон попадают только напитки из пачки
+    assert hit["total_drinks"] == len(DRINKS) - 2
+
+    first = client.get("/stats", params=params).json()
+    assert client.get("/stats", params=params).json() == first
+    assert client.get("/statistics/", params={"user_id": user.id}).json() == \
+        client.get("/statistics/", params={"user_id": user.id}).json()
+
+    assert redis.data and all(key.startswith("alcocontrol:stats:") for key in redis.data)
+    assert set(redis.expires.values()) == {120}
+
+    # Запись меняет версию, старый ключ в Redis больше не читается
+    response = client.post("/drinks/batch", json=[drink(user.id, "beer", 500, 5, 3.5, "2024-03-02T12:00:00")])
+    assert response.json()["created"] == 1
+    keys = len(redis.data)
+    assert client.get("/stats", params=params).json()["total_drinks"] == len(DRINKS) - 1
+    assert len(redis.data) == keys + 1
@@ -0,0 +1,99 @@
+from datetime import datetime
+
+import pytest
+
+from app import crud, models, schemas
+
+def streak_state(db, user_id: int):
+    db.expire_all()
+    streak = crud.get_user_streak(db, user_id)
+    return streak.current_start, streak.longest_seconds, streak.last_drink_at
+
+def assert_matches_rebuild(db, user_id: int):
+    """Состояние после инкрементальных обновлений совпадает с полным пересчетом"""
+    current_start, longest, last_drink_at = streak_state(db, user_id)
+    crud.rebuild_user_streak(db, user_id)
+    rebuilt = streak_state(db, user_id)
+    assert (current_start, last_drink_at) == (rebuilt[0], rebuilt[2])
+    assert longest == pytest.approx(rebuilt[1])
+    return current_start, longest, last_drink_at
+
+def drink(user_id: int, created_at: str):
+    return {"user_id": user_id, "drink_type": "beer", "volume": 500, "alcohol_content": 5, "created_at": created_at}
+
+def add_period(db, user_id: int, start_time: datetime, end_time: datetime = None):
+    return crud.create_sober_period(db, schemas.SoberPeriodCreate(
+        user_id=user_id, start_time=start_time, end_time=end_time, is_active=end_time is None
+    ))
+
+def test_api_writes_with_timezones_match_rebuild(client, db, user):
+    response = client.post("/sober-periods/", json={
+        "user_id": user.id, "start_time": "2024-03-01T03:00:00+03:00"
+    })
+    assert response.status_code == 200
+    assert_matches_rebuild(db, user.id)
+
+    # Две пачки с временем в разных поясах, во второй напитки не по порядку
+    client.post("/drinks/batch", json=[
+        drink(user.id, "2024-03-03T12:00:00Z"),
+        drink(user.id, "2024-03-04T02:00:00+03:00")
+    ])
+    current_start, longest, _ = assert_matches_rebuild(db, user.id)
+    assert current_start == datetime(2024, 3, 3, 23, 0)
+    assert longest == (datetime(2024, 3, 3, 12) - datetime(2024, 3, 1)).total_seconds()
+
+    client.post("/drinks/batch", json=[
+        drink(user.id, "2024-03-20T00:00:00+05:00"),
+        drink(user.id, "2024-03-10T10:00:00Z")
+    ])
+    current_start, longest, last_drink_at = assert_matches_rebuild(db, user.id)
+    assert current_start == last_drink_at == datetime(2024, 3, 19, 19, 0)
+    assert longest == (datetime(2024, 3, 19, 19) - datetime(2024, 3, 10, 10)).total_seconds()
+
+    # Напиток без времени клиента записывается текущим временем
+    single = drink(user.id, None)
+    del single["created_at"]
+    assert client.post("/drinks/", json=single).status_code == 200
+    assert_matches_rebuild(db, user.id)
+
+def test_overlapping_active_periods_match_rebuild(db, user):
+    first = add_period(db, user.id, datetime(2026, 10, 5))
+    second = add_period(db, user.id, datetime(2026, 10, 5))
+    third = add_period(db, user.id, datetime(2026, 10, 7))
+    assert assert_matches_rebuild(db, user.id)[0] == datetime(2026, 10, 5)
+
+    # Серия продолжается, пока остается активный период
+    crud.end_sober_period(db, second.id)
+    crud.end_sober_period(db, first.id)
+    assert assert_matches_rebuild(db, user.id)[0] == datetime(2026, 10, 5)
+
+    crud.end_sober_period(db, third.id)
+    current_start, longest, _ = assert_matches_rebuild(db, user.id)
+    assert current_start is None
+    db.refresh(third)
+    assert longest == (third.end_time - datetime(2026, 10, 5)).total_seconds()
+
+def test_period_started_before_last_drink_matches_rebuild(client, db, user):
+    client.post("/drinks/batch", json=[
+        drink(user.id, "2024-03-05T20:00:00Z"),
+        drink(user.id, "2024-03-08T20:00:00Z")
+    ])
+    add_period(db, user.id, datetime(2024, 3, 1))
+    current_start, longest, _ = assert_matches_rebuild(db, user.id)
+    # Серия идет с последнего напитка, промежутки до него — завершенные серии
+    assert current_start == datetime(2024, 3, 8, 20)
+    assert longest == (datetime(2024, 3, 5, 20) - datetime(2024, 3, 1)).total_seconds()
+
+    # Второй активный период раньше текущей серии без новых напитков ничего не меняет
+    add_period(db, user.id, datetime(2024, 2, 20))
+    current_start, longest, _ = assert_matches_rebuild(db, user.id)
+    assert current_start == datetime(2024, 3, 8, 20)
+    assert longest == (datetime(2024, 3, 5, 20) - datetime(2024, 2, 20)).total_seconds()
+
+def test_completed_period_matches_rebuild(client, db, user):
+    client.post("/drinks/batch", json=[drink(user.id, "2024-01-10T00:00:00Z")])
+    add_period(db, user.id, datetime(2024, 1, 1), datetime(2024, 1, 31))
+    current_start, longest, _ = assert_matches_rebuild(db, user.id)
+    assert current_start is None
+    assert longest == (datetime(2024, 1, 31) - datetime(2024, 1, 10)).total_seconds()
+    assert db.query(models.UserStreak).count() == 1
@@ -0,0 +1,52 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud, telegram_bot
+from app.main import create_app
+
+from fake_bot_api import message_update
+
+SECRET = {"X-Telegram-Bot-Api-Secret-Token": "secret"}
+
+@pytest.fixture
+def webhook_client(db, bot_api, monkeypatch):
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_WEBHOOK_SECRET", "secret")
+    monkeypatch.setattr(telegram_bot, "BOT_REMINDERS", False)
+    with TestClient(create_app(bot_mode="webhook")) as client:
+        assert client.app.state.bot is not None
+        yield client
+
+def test_webhook_rejects_wrong_secret(webhook_client, bot_api):
+    response = webhook_client.post("/telegram/webhook", json=message_update(1, 501, "/start"))
+    assert response.status_code == 403
+    response = webhook_client.post(
+        "/telegram/webhook", json=message_update(1, 501, "/start"),
+        headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}
+    )
+    assert response.status_code == 403
+    assert not bot_api.sent()
+
+def test_webhook_update_is_handled_by_bot(webhook_client, bot_api, db):
+    response = webhook_client.post("/telegram/webhook", json=message_update(1, 501, "/start"), headers=SECRET)
+    assert response.status_code == 200
+    assert bot_api.wait_for(lambda: bot_api.sent())
+    _, params = bot_api.sent()[0]
+    assert int(params["chat_id"]) == 501
+    assert crud.get_user_by_telegram_id(db, 501) is not None
+
+def test_webhook_handles_updates_from_many_chats(webhook_client, bot_api):
+    chats = list(range(600, 620))
+    for i, chat_id in enumerate(chats):
+        response = webhook_client.post(
+            "/telegram/webhook", json=message_update(i + 1, chat_id, "/help"), headers=SECRET
+        )
+        assert response.status_code == 200
+    assert bot_api.wait_for(lambda: len(bot_api.sent()) == len(chats))
+    assert sorted(int(params["chat_id"]) for _, params in bot_api.sent()) == chats
+
+def test_webhook_rejects_invalid_payload(webhook_client):
+    response = webhook_client.post(
+        "/telegram/webhook", content=b"not json",
+        headers={**SECRET, "Content-Type": "application/json"}
+    )
+    assert response.status_code == 400